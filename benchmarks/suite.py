@@ -0,0 +1,335 @@
+"""
+Benchmarks for the hot paths of fastapi_utils, run in-process (requests are driven directly through the ASGI
+interface, so no network or test client is involved).
+
+Each benchmark is run `--repeats` times, with enough iterations per repeat to take at least `--min-time` seconds;
+the results (time per iteration, in microseconds) are written as JSON, along with the versions of python and the main
+dependencies, and the current git commit (if available). Pass the JSON written for an earlier commit as `--compare`
+to print the relative change of each benchmark.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/suite.py [--filter SUBSTRING] [--output results.json] [--compare baseline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.metadata
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from functools import partial
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Union
+
+import pydantic
+import sqlalchemy as sa
+from fastapi import APIRouter, FastAPI
+from sqlalchemy.dialects import sqlite
+from timing_middleware import handle_request, make_scope
+
+from fastapi_utils.api_model import APIModel
+from fastapi_utils.camelcase import camel2snake, snake2camel
+from fastapi_utils.cbv import cbv
+from fastapi_utils.cbv_base import Api, Resource, set_responses
+from fastapi_utils.guid_type import GUID
+from fastapi_utils.session import FastAPISessionMaker
+from fastapi_utils.timing import _MetricNamer, add_timing_middleware
+
+Operation = Union[Callable[[], Any], Callable[[], Awaitable[Any]]]
+
+BENCHMARKS: dict[str, Callable[[], Operation]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Operation]], Callable[[], Operation]]:
+    """
+    Registers a benchmark; the decorated function performs any setup, and returns the (sync or async) operation
+    to be timed.
+    """
+
+    def decorator(setup: Callable[[], Operation]) -> Callable[[], Operation]:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def _discard(message: str) -> None:
+    pass
+
+
+def _request_operation(app: FastAPI, path: str = "/") -> Callable[[], Awaitable[None]]:
+    scope = make_scope(path)
+
+    async def operation() -> None:
+        await handle_request(app, scope)
+
+    return operation
+
+
+@benchmark("timing_middleware.none")
+def bench_no_middleware() -> Operation:
+    app = FastAPI()
+
+    @app.get("/")
+    async def index() -> str:
+        return "ok"
+
+    return _request_operation(app)
+
+
+@benchmark("timing_middleware.asgi")
+def bench_timing_middleware() -> Operation:
+    app = FastAPI()
+    add_timing_middleware(app, record=_discard)
+
+    @app.get("/")
+    async def index() -> str:
+        return "ok"
+
+    return _request_operation(app)
+
+
+def _bench_metric_namer(n_routes: int) -> Operation:
+    app = FastAPI()
+    for i in range(n_routes):
+        app.add_api_route(f"/static{i}", lambda: None, name=f"static{i}")
+        app.add_api_route(f"/items{i}/{{item_id}}", lambda item_id: None, name=f"items{i}")
+    namer = _MetricNamer(prefix="", app=app)
+    # Every path is unique, so each request misses the LRU cache and has to be looked up in the route index
+    item_ids = itertools.count()
+    last_route = n_routes - 1
+
+    def operation() -> None:
+        namer(make_scope(f"/items{last_route}/{next(item_ids)}"))
+
+    return operation
+
+
+for _n_routes in (10, 100, 1000):
+    benchmark(f"metric_namer.routes_{_n_routes}")(partial(_bench_metric_namer, _n_routes))
+
+
+@benchmark("endpoint.function")
+def bench_function_endpoint() -> Operation:
+    app = FastAPI()
+
+    def get_dependency() -> int:
+        return 1
+
+    @app.get("/")
+    def index() -> int:
+        return get_dependency()
+
+    return _request_operation(app)
+
+
+@benchmark("endpoint.cbv")
+def bench_cbv_endpoint() -> Operation:
+    app = FastAPI()
+    router = APIRouter()
+
+    @cbv(router)
+    class View:
+        value = 1
+
+        @router.get("/")
+        def index(self) -> int:
+            return self.value
+
+    app.include_router(router)
+    return _request_operation(app)
+
+
+class _Item(Resource):
+    @set_responses(int)
+    def get(self, item_id: int) -> int:
+        return item_id
+
+    @set_responses(int)
+    def post(self, item_id: int) -> int:
+        return item_id
+
+
+@benchmark("cbv_base.add_resource")
+def bench_add_resource() -> Operation:
+    resource = _Item()
+
+    def operation() -> None:
+        Api(FastAPI()).add_resource(resource, "/items/{item_id}")
+
+    return operation
+
+
+@benchmark("guid.process_bind_param")
+def bench_guid_bind() -> Operation:
+    guid, dialect, value = GUID(), sqlite.dialect(), uuid.uuid4()
+
+    def operation() -> None:
+        guid.process_bind_param(value, dialect)
+
+    return operation
+
+
+@benchmark("guid.process_result_value")
+def bench_guid_result() -> Operation:
+    guid, dialect, value = GUID(), sqlite.dialect(), uuid.uuid4().hex
+
+    def operation() -> None:
+        guid.process_result_value(value, dialect)
+
+    return operation
+
+
+@benchmark("camelcase.snake2camel")
+def bench_snake2camel() -> Operation:
+    return lambda: snake2camel("some_long_snake_case_name_2", start_lower=True)
+
+
+@benchmark("camelcase.camel2snake")
+def bench_camel2snake() -> Operation:
+    return lambda: camel2snake("someLongCamelCaseName2")
+
+
+class _Model(APIModel):
+    item_id: int
+    display_name: str
+    tag_names: List[str]
+
+
+@benchmark("api_model.validate")
+def bench_api_model() -> Operation:
+    data = {"itemId": 1, "displayName": "name", "tagNames": ["a", "b", "c"]}
+    if pydantic.VERSION[0] == "2":
+        return lambda: _Model.model_validate(data)
+    return lambda: _Model.parse_obj(data)
+
+
+@benchmark("session.get_db")
+def bench_get_db() -> Operation:
+    database_path = Path(tempfile.mkdtemp()) / "benchmark.db"
+    session_maker = FastAPISessionMaker(f"sqlite:///{database_path}")
+    select_1 = sa.text("SELECT 1")
+
+    def operation() -> None:
+        db_generator = session_maker.get_db()
+        session = next(db_generator)
+        session.execute(select_1)  # sessions only check out a connection once they are used
+        next(db_generator, None)
+
+    return operation
+
+
+def measure(operation: Operation, min_time: float, repeats: int) -> dict[str, Any]:
+    """
+    Returns statistics of the time per call of `operation` (in microseconds), over `repeats` runs of at least
+    `min_time` seconds each.
+    """
+    return asyncio.run(_measure(operation, min_time, repeats))
+
+
+async def _measure(operation: Operation, min_time: float, repeats: int) -> dict[str, Any]:
+    is_async = asyncio.iscoroutinefunction(operation)
+
+    async def run(iterations: int) -> float:
+        start = time.perf_counter()
+        if is_async:
+            for _ in range(iterations):
+                await operation()
+        else:
+            for _ in range(iterations):
+                operation()
+        return time.perf_counter() - start
+
+    # Calibrate the number of iterations (which also warms up any caches)
+    iterations = 1
+    duration = await run(iterations)
+    while duration < min_time / 10:
+        iterations *= 2
+        duration = await run(iterations)
+    iterations = max(int(iterations * min_time / duration), 1)
+    return _summarize([await run(iterations) for _ in range(repeats)], iterations)
+
+
+def _summarize(durations: list[float], iterations: int) -> dict[str, Any]:
+    per_iteration = [1e6 * duration / iterations for duration in durations]
+    return {
+        "min_us": min(per_iteration),
+        "median_us": statistics.median(per_iteration),
+        "mean_us": statistics.mean(per_iteration),
+        "stdev_us": statistics.stdev(per_iteration) if len(per_iteration) > 1 else 0.0,
+        "iterations": iterations,
+        "repeats": len(per_iteration),
+    }
+
+
+def get_environment() -> dict[str, Any]:
+    versions = {}
+    for package in ("fastapi", "starlette", "pydantic", "sqlalchemy"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit: str | None = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "packages": versions,
+    }
+
+
+def print_comparison(results: dict[str, Any], baseline: dict[str, Any]) -> None:
+    print(f"{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>8}", file=sys.stderr)
+    for name, result in results["benchmarks"].items():
+        baseline_result = baseline["benchmarks"].get(name)
+        if baseline_result is None:
+            print(f"{name:<32} {'-':>12} {result['median_us']:>10.2f}us {'new':>8}", file=sys.stderr)
+            continue
+        change = result["median_us"] / baseline_result["median_us"] - 1
+        print(
+            f"{name:<32} {baseline_result['median_us']:>10.2f}us {result['median_us']:>10.2f}us {change:>+8.1%}",
+            file=sys.stderr,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum duration of each repeat, in seconds")
+    parser.add_argument("--repeats", type=int, default=5, help="number of times to run each benchmark")
+    parser.add_argument("--output", type=Path, help="write the results to this file instead of stdout")
+    parser.add_argument("--compare", type=Path, help="results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {"environment": get_environment(), "benchmarks": {}}
+    for name, setup in BENCHMARKS.items():
+        if args.filter in name:
+            print(f"running {name}...", file=sys.stderr)
+            results["benchmarks"][name] = measure(setup(), args.min_time, args.repeats)
+
+    output = json.dumps(results, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    if args.compare is not None:
+        print_comparison(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compares the per-request overhead of `fastapi_utils.timing.TimingMiddleware` against the previous
+`@app.middleware("http")`-based implementation (which runs through starlette's `BaseHTTPMiddleware`).
+
+Requests are driven directly through the ASGI interface, so no network or test client is involved.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/timing_middleware.py [--requests N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from starlette.middleware.base import RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import ASGIApp, Message
+
+from fastapi_utils.timing import TIMER_ATTRIBUTE, _MetricNamer, _TimingStats, add_timing_middleware
+
+
+def _discard(message: str) -> None:
+    pass
+
+
+def add_legacy_timing_middleware(app: FastAPI) -> None:
+    """
+    The implementation of `add_timing_middleware` prior to the introduction of `TimingMiddleware`.
+    """
+    metric_namer = _MetricNamer(prefix="", app=app)
+
+    @app.middleware("http")
+    async def timing_middleware(request: Request, call_next: RequestResponseEndpoint) -> Response:
+        metric_name = metric_namer(request.scope)
+        with _TimingStats(metric_name, record=_discard) as timer:
+            setattr(request.state, TIMER_ATTRIBUTE, timer)
+            response = await call_next(request)
+        return response
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    if variant == "legacy":
+        add_legacy_timing_middleware(app)
+    elif variant == "asgi":
+        add_timing_middleware(app, record=_discard)
+
+    @app.get("/", response_class=PlainTextResponse)
+    async def index() -> str:
+        return "ok"
+
+    return app
+
+
+def make_scope(path: str = "/", method: str = "GET") -> dict[str, Any]:
+    """
+    Returns an ASGI HTTP scope for a request to `path`.
+    """
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+
+
+async def handle_request(app: ASGIApp, scope: dict[str, Any]) -> None:
+    """
+    Sends a single request with the provided `scope` through `app`, discarding the response.
+    """
+    # Like a real server, `receive` only reports a disconnect once the response has been fully sent
+    request_complete = False
+    response_complete = asyncio.Event()
+
+    async def receive() -> Message:
+        nonlocal request_complete
+        if not request_complete:
+            request_complete = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_complete.set()
+
+    await app(dict(scope), receive, send)
+
+
+async def run_requests(app: FastAPI, n_requests: int) -> float:
+    """
+    Sends `n_requests` GET requests through `app` and returns the mean time per request in microseconds.
+    """
+    scope = make_scope()
+    for _ in range(100):  # warm up
+        await handle_request(app, scope)
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        await handle_request(app, scope)
+    return (time.perf_counter() - start) / n_requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="number of requests per variant")
+    args = parser.parse_args()
+
+    results = {}
+    for variant in ("none", "legacy", "asgi"):
+        results[variant] = asyncio.run(run_requests(build_app(variant), args.requests))
+
+    baseline = results["none"]
+    for variant, per_request in results.items():
+        print(f"{variant:>8}: {per_request:8.1f}us/request (overhead: {per_request - baseline:+7.1f}us)")
+
+
+if __name__ == "__main__":
+    main()
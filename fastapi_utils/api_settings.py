@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import Any
+from typing import Any, Optional
 
 import pydantic
 
@@ -38,6 +38,8 @@ class APISettings(BaseSettings):
 
     # Custom settings
     disable_docs: bool = False
+    # The capacity of the threadpool used to run sync code, if not the default (see `monitors.ThreadpoolMonitor`)
+    threadpool_tokens: Optional[int] = None
 
     @property
     def fastapi_kwargs(self) -> dict[str, Any]:
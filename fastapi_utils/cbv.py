@@ -1,3 +1,4 @@
+import copy
 import inspect
 from typing import (
     Any,
@@ -12,10 +13,13 @@ from typing import (
 )
 
 import pydantic
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, params
 from fastapi.routing import APIRoute
+from fastapi.security.base import SecurityBase
 from starlette.routing import Route, WebSocketRoute
 
+from .timing import time_dependency
+
 PYDANTIC_VERSION = pydantic.VERSION
 if PYDANTIC_VERSION[0] == "2":
     from typing_inspect import is_classvar
@@ -29,7 +33,7 @@ INCLUDE_INIT_PARAMS_KEY = "__include_init_params__"
 RETURN_TYPES_FUNC_KEY = "__return_types_func__"
 
 
-def cbv(router: APIRouter, *urls: str) -> Callable[[Type[T]], Type[T]]:
+def cbv(router: APIRouter, *urls: str, time_dependencies: bool = False) -> Callable[[Type[T]], Type[T]]:
     """
     This function returns a decorator that converts the decorated into a class-based view for the provided router.
 
@@ -37,32 +41,36 @@ def cbv(router: APIRouter, *urls: str) -> Callable[[Type[T]], Type[T]]:
     will become endpoints in the router. The first positional argument to the methods (typically `self`)
     will be populated with an instance created using FastAPI's dependency-injection.
 
+    If `time_dependencies` is True, the time taken to resolve the class's dependencies (and to create the instance)
+    is recorded as a span of each request's timing data; see `fastapi_utils.timing.time_dependency`.
+
     For more detail, review the documentation at
     https://fastapi-restful.netlify.app/user-guide/class-based-views//#the-cbv-decorator
     """
 
     def decorator(cls: Type[T]) -> Type[T]:
         # Define cls as cbv class exclusively when using the decorator
-        return _cbv(router, cls, *urls)
+        return _cbv(router, cls, *urls, time_dependencies=time_dependencies)
 
     return decorator
 
 
-def _cbv(router: APIRouter, cls: Type[T], *urls: str, instance: Any = None) -> Type[T]:
+def _cbv(router: APIRouter, cls: Type[T], *urls: str, instance: Any = None, time_dependencies: bool = False) -> Type[T]:
     """
     Replaces any methods of the provided class `cls` that are endpoints of routes in `router` with updated
     function calls that will properly inject an instance of `cls`.
     """
-    _init_cbv(cls, instance)
-    _register_endpoints(router, cls, *urls)
+    _init_cbv(cls, instance, time_dependencies)
+    _register_endpoints(router, cls, *urls, time_dependencies=time_dependencies)
     return cls
 
 
-def _init_cbv(cls: Type[Any], instance: Any = None) -> None:
+def _init_cbv(cls: Type[Any], instance: Any = None, time_dependencies: bool = False) -> None:
     """
     Idempotently modifies the provided `cls`, performing the following modifications:
     * The `__init__` function is updated to set any class-annotated dependencies as instance attributes
     * The `__signature__` attribute is updated to indicate to FastAPI what arguments should be passed to the initializer
+    * If `time_dependencies` is True, the dependencies of the initializer are wrapped using `time_dependency`
     """
     if getattr(cls, CBV_CLASS_KEY, False):  # pragma: no cover
         return  # Already initialized
@@ -82,6 +90,8 @@ def _init_cbv(cls: Type[Any], instance: Any = None) -> None:
         new_parameters.append(
             inspect.Parameter(name=name, kind=inspect.Parameter.KEYWORD_ONLY, annotation=hint, **parameter_kwargs)
         )
+    if time_dependencies:
+        new_parameters = [x.replace(default=_get_timed_default(x.default)) for x in new_parameters]
     new_signature = inspect.Signature(())
     if not instance or hasattr(cls, INCLUDE_INIT_PARAMS_KEY):
         new_signature = old_signature.replace(parameters=new_parameters)
@@ -101,7 +111,27 @@ def _init_cbv(cls: Type[Any], instance: Any = None) -> None:
     setattr(cls, CBV_CLASS_KEY, True)
 
 
-def _register_endpoints(router: APIRouter, cls: Type[Any], *urls: str) -> None:
+def _get_timed_default(default: Any) -> Any:
+    """
+    Returns a copy of a `Depends` default (keeping any other parameters of the marker) with its dependency wrapped
+    using `time_dependency`.
+
+    Security dependencies are left as-is, since FastAPI needs the original dependency to document them.
+    """
+    if (
+        not isinstance(default, params.Depends)
+        or isinstance(default, params.Security)
+        or default.dependency is None
+        or isinstance(default.dependency, SecurityBase)
+    ):
+        return default
+    timed_default = copy.copy(default)
+    # Markers are frozen dataclasses in newer versions of FastAPI
+    object.__setattr__(timed_default, "dependency", time_dependency(default.dependency))
+    return timed_default
+
+
+def _register_endpoints(router: APIRouter, cls: Type[Any], *urls: str, time_dependencies: bool = False) -> None:
     cbv_router = APIRouter()
     function_members = inspect.getmembers(cls, inspect.isfunction)
     for url in urls:
@@ -128,7 +158,7 @@ def _register_endpoints(router: APIRouter, cls: Type[Any], *urls: str) -> None:
     for route in cbv_routes:
         router.routes.remove(route)
         route.path = route.path[prefix_length:]
-        _update_cbv_route_endpoint_signature(cls, route)
+        _update_cbv_route_endpoint_signature(cls, route, time_dependencies)
         route.name = cls.__name__ + "." + route.name
         cbv_router.routes.append(route)
     router.include_router(cbv_router)
@@ -160,7 +190,9 @@ def _allocate_routes_by_method_name(router: APIRouter, url: str, function_member
                 api_resource(func)
 
 
-def _update_cbv_route_endpoint_signature(cls: Type[Any], route: Union[Route, WebSocketRoute]) -> None:
+def _update_cbv_route_endpoint_signature(
+    cls: Type[Any], route: Union[Route, WebSocketRoute], time_dependencies: bool = False
+) -> None:
     """
     Fixes the endpoint signature for a cbv route to ensure FastAPI performs dependency injection properly.
     """
@@ -168,7 +200,8 @@ def _update_cbv_route_endpoint_signature(cls: Type[Any], route: Union[Route, Web
     old_signature = inspect.signature(old_endpoint)
     old_parameters: List[inspect.Parameter] = list(old_signature.parameters.values())
     old_first_parameter = old_parameters[0]
-    new_first_parameter = old_first_parameter.replace(default=Depends(cls))
+    dependency = time_dependency(cls) if time_dependencies else cls
+    new_first_parameter = old_first_parameter.replace(default=Depends(dependency))
     new_parameters = [new_first_parameter] + [
         parameter.replace(kind=inspect.Parameter.KEYWORD_ONLY) for parameter in old_parameters[1:]
     ]
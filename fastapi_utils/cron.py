@@ -0,0 +1,178 @@
+"""
+A dependency-free parser for cron expressions, used by `fastapi_utils.tasks.repeat_cron`.
+"""
+
+from __future__ import annotations
+
+import calendar
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTH_NAMES = {
+    name: number
+    for number, name in enumerate(
+        ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+    )
+}
+WEEKDAY_NAMES = {name: number for number, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+# Every combination of leap year and weekday of January 1st occurs within a 400-year Gregorian cycle
+_MAX_SEARCH_YEARS = 400
+
+
+def _parse_value(value: str, names: dict[str, int]) -> int:
+    number = names.get(value.lower())
+    if number is not None:
+        return number
+    if not value.isdigit():
+        raise ValueError(f"Invalid cron value {value!r}")
+    return int(value)
+
+
+def _parse_field(field: str, minimum: int, maximum: int, names: dict[str, int] | None = None) -> tuple[int, ...]:
+    """
+    Returns the sorted values matched by a single field of a cron expression, e.g. "1-5", "*/15" or "0,30".
+    """
+    values: set[int] = set()
+    for part in field.split(","):
+        range_part, has_step, step_part = part.partition("/")
+        step = 1
+        if has_step:
+            if not step_part.isdigit() or int(step_part) == 0:
+                raise ValueError(f"Invalid cron step in {field!r}")
+            step = int(step_part)
+        if range_part == "*":
+            start, end = minimum, maximum
+        elif "-" in range_part:
+            start_part, end_part = range_part.split("-", 1)
+            start, end = _parse_value(start_part, names or {}), _parse_value(end_part, names or {})
+        else:
+            start = _parse_value(range_part, names or {})
+            end = maximum if has_step else start  # "5/15" means "5-59/15"
+        if not minimum <= start <= end <= maximum:
+            raise ValueError(f"Cron field {field!r} is out of the range {minimum}-{maximum}")
+        values.update(range(start, end + 1, step))
+    return tuple(sorted(values))
+
+
+class CronSchedule:
+    """
+    A schedule described by a standard five-field cron expression: "minute hour day-of-month month day-of-week".
+
+    Each field may be `*`, a value, a range (`1-5`), a step (`*/15`, `0-30/10` or `5/15`), or a comma-separated list
+    of these. Months (`jan`-`dec`) and days of the week (`sun`-`sat`) may also be given by name, and both 0 and 7
+    mean Sunday. The aliases `@yearly` (or `@annually`), `@monthly`, `@weekly`, `@daily` (or `@midnight`) and
+    `@hourly` are also supported.
+
+    As in cron, if both the day of the month and the day of the week are restricted (i.e., neither field starts with
+    `*`), a day matches if *either* field matches it; otherwise, days must match both fields.
+    """
+
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        fields = ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expressions must have 5 fields, got {expression!r}")
+        minute, hour, day, month, weekday = fields
+        self.minutes = _parse_field(minute, 0, 59)
+        self.hours = _parse_field(hour, 0, 23)
+        self.days = _parse_field(day, 1, 31)
+        self.months = _parse_field(month, 1, 12, MONTH_NAMES)
+        self.weekdays = tuple(sorted({value % 7 for value in _parse_field(weekday, 0, 7, WEEKDAY_NAMES)}))
+        self._any_day = day.startswith("*")
+        self._any_weekday = weekday.startswith("*")
+
+        # Fail early for expressions such as "0 0 30 2 *", which never match
+        self.next_after(datetime(2000, 1, 1))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.expression!r})"
+
+    def matches(self, moment: datetime) -> bool:
+        """
+        Returns True if the schedule fires during the minute of `moment`.
+        """
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._next_day(moment.year, moment.month, moment.day) == moment.day
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Returns the first time strictly after `moment` at which the schedule fires, with the same `tzinfo`.
+
+        Rather than testing every minute, each field (from the month down to the minute) is advanced directly to its
+        next matching value, carrying into the enclosing field when it runs out of values.
+        """
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        year, month, day, hour, minute = start.year, start.month, start.day, start.hour, start.minute
+        while year <= start.year + _MAX_SEARCH_YEARS:
+            index = bisect_left(self.months, month)
+            if index == len(self.months):
+                year, month, day, hour, minute = year + 1, self.months[0], 1, 0, 0
+                continue
+            if self.months[index] != month:
+                month, day, hour, minute = self.months[index], 1, 0, 0
+
+            next_day = self._next_day(year, month, day)
+            if next_day is None:
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                day, hour, minute = 1, 0, 0
+                continue
+            if next_day != day:
+                day, hour, minute = next_day, 0, 0
+
+            index = bisect_left(self.hours, hour)
+            if index == len(self.hours):
+                day, hour, minute = day + 1, 0, 0
+                continue
+            if self.hours[index] != hour:
+                hour, minute = self.hours[index], 0
+
+            index = bisect_left(self.minutes, minute)
+            if index == len(self.minutes):
+                hour, minute = hour + 1, 0
+                continue
+            return datetime(year, month, day, hour, self.minutes[index], tzinfo=moment.tzinfo)
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+    def _next_day(self, year: int, month: int, day: int) -> int | None:
+        """
+        Returns the first matching day of the month that is not before `day`, or None if there is none.
+        """
+        days_in_month = calendar.monthrange(year, month)[1]
+        if day > days_in_month:
+            return None
+        day_candidate = self._next_day_of_month(day, days_in_month)
+        weekday_candidate = self._next_day_of_week(year, month, day, days_in_month)
+        if not self._any_day and not self._any_weekday:
+            candidates = [candidate for candidate in (day_candidate, weekday_candidate) if candidate is not None]
+            return min(candidates, default=None)
+        # Both fields must match; advance each to the other's candidate until they agree (at most a few steps)
+        while day_candidate is not None and weekday_candidate is not None and day_candidate != weekday_candidate:
+            day = max(day_candidate, weekday_candidate)
+            day_candidate = self._next_day_of_month(day, days_in_month)
+            weekday_candidate = self._next_day_of_week(year, month, day, days_in_month)
+        return day_candidate if weekday_candidate is not None else None
+
+    def _next_day_of_month(self, day: int, days_in_month: int) -> int | None:
+        index = bisect_left(self.days, day)
+        if index == len(self.days) or self.days[index] > days_in_month:
+            return None
+        return self.days[index]
+
+    def _next_day_of_week(self, year: int, month: int, day: int, days_in_month: int) -> int | None:
+        weekday = (calendar.weekday(year, month, day) + 1) % 7  # cron counts from Sunday
+        next_day = day + min((candidate - weekday) % 7 for candidate in self.weekdays)
+        return next_day if next_day <= days_in_month else None
@@ -0,0 +1,70 @@
+"""
+A `JobLock` backed by files, to run each repeated job in only one of the worker processes of a host.
+
+This module relies on `fcntl`, so it is only available on POSIX systems.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+
+from fastapi_utils.tasks import JobLock
+
+_UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]")
+_LEASE_SIZE = 64
+
+
+class FileJobLock(JobLock):
+    """
+    Locks each job with a lease recorded in a file in `directory` (which must be shared by the processes, e.g.
+    a directory on the local filesystem of the host): the process holding the lock of the job, and until when.
+
+    A process acquires the lock if the lease has expired, or if it already holds it (renewing the lease). The lease is
+    read and updated under an exclusive `flock` on the file, which is only held for the duration of `acquire`, so only
+    one process can acquire the lock at a time.
+
+    As leases are shorter than the interval of the job, the lease taken at one tick has expired by the next one (unless
+    the call is still running), and if a process stops, the other processes keep calling the job from the next tick
+    on. (For the same reason, leases are not deleted on `release`.)
+
+    `owner` identifies the process in the files; it is made of the process ID and a random suffix.
+    """
+
+    def __init__(self, directory: str | os.PathLike[str]) -> None:
+        self.directory = Path(directory)
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def get_path(self, name: str) -> Path:
+        digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+        return self.directory / f"{_UNSAFE_CHARACTERS.sub('_', name)[:100]}-{digest}.lock"
+
+    def acquire(self, name: str, lease: float) -> bool:
+        fd = os.open(self.get_path(name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            expiry, owner = _parse_lease(os.pread(fd, _LEASE_SIZE, 0))
+            if owner != self.owner and expiry > now:
+                return False
+            os.pwrite(fd, f"{now + lease} {self.owner}".ljust(_LEASE_SIZE).encode(), 0)
+            return True
+        finally:
+            os.close(fd)  # also releases the `flock`
+
+
+def _parse_lease(data: bytes) -> tuple[float, str]:
+    """
+    Returns the expiry time and owner of the lease written to a lock file, or an expired lease if it can't be parsed,
+    e.g. if the file is new, was written by something else, or truncated.
+    """
+    try:
+        expiry, owner = data.decode().split()
+        return float(expiry), owner
+    except ValueError:
+        return 0.0, ""
@@ -0,0 +1,336 @@
+"""
+Monitors of the event loop, the garbage collector and the threadpool, to pass as collectors to
+`fastapi_utils.timing.TimingMiddleware`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gc
+import math
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Any
+
+import anyio.to_thread
+from anyio import CapacityLimiter
+from starlette.concurrency import run_in_threadpool
+
+from fastapi_utils.prometheus import _PrometheusApp, _render_histogram
+from fastapi_utils.timing import _STEP_CODES, TimingMonitor, _current_timer, _TimingStats
+
+
+class EventLoopMonitor(TimingMonitor):
+    """
+    Detects when the event loop is blocked (e.g., by sync code called from an `async def` endpoint), and records the
+    stack of the blocking code along with the name of the request it was handling.
+
+    While the app is running, a heartbeat task sleeps for `interval` seconds at a time, and measures the lag
+    between when it should have woken up and when it actually did. The most recent lag is available as `lag`, and
+    the largest lag seen so far as `max_lag` (both in seconds).
+
+    A watchdog thread checks the heartbeat every `interval` seconds; once the loop has been blocked for at least
+    `threshold` seconds, it captures the stack of the event loop thread (up to `stack_limit` frames). When the loop
+    is unblocked, a message with the lag, the metric name of the in-flight request and the captured stack is passed
+    to `record`. Requests that aren't being timed (because they are excluded or not sampled) are reported as
+    `<unknown>`. The number of blocks detected so far is available as `blocks`.
+    """
+
+    def __init__(
+        self,
+        record: Callable[[str], None] | None = None,
+        threshold: float = 0.1,
+        interval: float = 0.02,
+        stack_limit: int = 20,
+    ) -> None:
+        super().__init__(record)
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_limit = stack_limit
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocks = 0
+
+        self._loop_thread_id = 0
+        self._deadline = math.inf
+        self._capture: tuple[float, str, str] | None = None
+        self._heartbeat_task: asyncio.Future[None] | None = None
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    async def startup(self) -> None:
+        if self._heartbeat_task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat_task = asyncio.ensure_future(self._beat_periodically())
+        self._thread = threading.Thread(target=self._watch, name="fastapi-utils-loop-monitor", daemon=True)
+        self._thread.start()
+
+    async def shutdown(self) -> None:
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            await run_in_threadpool(thread.join)
+            self._thread = None
+            self._stopping.clear()
+
+    async def _beat_periodically(self) -> None:
+        interval = self.interval
+        while True:
+            deadline = self._deadline = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            lag = max(time.monotonic() - deadline, 0.0)
+            self.lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self.blocks += 1
+                self._report_block(deadline, lag)
+
+    def _report_block(self, deadline: float, lag: float) -> None:
+        capture = self._capture
+        if capture is not None and capture[0] == deadline:
+            name, stack = capture[1], capture[2]
+        else:
+            name, stack = "<unknown>", ""
+        message = f"LOOP BLOCKED: {1000 * lag:6.1f}ms | {name}"
+        if stack:
+            message += f"\n{stack.rstrip()}"
+        self._report(message)
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.interval):
+            deadline = self._deadline
+            capture = self._capture
+            if (capture is None or capture[0] != deadline) and time.monotonic() - deadline >= self.threshold:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    name, stack = _describe_loop_frame(frame, self.stack_limit)
+                    self._capture = (deadline, name, stack)
+
+
+def _describe_loop_frame(frame: Any, stack_limit: int) -> tuple[str, str]:
+    """
+    Returns the metric name of the request being handled by the event loop (found by looking for the
+    `_CPUAccountedAwaitable` driving it further up the stack) and the formatted stack, for the event loop frame `frame`.
+    """
+    name = "<unknown>"
+    step_frame = frame
+    while step_frame is not None:
+        if step_frame.f_code in _STEP_CODES:
+            stats = step_frame.f_locals.get("stats")
+            if stats is not None and stats.name is not None:
+                name = stats.name
+            break
+        step_frame = step_frame.f_back
+    return name, "".join(traceback.format_stack(frame, limit=stack_limit))
+
+
+class GcMonitor(TimingMonitor):
+    """
+    Measures the pauses caused by the garbage collector, and charges each pause to the requests in flight at the time.
+
+    While the app is running, a callback registered in `gc.callbacks` times every collection. For each generation
+    (0 to 2), `collections[generation]` is the number of collections so far, `pause_time[generation]` their total
+    duration and `max_pause[generation]` the longest one (in seconds).
+
+    The duration of each pause is added to the `gc_ns` of the timing data of every request in flight at the time, since
+    a collection pauses all of the threads in the process. This lets the `TimingAggregator` and `PrometheusCollector`
+    report the latency of each route both including and excluding garbage collection pauses. Any pause that lasts at
+    least `threshold` seconds is also reported by passing a message with its duration, generation and the metric names
+    of the requests in flight to `record`.
+
+    The callback adds a small overhead to every collection, so this is opt-in.
+    """
+
+    def __init__(self, record: Callable[[str], None] | None = None, threshold: float = 0.05) -> None:
+        super().__init__(record)
+        self.threshold = threshold
+        self.collections = [0, 0, 0]
+        self.pause_time = [0.0, 0.0, 0.0]
+        self.max_pause = [0.0, 0.0, 0.0]
+
+        self._in_flight: set[_TimingStats] = set()
+        self._paused: list[_TimingStats] = []
+        self._start_ns = 0
+        self._running = False
+
+    def request_started(self, stats: _TimingStats) -> None:
+        if self._running:
+            stats.gc_ns = 0
+            self._in_flight.add(stats)
+
+    def request_finished(self, stats: _TimingStats) -> None:
+        self._in_flight.discard(stats)
+
+    async def startup(self) -> None:
+        if not self._running:
+            self._running = True
+            gc.callbacks.append(self._on_collection)
+
+    async def shutdown(self) -> None:
+        if self._running:
+            self._running = False
+            gc.callbacks.remove(self._on_collection)
+            self._in_flight.clear()
+
+    def _on_collection(self, phase: str, info: dict[str, int]) -> None:
+        if phase == "start":
+            self._paused = list(self._in_flight)
+            self._start_ns = time.perf_counter_ns()
+            return
+        pause_ns = time.perf_counter_ns() - self._start_ns
+        generation = info["generation"]
+        pause = pause_ns / 1e9
+        self.collections[generation] += 1
+        self.pause_time[generation] += pause
+        if pause > self.max_pause[generation]:
+            self.max_pause[generation] = pause
+        paused = self._paused
+        for stats in paused:
+            stats.gc_ns = (stats.gc_ns or 0) + pause_ns
+        self._paused = []
+        if pause >= self.threshold:
+            names = ", ".join(sorted({str(stats.name) for stats in paused})) or "<none>"
+            self._report(
+                f"GC PAUSE: {1000 * pause:6.1f}ms | Generation: {generation} | Collected: {info['collected']}"
+                f" | In flight: {names}"
+            )
+
+
+class ThreadpoolMonitor(_PrometheusApp, TimingMonitor):
+    """
+    Measures the saturation of the threadpool used to run sync code (e.g., `def` endpoints and dependencies, sync
+    `repeat_every` functions, and `FastAPISessionMaker.get_db`), and how long calls wait to be run in it.
+
+    Sync code is run in anyio's default worker thread pool, which allows at most `total_tokens` concurrent calls (40
+    by default); further calls wait for a token to become available. While the app is running:
+
+    * `borrowed_tokens` is the number of calls currently running in the threadpool (and `max_borrowed_tokens` the
+      largest number seen so far), `total_tokens` is the capacity of the threadpool, and `waiting` is the number of
+      calls currently waiting for a token
+    * The time each call waits for a token is recorded (`calls` is the number of calls so far, `max_wait` the longest
+      wait, in seconds), and added to the `threadpool_wait_ns` of the timing data of the request making the call
+    * Any call that waits for at least `threshold` seconds is reported by passing a message with the wait time and the
+      metric name of the request making the call to `record`
+
+    If `total_tokens` is provided, the capacity of the threadpool is set to it at startup, e.g. from configuration:
+
+        ThreadpoolMonitor(total_tokens=get_api_settings().threadpool_tokens)
+
+    `render` returns the metrics in the Prometheus text exposition format (as `<namespace>_threadpool_*` metrics, with
+    `buckets` as the upper bounds of the wait time histogram buckets); like a `PrometheusCollector`, the monitor is
+    also an ASGI app that serves the rendered metrics.
+
+    Waits are measured by wrapping the `acquire` method of the default thread limiter of the event loop, which is
+    restored at shutdown.
+    """
+
+    default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(
+        self,
+        total_tokens: int | None = None,
+        record: Callable[[str], None] | None = None,
+        threshold: float = 0.1,
+        namespace: str = "fastapi",
+        buckets: Sequence[float] = default_buckets,
+    ) -> None:
+        super().__init__(record)
+        self.configured_tokens = total_tokens
+        self.threshold = threshold
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.calls = 0
+        self.wait_sum = 0.0
+        self.max_wait = 0.0
+        self.wait_counts = [0] * (len(self.buckets) + 1)
+        self.max_borrowed_tokens = 0
+
+        self._limiter: CapacityLimiter | None = None
+        self._acquire: Callable[[], Awaitable[None]] | None = None
+
+    @property
+    def borrowed_tokens(self) -> int:
+        return self._limiter.borrowed_tokens if self._limiter is not None else 0
+
+    @property
+    def total_tokens(self) -> float:
+        return self._limiter.total_tokens if self._limiter is not None else 0
+
+    @property
+    def waiting(self) -> int:
+        return self._limiter.statistics().tasks_waiting if self._limiter is not None else 0
+
+    async def startup(self) -> None:
+        if self._limiter is not None:
+            return
+        limiter = self._limiter = anyio.to_thread.current_default_thread_limiter()
+        if self.configured_tokens is not None:
+            limiter.total_tokens = self.configured_tokens
+        self._acquire = limiter.acquire
+        # Shadows the method for this instance only; `async with limiter` calls `limiter.acquire()`
+        setattr(limiter, "acquire", self._timed_acquire)
+
+    async def shutdown(self) -> None:
+        limiter = self._limiter
+        if limiter is not None:
+            if vars(limiter).get("acquire") == self._timed_acquire:
+                delattr(limiter, "acquire")
+            self._limiter = self._acquire = None
+
+    def render(self) -> str:
+        """
+        Returns the threadpool metrics in the Prometheus text exposition format.
+        """
+        prefix = f"{self.namespace}_threadpool"
+        lines = []
+        for gauge_name, description, value in (
+            ("tokens_borrowed", "Number of calls currently running in the threadpool.", self.borrowed_tokens),
+            ("tokens_total", "Maximum number of concurrent calls in the threadpool.", self.total_tokens),
+            ("tasks_waiting", "Number of calls currently waiting to run in the threadpool.", self.waiting),
+        ):
+            lines.append(f"# HELP {prefix}_{gauge_name} {description}")
+            lines.append(f"# TYPE {prefix}_{gauge_name} gauge")
+            lines.append(f"{prefix}_{gauge_name} {value!r}")
+        histogram_name = f"{prefix}_wait_seconds"
+        lines.append(f"# HELP {histogram_name} Time calls waited to run in the threadpool.")
+        lines.append(f"# TYPE {histogram_name} histogram")
+        lines.extend(_render_histogram(histogram_name, "", self.buckets, self.wait_counts, self.wait_sum, self.calls))
+        lines.append("")
+        return "\n".join(lines)
+
+    async def _timed_acquire(self) -> None:
+        acquire = self._acquire
+        limiter = self._limiter
+        if acquire is None or limiter is None:  # pragma: no cover
+            raise RuntimeError("ThreadpoolMonitor is not running")
+        start_ns = time.perf_counter_ns()
+        await acquire()
+        wait_ns = time.perf_counter_ns() - start_ns
+        wait = wait_ns / 1e9
+        self.calls += 1
+        self.wait_sum += wait
+        self.wait_counts[bisect_left(self.buckets, wait)] += 1
+        if wait > self.max_wait:
+            self.max_wait = wait
+        borrowed_tokens = limiter.borrowed_tokens
+        if borrowed_tokens > self.max_borrowed_tokens:
+            self.max_borrowed_tokens = borrowed_tokens
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.threadpool_wait_ns += wait_ns
+        if wait >= self.threshold:
+            name = timer.name if timer is not None and timer.name is not None else "<unknown>"
+            self._report(
+                f"THREADPOOL WAIT: {1000 * wait:6.1f}ms"
+                f" | Tokens: {borrowed_tokens}/{limiter.total_tokens} | Waiting: {limiter.statistics().tasks_waiting}"
+                f" | {name}"
+            )
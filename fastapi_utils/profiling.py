@@ -0,0 +1,342 @@
+"""
+Sampling profilers for the requests timed by `fastapi_utils.timing.TimingMiddleware`.
+
+Profiles are written in the "collapsed stack" format understood by flame graph tools (such as `flamegraph.pl`,
+`inferno` or speedscope): one line per distinct stack, listing its frames from outermost to innermost separated by
+semicolons, followed by the number of samples in which that stack was seen.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Mapping, Sequence
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from fastapi import FastAPI, HTTPException, Query, params
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
+
+from fastapi_utils.timing import _STEP_CODES, TimingCollector, _CPUAccountedAwaitable, _ThreadCPUAccounted, _TimingStats
+
+logger = logging.getLogger(__name__)
+
+_THREAD_CALL_CODE = _ThreadCPUAccounted.__call__.__code__
+_INVALID_FILENAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]")
+_NEVER = 1 << 62
+
+
+def add_profile_route(
+    app: FastAPI,
+    path: str = "/debug/profile",
+    dependencies: Sequence[params.Depends] | None = None,
+    max_seconds: float = 60.0,
+    interval: float = 0.01,
+) -> None:
+    """
+    Adds a route to the provided `app` at `path` that profiles the whole process for the number of seconds
+    given by the `seconds` query parameter (up to `max_seconds`; 10, or `max_seconds` if lower, by default), and
+    returns the result as collapsed stacks.
+
+    The stacks of all threads (including the event loop and the threadpool workers) are sampled every `interval`
+    seconds, from a thread in the threadpool; each stack is prefixed with the name of its thread. Only one profile can
+    be taken at a time; concurrent requests are rejected with a 409 response.
+
+    The route isn't included in the OpenAPI schema. Use `dependencies` to require authentication for it.
+    """
+    lock = threading.Lock()
+
+    async def get_profile(
+        seconds: float = Query(min(10.0, max_seconds), gt=0, le=max_seconds),
+    ) -> PlainTextResponse:
+        if not lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A profile is already being taken")
+        try:
+            samples = await run_in_threadpool(sample_stacks, seconds, interval)
+        finally:
+            lock.release()
+        return PlainTextResponse(format_collapsed_stacks(samples))
+
+    app.add_api_route(path, get_profile, methods=["GET"], dependencies=dependencies, include_in_schema=False)
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Counter[str]:
+    """
+    Samples the stacks of all threads (except the calling one) every `interval` seconds for `seconds` seconds, and
+    returns the number of times each collapsed stack (prefixed with the name of its thread) was seen.
+
+    This blocks the calling thread for the duration of the profile.
+    """
+    samples: Counter[str] = Counter()
+    own_thread_id = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while True:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, stack in _get_thread_stacks().items():
+            if thread_id != own_thread_id:
+                thread_name = thread_names.get(thread_id, str(thread_id)).replace(";", ":")
+                samples[f"{thread_name};{_collapse(stack)}"] += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return samples
+        time.sleep(min(interval, remaining))
+
+
+class SlowRequestProfiler(TimingCollector):
+    """
+    Saves a sampled profile of each request that takes at least `threshold` seconds to a file in `directory`.
+
+    Different thresholds can be used for specific routes by passing a mapping from generated metric names to
+    thresholds as `route_thresholds` (a value of `None` disables profiling for that route).
+
+    Profiling only starts once a request has been in flight for `soft_threshold` seconds (by default, half of the
+    route's threshold): from then until the request finishes, a background thread samples the request's stack every
+    `interval` seconds. The stack is taken from the thread running the request if it is currently running (on the
+    event loop, or in the threadpool for `def` endpoints), and from the chain of coroutines it is awaiting otherwise.
+    If the request finishes within its threshold, the samples are discarded. While no request is past its soft
+    threshold, the thread just waits, so the overhead for requests that aren't slow is negligible.
+
+    At most `max_per_hour` profiles are saved per route in any hour. Each profile is saved in the collapsed stack
+    format as `<metric name>-<timestamp in ms>.collapsed`, and if `record` is provided, it is called with a message
+    containing the path of each saved profile.
+
+    The profiler must be passed directly to `add_timing_middleware` as one of its `collectors` (not wrapped in a
+    `BatchedEmitter`). Only timed requests can be profiled, so requests that aren't sampled are only profiled if the
+    `SamplingPolicy` has a `slow_threshold`.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        threshold: float = 1.0,
+        soft_threshold: float | None = None,
+        route_thresholds: Mapping[str, float | None] | None = None,
+        interval: float = 0.005,
+        max_per_hour: int = 10,
+        record: Callable[[str], None] | None = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.threshold = threshold
+        self.soft_threshold = soft_threshold
+        self.route_thresholds = dict(route_thresholds or {})
+        self.interval = interval
+        self.max_per_hour = max_per_hour
+        self.record = record
+        self.saved = 0
+
+        self._requests: dict[_TimingStats, _ProfiledRequest] = {}
+        self._captures: dict[str, deque[float]] = {}
+        self._pending: list[tuple[str, float, Counter[str]]] = []
+        self._lock = threading.Lock()
+        self._next_wake_ns = _NEVER
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def observe(self, stats: _TimingStats) -> None:
+        pass
+
+    def request_started(self, stats: _TimingStats) -> None:
+        name = stats.name or ""
+        threshold = self.route_thresholds.get(name, self.threshold)
+        if threshold is None or not self._has_capacity(name, time.monotonic()):
+            return
+        soft_threshold = threshold / 2 if self.soft_threshold is None else min(self.soft_threshold, threshold)
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        request = _ProfiledRequest(stats, task, int(threshold * 1e9), stats.start_ns + int(soft_threshold * 1e9))
+        with self._lock:
+            self._requests[stats] = request
+            wake = request.soft_deadline_ns < self._next_wake_ns
+        if self._thread is None:
+            self._start_thread()
+        elif wake:
+            self._wake.set()
+
+    def request_finished(self, stats: _TimingStats) -> None:
+        with self._lock:
+            request = self._requests.pop(stats, None)
+        if request is None or not request.samples or stats.end_ns - stats.start_ns < request.threshold_ns:
+            return
+        name = stats.name or ""
+        now = time.monotonic()
+        if not self._has_capacity(name, now):
+            return
+        self._captures.setdefault(name, deque()).append(now)
+        with self._lock:
+            self._pending.append((name, stats.time, request.samples))
+        self._wake.set()
+
+    async def startup(self) -> None:
+        if self._thread is None:
+            self._start_thread()
+
+    async def shutdown(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._stopping = True
+            self._wake.set()
+            await run_in_threadpool(thread.join)
+            self._thread = None
+            self._stopping = False
+        self._write_pending()
+
+    def _has_capacity(self, name: str, now: float) -> bool:
+        """
+        Returns True if fewer than `max_per_hour` profiles have been saved for the named route in the last hour
+        """
+        captures = self._captures.get(name)
+        if captures is None:
+            return self.max_per_hour > 0
+        while captures and now - captures[0] >= 3600:
+            captures.popleft()
+        return len(captures) < self.max_per_hour
+
+    def _start_thread(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="fastapi-utils-slow-request-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        interval_ns = int(self.interval * 1e9)
+        while not self._stopping:
+            # Cleared before checking the requests, so that a request started after the check wakes the thread
+            self._wake.clear()
+            self._write_pending()
+            now = time.perf_counter_ns()
+            with self._lock:
+                requests = list(self._requests.values())
+                next_wake_ns = min((request.soft_deadline_ns for request in requests), default=_NEVER)
+                sampling = next_wake_ns <= now
+                if sampling:
+                    next_wake_ns = now + interval_ns
+                self._next_wake_ns = next_wake_ns
+            if sampling:
+                thread_stacks = _get_thread_stacks()
+                for request in requests:
+                    if request.soft_deadline_ns <= now:
+                        stack = _get_request_stack(request.stats, request.task, thread_stacks)
+                        if stack:
+                            request.samples[_collapse(stack)] += 1
+            if next_wake_ns == _NEVER:
+                self._wake.wait()
+            else:
+                self._wake.wait(max(next_wake_ns - time.perf_counter_ns(), 0) / 1e9)
+
+    def _write_pending(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for name, seconds, samples in pending:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                filename = f"{_INVALID_FILENAME_CHARACTERS.sub('_', name)}-{int(time.time() * 1000)}.collapsed"
+                path = self.directory / filename
+                path.write_text(format_collapsed_stacks(samples))
+            except OSError:
+                logger.exception("Error saving the profile of a slow request to %s", name)
+                continue
+            self.saved += 1
+            if self.record is not None:
+                self.record(f"PROFILE: Wall: {1000 * seconds:6.1f}ms | {name} | {path}")
+
+
+class _ProfiledRequest:
+    """
+    The state of a request being tracked by a `SlowRequestProfiler`.
+    """
+
+    __slots__ = ("stats", "task", "threshold_ns", "soft_deadline_ns", "samples")
+
+    def __init__(
+        self, stats: _TimingStats, task: asyncio.Task[Any] | None, threshold_ns: int, soft_deadline_ns: int
+    ) -> None:
+        self.stats = stats
+        self.task = task
+        self.threshold_ns = threshold_ns
+        self.soft_deadline_ns = soft_deadline_ns
+        self.samples: Counter[str] = Counter()
+
+
+def format_collapsed_stacks(samples: Mapping[str, int]) -> str:
+    """
+    Formats a mapping from collapsed stacks to sample counts as the lines of a collapsed stack file
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+
+
+def _collapse(stack: list[FrameType]) -> str:
+    return ";".join(_get_frame_label(frame) for frame in stack)
+
+
+def _get_frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _get_thread_stacks() -> dict[int, list[FrameType]]:
+    """
+    Returns the current stack of each thread, from the outermost frame to the innermost
+    """
+    thread_stacks = {}
+    for thread_id, frame in sys._current_frames().items():
+        stack = []
+        current: FrameType | None = frame
+        while current is not None:
+            stack.append(current)
+            current = current.f_back
+        stack.reverse()
+        thread_stacks[thread_id] = stack
+    return thread_stacks
+
+
+def _get_request_stack(
+    stats: _TimingStats, task: asyncio.Task[Any] | None, thread_stacks: Mapping[int, list[FrameType]]
+) -> list[FrameType]:
+    """
+    Returns the stack of the request being timed by `stats`, below the `TimingMiddleware`.
+
+    If the request is running on the event loop, this is the part of the loop thread's stack below the
+    `_CPUAccountedAwaitable` driving it; otherwise, it is made up of the frames of the coroutines it is awaiting,
+    followed by the stack of the threadpool thread running its endpoint, if any.
+    """
+    worker_stack: list[FrameType] = []
+    for stack in thread_stacks.values():
+        for i, frame in enumerate(stack):
+            code = frame.f_code
+            if code in _STEP_CODES and frame.f_locals.get("stats") is stats:
+                return stack[i + 1 :]
+            if code is _THREAD_CALL_CODE and frame.f_locals.get("timer") is stats:
+                worker_stack = stack[i + 1 :]
+    return _get_awaited_frames(stats, task) + worker_stack
+
+
+def _get_awaited_frames(stats: _TimingStats, task: asyncio.Task[Any] | None) -> list[FrameType]:
+    """
+    Returns the frames of the chain of coroutines awaited by the suspended `task`, below the `_CPUAccountedAwaitable`
+    for `stats`
+    """
+    frames: list[FrameType] = []
+    if task is None:
+        return frames
+    awaitable: Any = task.get_coro()
+    inside = False
+    while awaitable is not None:
+        if isinstance(awaitable, _CPUAccountedAwaitable):
+            inside = inside or awaitable.stats is stats
+            awaitable = awaitable.coroutine
+            continue
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        if inside:
+            frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
@@ -0,0 +1,274 @@
+"""
+Exposition of the timing data recorded by `fastapi_utils.timing.TimingMiddleware` in the Prometheus text format.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import accumulate
+from operator import attrgetter
+
+from fastapi import FastAPI
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from fastapi_utils.timing import TimingCollector, _TimingStats
+
+
+class _PrometheusApp:
+    """
+    Mixin for collectors that are also ASGI apps serving the metrics returned by their `render` method in the
+    Prometheus text exposition format.
+    """
+
+    # starlette appends the charset to text media types
+    media_type = "text/plain; version=0.0.4"
+
+    def render(self) -> str:
+        raise NotImplementedError
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = Response(self.render(), media_type=self.media_type)
+        await response(scope, receive, send)
+
+
+def add_metrics_route(app: FastAPI, collector: ASGIApp, path: str = "/metrics") -> None:
+    """
+    Adds a route to the provided `app` that serves the metrics gathered by `collector` at `path`.
+
+    The `collector` can be a `PrometheusCollector`, or a `fastapi_utils.shared_timing.SharedTimingCollector`
+    (to serve the metrics of all workers).
+
+    The `collector` should also be passed to `add_timing_middleware` (as one of its `collectors`).
+    """
+    app.add_route(path, collector, include_in_schema=False)
+
+
+class PrometheusCollector(_PrometheusApp, TimingCollector):
+    """
+    Counts requests and builds histograms of their wall and CPU times per route, in the form expected by Prometheus.
+
+    The following metrics are exposed, each labeled by `route` (the generated metric name):
+
+    * `<namespace>_requests_total`: a counter of the requests handled
+    * `<namespace>_request_duration_seconds`: a histogram of the wall time taken to handle requests
+    * `<namespace>_request_cpu_seconds`: a histogram of the CPU time used handling requests
+    * `<namespace>_time_to_first_byte_seconds`: a histogram of the wall time taken before starting each response
+    * `<namespace>_request_queue_seconds`: a histogram of the time requests were queued before reaching the app
+      (for requests whose queue time is known; see `add_timing_middleware`)
+    * `<namespace>_request_gc_seconds`: a histogram of the time requests were paused by garbage collections
+      (if a `monitors.GcMonitor` is running)
+    * `<namespace>_response_size_bytes`: a histogram of the size of the response bodies sent
+    * `<namespace>_response_chunks_total`: a counter of the (non-empty) response body chunks sent
+
+    `buckets` are the upper bounds of the histogram buckets for wall, queue and times to first byte (in seconds),
+    `cpu_buckets` for CPU times (defaulting to `buckets`), and `size_buckets` for response sizes (in bytes).
+
+    `render` returns the metrics in the Prometheus text exposition format; the collector is also an ASGI app that
+    serves the rendered metrics, so it can be mounted or added as a route (see `add_metrics_route`).
+    """
+
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+    default_size_buckets = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+    def __init__(
+        self,
+        namespace: str = "fastapi",
+        buckets: Sequence[float] = default_buckets,
+        cpu_buckets: Sequence[float] | None = None,
+        size_buckets: Sequence[float] = default_size_buckets,
+    ) -> None:
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.cpu_buckets = tuple(sorted(cpu_buckets)) if cpu_buckets is not None else self.buckets
+        self.size_buckets = tuple(sorted(size_buckets))
+        self.metrics: dict[str | None, _RouteMetrics] = {}
+
+    def observe(self, stats: _TimingStats) -> None:
+        metrics = self.metrics.get(stats.name)
+        if metrics is None:
+            metrics = self.metrics[stats.name] = _RouteMetrics(
+                str(stats.name), len(self.buckets) + 1, len(self.cpu_buckets) + 1, len(self.size_buckets) + 1
+            )
+        wall_time = stats.time
+        cpu_time = stats.cpu_time
+        metrics.count += 1
+        metrics.wall_sum += wall_time
+        metrics.wall_counts[bisect_left(self.buckets, wall_time)] += 1
+        metrics.cpu_sum += cpu_time
+        metrics.cpu_counts[bisect_left(self.cpu_buckets, cpu_time)] += 1
+        if stats.response_start_ns:
+            ttfb = (stats.response_start_ns - stats.start_ns) / 1e9
+            metrics.ttfb_count += 1
+            metrics.ttfb_sum += ttfb
+            metrics.ttfb_counts[bisect_left(self.buckets, ttfb)] += 1
+            metrics.size_sum += stats.bytes_sent
+            metrics.size_counts[bisect_left(self.size_buckets, stats.bytes_sent)] += 1
+            metrics.chunks += stats.chunks
+        if stats.queue_ns is not None:
+            queue_time = stats.queue_ns / 1e9
+            metrics.queue_count += 1
+            metrics.queue_sum += queue_time
+            metrics.queue_counts[bisect_left(self.buckets, queue_time)] += 1
+        if stats.gc_ns is not None:
+            gc_time = stats.gc_ns / 1e9
+            metrics.gc_count += 1
+            metrics.gc_sum += gc_time
+            metrics.gc_counts[bisect_left(self.buckets, gc_time)] += 1
+
+    def render(self) -> str:
+        """
+        Returns the collected metrics in the Prometheus text exposition format.
+        """
+        return _render_prometheus_metrics(
+            self.namespace, self.buckets, self.cpu_buckets, self.size_buckets, list(self.metrics.values())
+        )
+
+
+class _RouteMetrics:
+    """
+    The request count, and the wall time, CPU time, queue time, time to first byte and response size histograms,
+    collected for a single route by a `PrometheusCollector`.
+
+    The histogram counts are per-bucket (not cumulative), with a final bucket for values above the largest bound.
+    The time to first byte and response size histograms only count requests for which a response was started
+    (`ttfb_count`), the queue time histogram only counts requests whose queue time is known (`queue_count`), and the
+    garbage collection pause histogram only counts requests timed while a `GcMonitor` was running (`gc_count`).
+    """
+
+    __slots__ = (
+        "name",
+        "count",
+        "wall_sum",
+        "wall_counts",
+        "cpu_sum",
+        "cpu_counts",
+        "ttfb_count",
+        "ttfb_sum",
+        "ttfb_counts",
+        "size_sum",
+        "size_counts",
+        "chunks",
+        "queue_count",
+        "queue_sum",
+        "queue_counts",
+        "gc_count",
+        "gc_sum",
+        "gc_counts",
+    )
+
+    def __init__(self, name: str, n_wall_buckets: int, n_cpu_buckets: int, n_size_buckets: int) -> None:
+        self.name = name
+        self.count = 0
+        self.wall_sum = 0.0
+        self.wall_counts = [0] * n_wall_buckets
+        self.cpu_sum = 0.0
+        self.cpu_counts = [0] * n_cpu_buckets
+        self.ttfb_count = 0
+        self.ttfb_sum = 0.0
+        self.ttfb_counts = [0] * n_wall_buckets
+        self.size_sum = 0
+        self.size_counts = [0] * n_size_buckets
+        self.chunks = 0
+        self.queue_count = 0
+        self.queue_sum = 0.0
+        self.queue_counts = [0] * n_wall_buckets
+        self.gc_count = 0
+        self.gc_sum = 0.0
+        self.gc_counts = [0] * n_wall_buckets
+
+
+def _render_prometheus_metrics(
+    namespace: str,
+    buckets: Sequence[float],
+    cpu_buckets: Sequence[float],
+    size_buckets: Sequence[float],
+    metrics: Iterable[_RouteMetrics],
+) -> str:
+    """
+    Renders the provided route metrics in the Prometheus text exposition format.
+    """
+    metrics = sorted(metrics, key=attrgetter("name"))
+    labels = [f'route="{_escape_label_value(route_metrics.name)}"' for route_metrics in metrics]
+
+    lines = []
+    for counter_name, description, count_attribute in (
+        ("requests_total", "Total number of requests handled", "count"),
+        ("response_chunks_total", "Total number of response body chunks sent", "chunks"),
+    ):
+        counter_name = f"{namespace}_{counter_name}"
+        lines.append(f"# HELP {counter_name} {description}, by route.")
+        lines.append(f"# TYPE {counter_name} counter")
+        lines.extend(
+            f"{counter_name}{{{label}}} {getattr(route_metrics, count_attribute)}"
+            for label, route_metrics in zip(labels, metrics)
+        )
+
+    for histogram_name, description, histogram_buckets, counts_attribute, sum_attribute, count_attribute in (
+        ("request_duration_seconds", "Wall time taken to handle requests", buckets, "wall_counts", "wall_sum", "count"),
+        ("request_cpu_seconds", "CPU time used handling requests", cpu_buckets, "cpu_counts", "cpu_sum", "count"),
+        (
+            "time_to_first_byte_seconds",
+            "Wall time taken before starting responses",
+            buckets,
+            "ttfb_counts",
+            "ttfb_sum",
+            "ttfb_count",
+        ),
+        ("response_size_bytes", "Size of response bodies sent", size_buckets, "size_counts", "size_sum", "ttfb_count"),
+        (
+            "request_queue_seconds",
+            "Time requests were queued before reaching the app",
+            buckets,
+            "queue_counts",
+            "queue_sum",
+            "queue_count",
+        ),
+        (
+            "request_gc_seconds",
+            "Time requests were paused by garbage collections",
+            buckets,
+            "gc_counts",
+            "gc_sum",
+            "gc_count",
+        ),
+    ):
+        histogram_name = f"{namespace}_{histogram_name}"
+        lines.append(f"# HELP {histogram_name} {description}, by route.")
+        lines.append(f"# TYPE {histogram_name} histogram")
+        for label, route_metrics in zip(labels, metrics):
+            lines.extend(
+                _render_histogram(
+                    histogram_name,
+                    label,
+                    histogram_buckets,
+                    getattr(route_metrics, counts_attribute),
+                    getattr(route_metrics, sum_attribute),
+                    getattr(route_metrics, count_attribute),
+                )
+            )
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _render_histogram(
+    name: str, label: str, buckets: Sequence[float], counts: Iterable[int], total: float, count: int
+) -> Iterator[str]:
+    """
+    Yields the bucket, sum and count samples of a histogram in the Prometheus text exposition format, from its
+    per-bucket (not cumulative) `counts`, with a final bucket for values above the largest bound.
+
+    `label` holds any labels of the histogram (e.g., `route="app.index"`), without the braces.
+    """
+    le_values = [repr(float(bound)) for bound in buckets] + ["+Inf"]
+    bucket_labels = f"{label}," if label else ""
+    for le, cumulative_count in zip(le_values, accumulate(counts)):
+        yield f'{name}_bucket{{{bucket_labels}le="{le}"}} {cumulative_count}'
+    labels = f"{{{label}}}" if label else ""
+    yield f"{name}_sum{labels} {total!r}"
+    yield f"{name}_count{labels} {count}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,283 @@
+"""
+Aggregation of timing data across the worker processes of a server (e.g., `uvicorn --workers 16`).
+
+Each worker records the latencies of its requests into its own slot of a memory-mapped file shared by all workers,
+so recording never needs to wait for a lock, and any worker can merge the slots to report on the whole host.
+
+This module relies on `fcntl`, so it is only available on POSIX systems.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Iterator
+from operator import add
+from pathlib import Path
+
+from fastapi_utils.prometheus import _escape_label_value, _PrometheusApp
+from fastapi_utils.timing import TimingCollector, TimingSummary, _LatencyHistogram, _TimingStats
+
+_MAGIC = b"FUTS"
+_VERSION = 1
+_FILE_HEADER = struct.Struct("<4sIIII")
+_FILE_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<QQ")
+_NAME_SIZE = 128
+# count, wall_sum, cpu_sum, wall_max, cpu_max (durations in microseconds)
+_N_ROUTE_FIELDS = 5
+_N_BUCKETS = _LatencyHistogram.N_BUCKETS
+# The wall and CPU time histogram counts are 64-bit, as they are never reset
+_ROUTE_SIZE = _NAME_SIZE + 8 * _N_ROUTE_FIELDS + 2 * 8 * _N_BUCKETS
+
+
+class SharedTimingCollector(_PrometheusApp, TimingCollector):
+    """
+    Records histograms of the wall and CPU times of requests per route in a memory-mapped file at `path`, shared by
+    all of the worker processes on a host that use the same `path`.
+
+    The file is divided into `max_workers` slots, each holding the histograms for up to `max_routes` routes.
+    Each worker claims a slot the first time it records a request (reusing the slot of a worker that has exited, if
+    necessary, so the recorded data is kept), and only ever writes to its own slot; a lock on the file is only
+    taken while claiming a slot. Requests for routes beyond the first `max_routes` in a slot aren't recorded; they are
+    counted in `dropped`. Route names are truncated to 127 bytes.
+
+    Each route takes about 17KB in a slot, so with the defaults the file is about 17MB. It is created as a sparse
+    file, so only the parts holding recorded routes take up disk space and memory.
+
+    Histograms use the same log-bucketed layout as `TimingAggregator`, and are never reset, so the file should be
+    removed when the server is (re)started.
+
+    `summaries` merges the slots of all workers into a `TimingSummary` per route, and `render` into summary metrics in
+    the Prometheus text exposition format (labeled by `route`):
+
+    * `<namespace>_requests_total`: a counter of the requests handled
+    * `<namespace>_request_duration_seconds`: the quantiles of the wall time taken to handle requests
+    * `<namespace>_request_cpu_seconds`: the quantiles of the CPU time used handling requests
+
+    Like `fastapi_utils.prometheus.PrometheusCollector`, the collector is also an ASGI app serving the rendered
+    metrics (see `add_metrics_route`); whichever worker handles the request reports the metrics for all of them.
+    """
+
+    quantiles = (0.5, 0.9, 0.99)
+
+    def __init__(
+        self, path: str | Path, namespace: str = "fastapi", max_workers: int = 16, max_routes: int = 64
+    ) -> None:
+        self.path = Path(path)
+        self.namespace = namespace
+        self.max_workers = max_workers
+        self.max_routes = max_routes
+        self.dropped = 0
+
+        self._pid = 0
+        self._mmap: mmap.mmap | None = None
+        self._slot_offset = 0
+        self._slot_header: memoryview | None = None
+        self._routes: dict[str | None, tuple[memoryview, memoryview]] = {}
+
+    def observe(self, stats: _TimingStats) -> None:
+        if self._pid != os.getpid():
+            self._attach()
+        route = self._routes.get(stats.name)
+        if route is None:
+            route = self._add_route(stats.name)
+            if route is None:
+                self.dropped += 1
+                return
+        fields, counts = route
+        wall_us = min(max((stats.end_ns - stats.start_ns) // 1000, 0), _LatencyHistogram.MAX_VALUE)
+        cpu_us = min(max(stats.end_cpu_ns // 1000, 0), _LatencyHistogram.MAX_VALUE)
+        counts[_LatencyHistogram._bucket_index(wall_us)] += 1
+        counts[_N_BUCKETS + _LatencyHistogram._bucket_index(cpu_us)] += 1
+        fields[1] += wall_us
+        fields[2] += cpu_us
+        if wall_us > fields[3]:
+            fields[3] = wall_us
+        if cpu_us > fields[4]:
+            fields[4] = cpu_us
+        # Updated last, so readers never see a count that includes an incompletely recorded request
+        fields[0] += 1
+
+    def summaries(self) -> list[TimingSummary]:
+        """
+        Returns a summary of the timing data recorded by all workers for each route, sorted by route name.
+        """
+        return [_summarize(name, *merged) for name, merged in sorted(self._merge_slots().items())]
+
+    def render(self) -> str:
+        """
+        Returns the timing data recorded by all workers in the Prometheus text exposition format.
+        """
+        merged_routes = sorted(self._merge_slots().items())
+        requests_total = f"{self.namespace}_requests_total"
+        lines = [
+            f"# HELP {requests_total} Total number of requests handled by all workers, by route.",
+            f"# TYPE {requests_total} counter",
+        ]
+        lines.extend(
+            f'{requests_total}{{route="{_escape_label_value(name)}"}} {fields[0]}'
+            for name, (fields, _, _) in merged_routes
+        )
+        # The indices of the sum and max fields, and of the counts in the merged data, for each metric
+        for summary_name, description, sum_index, max_index, counts_index in (
+            ("request_duration_seconds", "Wall time taken to handle requests", 1, 3, 1),
+            ("request_cpu_seconds", "CPU time used handling requests", 2, 4, 2),
+        ):
+            summary_name = f"{self.namespace}_{summary_name}"
+            lines.append(f"# HELP {summary_name} {description} by all workers, by route.")
+            lines.append(f"# TYPE {summary_name} summary")
+            for name, merged in merged_routes:
+                fields = merged[0]
+                label = f'route="{_escape_label_value(name)}"'
+                histogram = _to_histogram(fields[0], fields[max_index], merged[counts_index])
+                for q, value in zip(self.quantiles, histogram.quantiles(*self.quantiles)):
+                    lines.append(f'{summary_name}{{{label},quantile="{q!r}"}} {value!r}')
+                lines.append(f"{summary_name}_sum{{{label}}} {fields[sum_index] / 1_000_000!r}")
+                lines.append(f"{summary_name}_count{{{label}}} {fields[0]}")
+        lines.append("")
+        return "\n".join(lines)
+
+    def _attach(self) -> None:
+        """
+        Maps the shared file (creating it if necessary) and claims a slot for the current process.
+        """
+        slot_size = _SLOT_HEADER.size + self.max_routes * _ROUTE_SIZE
+        file_size = _FILE_HEADER_SIZE + self.max_workers * slot_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, file_size)
+                    os.pwrite(fd, _FILE_HEADER.pack(_MAGIC, _VERSION, self.max_workers, self.max_routes, _N_BUCKETS), 0)
+                header = _FILE_HEADER.unpack(os.pread(fd, _FILE_HEADER.size, 0))
+                if header != (_MAGIC, _VERSION, self.max_workers, self.max_routes, _N_BUCKETS):
+                    raise ValueError(f"{self.path} was created with a different layout (or isn't a timing file)")
+                shared = mmap.mmap(fd, file_size)
+                slot_offset = self._claim_slot(shared, slot_size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+        self._pid = os.getpid()
+        self._mmap = shared
+        self._slot_offset = slot_offset
+        self._slot_header = memoryview(shared)[slot_offset : slot_offset + _SLOT_HEADER.size].cast("Q")
+        self._routes = {}
+        for name, fields, counts in _iter_slot_routes(shared, slot_offset, self.max_routes):
+            self._routes[name] = (fields, counts)
+
+    def _claim_slot(self, shared: mmap.mmap, slot_size: int) -> int:
+        pid = os.getpid()
+        for slot in range(self.max_workers):
+            slot_offset = _FILE_HEADER_SIZE + slot * slot_size
+            slot_pid, _ = _SLOT_HEADER.unpack_from(shared, slot_offset)
+            if slot_pid == 0 or slot_pid == pid or not _is_running(slot_pid):
+                struct.pack_into("<Q", shared, slot_offset, pid)
+                return slot_offset
+        shared.close()
+        raise RuntimeError(f"All {self.max_workers} worker slots in {self.path} are in use")
+
+    def _add_route(self, name: str | None) -> tuple[memoryview, memoryview] | None:
+        assert self._mmap is not None and self._slot_header is not None
+        n_routes = self._slot_header[1]
+        if n_routes >= self.max_routes:
+            return None
+        offset = self._slot_offset + _SLOT_HEADER.size + n_routes * _ROUTE_SIZE
+        self._mmap[offset : offset + _NAME_SIZE] = str(name).encode()[: _NAME_SIZE - 1].ljust(_NAME_SIZE, b"\0")
+        # Published after the name is written, so readers never see a partially written name
+        self._slot_header[1] = n_routes + 1
+        route = self._routes[name] = _get_route_views(self._mmap, offset)
+        return route
+
+    def _merge_slots(self) -> dict[str, tuple[list[int], list[int], list[int]]]:
+        """
+        Returns the (fields, wall counts, cpu counts) for each route name, summed over all slots (using the maximum of
+        the max fields).
+        """
+        if self._pid != os.getpid():
+            self._attach()
+        assert self._mmap is not None
+        merged: dict[str, tuple[list[int], list[int], list[int]]] = {}
+        slot_size = _SLOT_HEADER.size + self.max_routes * _ROUTE_SIZE
+        for slot in range(self.max_workers):
+            slot_offset = _FILE_HEADER_SIZE + slot * slot_size
+            for name, fields, counts in _iter_slot_routes(self._mmap, slot_offset, self.max_routes):
+                route_fields = list(fields)
+                if route_fields[0] == 0:
+                    continue
+                wall_counts = counts[:_N_BUCKETS].tolist()
+                cpu_counts = counts[_N_BUCKETS:].tolist()
+                existing = merged.get(name)
+                if existing is None:
+                    merged[name] = (route_fields, wall_counts, cpu_counts)
+                    continue
+                existing_fields, existing_wall_counts, existing_cpu_counts = existing
+                existing_fields[:3] = map(add, existing_fields[:3], route_fields[:3])
+                existing_fields[3:] = map(max, existing_fields[3:], route_fields[3:])
+                existing_wall_counts[:] = map(add, existing_wall_counts, wall_counts)
+                existing_cpu_counts[:] = map(add, existing_cpu_counts, cpu_counts)
+        return merged
+
+
+def _get_route_views(shared: mmap.mmap, offset: int) -> tuple[memoryview, memoryview]:
+    view = memoryview(shared)
+    fields_offset = offset + _NAME_SIZE
+    counts_offset = fields_offset + 8 * _N_ROUTE_FIELDS
+    return (
+        view[fields_offset:counts_offset].cast("Q"),
+        view[counts_offset : counts_offset + 2 * 8 * _N_BUCKETS].cast("Q"),
+    )
+
+
+def _iter_slot_routes(
+    shared: mmap.mmap, slot_offset: int, max_routes: int
+) -> Iterator[tuple[str, memoryview, memoryview]]:
+    _, n_routes = _SLOT_HEADER.unpack_from(shared, slot_offset)
+    for route in range(min(n_routes, max_routes)):
+        offset = slot_offset + _SLOT_HEADER.size + route * _ROUTE_SIZE
+        name = shared[offset : offset + _NAME_SIZE].rstrip(b"\0").decode(errors="replace")
+        fields, counts = _get_route_views(shared, offset)
+        yield name, fields, counts
+
+
+def _to_histogram(count: int, max_value: int, counts: list[int]) -> _LatencyHistogram:
+    histogram = _LatencyHistogram()
+    # The merged counts may not fit in the 32-bit counts of a single histogram
+    histogram.counts = array("Q", counts)
+    histogram.count = count
+    histogram.max_value = max_value
+    return histogram
+
+
+def _summarize(name: str, fields: list[int], wall_counts: list[int], cpu_counts: list[int]) -> TimingSummary:
+    count, _, _, wall_max, cpu_max = fields
+    wall_p50, wall_p90, wall_p99 = _to_histogram(count, wall_max, wall_counts).quantiles(0.5, 0.9, 0.99)
+    cpu_p50, cpu_p90, cpu_p99 = _to_histogram(count, cpu_max, cpu_counts).quantiles(0.5, 0.9, 0.99)
+    return TimingSummary(
+        name=name,
+        requests=count,
+        wall_p50=1000 * wall_p50,
+        wall_p90=1000 * wall_p90,
+        wall_p99=1000 * wall_p99,
+        wall_max=wall_max / 1000,
+        cpu_p50=1000 * cpu_p50,
+        cpu_p90=1000 * cpu_p90,
+        cpu_p99=1000 * cpu_p99,
+        cpu_max=cpu_max / 1000,
+    )
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,80 @@
+"""
+A `JobLock` backed by a table of leases in a SQL database, to run each repeated job in only one process across hosts.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import time
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from fastapi_utils.session import FastAPISessionMaker
+from fastapi_utils.tasks import JobLock
+
+
+class SqlJobLock(JobLock):
+    """
+    Locks each job with a lease: a row of the table `table_name` (created if it doesn't exist) recording which process
+    holds the lock of the job, and until when.
+
+    A process acquires the lock if there is no row for the job yet, if its row already names this process (renewing the
+    lease), or if the lease has expired. Each of these is a single `INSERT` or conditional `UPDATE`, so the database
+    (row locks, or SQLite's database lock) ensures that only one process can acquire the lock at a time.
+
+    As leases are shorter than the interval of the job, and are only renewed while a call is running, the lease taken
+    at one tick has expired by the next one (unless the call is still running), and if a process stops, the other
+    processes keep calling the job from the next tick on. (For the same reason, leases are not deleted on `release`.)
+    Expiry times are based on the clocks of the processes, so these should be kept in sync (e.g., with NTP).
+
+    `owner` identifies the process in the table; by default, it is made of the host name, the process ID, and a random
+    suffix.
+    """
+
+    def __init__(
+        self, session_maker: FastAPISessionMaker, table_name: str = "job_leases", owner: str | None = None
+    ) -> None:
+        self.session_maker = session_maker
+        self.owner = owner if owner is not None else f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.table = sa.Table(
+            table_name,
+            sa.MetaData(),
+            sa.Column("name", sa.String(255), primary_key=True),
+            sa.Column("owner", sa.String(255), nullable=False),
+            sa.Column("expires_at", sa.Float, nullable=False),
+        )
+        self._table_created = False
+
+    def acquire(self, name: str, lease: float) -> bool:
+        if not self._table_created:
+            self._create_table()
+
+        now = time.time()
+        with self.session_maker.context_session() as session:
+            result = session.execute(
+                sa.update(self.table)
+                .where(self.table.c.name == name)
+                .where(sa.or_(self.table.c.owner == self.owner, self.table.c.expires_at <= now))
+                .values(owner=self.owner, expires_at=now + lease)
+            )
+            if result.rowcount == 1:
+                return True
+        try:
+            with self.session_maker.context_session() as session:
+                session.execute(sa.insert(self.table).values(name=name, owner=self.owner, expires_at=now + lease))
+        except IntegrityError:  # another process holds the lease
+            return False
+        return True
+
+    def _create_table(self) -> None:
+        engine = self.session_maker.cached_engine
+        try:
+            self.table.create(engine, checkfirst=True)
+        except DBAPIError:
+            # Another process may have created the table since it was checked
+            if not sa.inspect(engine).has_table(self.table.name):
+                raise
+        self._table_created = True
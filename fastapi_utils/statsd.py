@@ -0,0 +1,241 @@
+"""
+An exporter of the timing data recorded by `fastapi_utils.timing.TimingMiddleware` to StatsD (or DogStatsD) over UDP.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import socket
+from collections import deque
+from collections.abc import Mapping
+
+from fastapi_utils.timing import TimingCollector, _LatencyHistogram, _TimingStats
+
+
+class StatsdCollector(TimingCollector):
+    """
+    Pushes timing data to a StatsD (or DogStatsD) server over UDP.
+
+    `observe` only buffers the timing data for each request; every `flush_interval` seconds (while the app is running),
+    a background task formats the buffered data as StatsD metrics, packs them into datagrams of at most
+    `max_packet_size` bytes (the default fits in a typical 1500 byte MTU), and sends them to `host`:`port`.
+
+    The following timers (in milliseconds) are sent, prefixed by `prefix` and tagged with the `route` (the generated
+    metric name), `method` and `status` of each request, along with any constant `tags`:
+
+    * `request.duration`: the wall time taken to handle the request
+    * `request.cpu`: the CPU time used handling the request
+    * `request.ttfb`: the time to first byte (if the response was started)
+    * `request.queue`: the time the request was queued before reaching the app (if known; see `add_timing_middleware`)
+
+    Tags are formatted according to `tag_format`: "dogstatsd" (`name:1.5|ms|#route:app.index,method:GET`), "influxdb"
+    (`name,route=app.index,method=GET:1.5|ms`, as used by Telegraf), or None to send untagged metrics.
+
+    If `aggregate` is False, a metric is sent for each request; at most `max_buffer_size` requests are buffered between
+    flushes, and the timing data of any further requests is dropped (the number of which is available as `dropped`).
+    If `aggregate` is True, the timings are instead recorded in histograms (per route, method and status), and a
+    metric is sent for each non-empty bucket of each histogram, with a sample rate of 1 / (the number of timings in
+    the bucket), so StatsD counts it as that many timings. This bounds the traffic regardless of the request rate.
+
+    The number of datagrams that couldn't be sent is available as `send_errors`.
+    """
+
+    default_max_packet_size = 1432
+    tag_formats = ("dogstatsd", "influxdb", None)
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8125,
+        prefix: str = "fastapi",
+        tags: Mapping[str, str] | None = None,
+        tag_format: str | None = "dogstatsd",
+        aggregate: bool = False,
+        flush_interval: float = 1.0,
+        max_packet_size: int = default_max_packet_size,
+        max_buffer_size: int = 10_000,
+    ) -> None:
+        if tag_format not in self.tag_formats:
+            raise ValueError(f"tag_format must be one of {self.tag_formats}, not {tag_format!r}")
+        self.host = host
+        self.port = port
+        self.prefix = f"{prefix}." if prefix else ""
+        self.tags = dict(tags or {})
+        self.tag_format = tag_format
+        self.aggregate = aggregate
+        self.flush_interval = flush_interval
+        self.max_packet_size = max_packet_size
+        self.max_buffer_size = max_buffer_size
+        self.dropped = 0
+        self.send_errors = 0
+
+        self._buffer: deque[_TimingStats] = deque()
+        self._histograms: dict[tuple[str, str, str], _StatsdHistograms] = {}
+        self._socket: socket.socket | None = None
+        self._flush_task: asyncio.Future[None] | None = None
+
+    def observe(self, stats: _TimingStats) -> None:
+        if self.aggregate:
+            key = (str(stats.name), stats.method or "", str(stats.status_code) if stats.status_code else "")
+            histograms = self._histograms.get(key)
+            if histograms is None:
+                histograms = self._histograms[key] = _StatsdHistograms()
+            histograms.duration.record(stats.time)
+            histograms.cpu.record(stats.cpu_time)
+            if stats.response_start_ns:
+                histograms.ttfb.record((stats.response_start_ns - stats.start_ns) / 1e9)
+            if stats.queue_ns is not None:
+                histograms.queue.record(stats.queue_ns / 1e9)
+        elif len(self._buffer) < self.max_buffer_size:
+            self._buffer.append(stats)
+        else:
+            self.dropped += 1
+
+    def flush(self) -> int:
+        """
+        Sends the buffered (or aggregated) timing data, and returns the number of datagrams sent.
+
+        This is called periodically by the background task, but can also be called directly once the collector has
+        been started.
+        """
+        return self._send_lines(self._format_aggregates() if self.aggregate else self._format_buffer())
+
+    async def startup(self) -> None:
+        if self._socket is None:
+            loop = asyncio.get_event_loop()
+            (family, _, _, _, address), *_ = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.connect(address)
+            self._socket = sock
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    async def shutdown(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._socket is not None:
+            self.flush()
+            self._socket.close()
+            self._socket = None
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def _format_buffer(self) -> list[str]:
+        lines = []
+        buffer = self._buffer
+        while buffer:
+            stats = buffer.popleft()
+            tags = self._format_tags(
+                str(stats.name), stats.method or "", str(stats.status_code) if stats.status_code else ""
+            )
+            lines.append(self._format_metric("request.duration", stats.time, tags))
+            lines.append(self._format_metric("request.cpu", stats.cpu_time, tags))
+            if stats.response_start_ns:
+                lines.append(
+                    self._format_metric("request.ttfb", (stats.response_start_ns - stats.start_ns) / 1e9, tags)
+                )
+            if stats.queue_ns is not None:
+                lines.append(self._format_metric("request.queue", stats.queue_ns / 1e9, tags))
+        return lines
+
+    def _format_aggregates(self) -> list[str]:
+        lines = []
+        for key, histograms in self._histograms.items():
+            if not histograms.duration.count:
+                continue
+            tags = self._format_tags(*key)
+            for name, histogram in (
+                ("request.duration", histograms.duration),
+                ("request.cpu", histograms.cpu),
+                ("request.ttfb", histograms.ttfb),
+                ("request.queue", histograms.queue),
+            ):
+                if not histogram.count:
+                    continue
+                max_value = histogram.max_value
+                for index, count in enumerate(histogram.counts):
+                    if count:
+                        value = min(histogram._bucket_upper_bound(index), max_value) / 1_000_000
+                        lines.append(self._format_metric(name, value, tags, count))
+            histograms.reset()
+        return lines
+
+    def _format_tags(self, route: str, method: str, status: str) -> list[tuple[str, str]]:
+        tags = [("route", route)]
+        if method:
+            tags.append(("method", method))
+        if status:
+            tags.append(("status", status))
+        tags.extend(self.tags.items())
+        return tags
+
+    def _format_metric(self, name: str, seconds: float, tags: list[tuple[str, str]], count: int = 1) -> str:
+        value = f"{1000 * seconds:.3f}|ms"
+        if count > 1:
+            value += f"|@{1 / count:.6g}"
+        name = self.prefix + name
+        if self.tag_format == "dogstatsd":
+            tag_values = ",".join(f"{key}:{_INVALID_STATSD_CHARACTERS.sub('_', tag)}" for key, tag in tags)
+            return f"{name}:{value}|#{tag_values}"
+        if self.tag_format == "influxdb":
+            tag_values = "".join(f",{key}={_INVALID_STATSD_CHARACTERS.sub('_', tag)}" for key, tag in tags)
+            return f"{name}{tag_values}:{value}"
+        return f"{name}:{value}"
+
+    def _send_lines(self, lines: list[str]) -> int:
+        sock = self._socket
+        if sock is None or not lines:
+            return 0
+        max_packet_size = self.max_packet_size
+        sent = 0
+        packet: list[bytes] = []
+        packet_size = 0
+        for line in lines:
+            encoded = line.encode()
+            # Lines are separated by newlines; a line too long for a packet by itself is sent on its own
+            if packet and packet_size + 1 + len(encoded) > max_packet_size:
+                sent += self._send_packet(sock, b"\n".join(packet))
+                packet, packet_size = [], 0
+            packet_size += len(encoded) + (1 if packet else 0)
+            packet.append(encoded)
+        if packet:
+            sent += self._send_packet(sock, b"\n".join(packet))
+        return sent
+
+    def _send_packet(self, sock: socket.socket, packet: bytes) -> int:
+        try:
+            sock.send(packet)
+        except OSError:
+            # The socket is non-blocking, so this includes a full send buffer, as well as an unreachable server
+            self.send_errors += 1
+            return 0
+        return 1
+
+
+class _StatsdHistograms:
+    """
+    The histograms aggregated by a `StatsdCollector` for a single route, method and status during the current interval.
+    """
+
+    __slots__ = ("duration", "cpu", "ttfb", "queue")
+
+    def __init__(self) -> None:
+        self.duration = _LatencyHistogram()
+        self.cpu = _LatencyHistogram()
+        self.ttfb = _LatencyHistogram()
+        self.queue = _LatencyHistogram()
+
+    def reset(self) -> None:
+        self.duration.reset()
+        self.cpu.reset()
+        self.ttfb.reset()
+        self.queue.reset()
+
+
+_INVALID_STATSD_CHARACTERS = re.compile(r"[^\w.\-/]")
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
+import itertools
 import logging
+import random
 import warnings
+from collections import deque
+from datetime import datetime, tzinfo
 from functools import wraps
 from traceback import format_exception
 from typing import Any, Callable, Coroutine, Union
 
 from starlette.concurrency import run_in_threadpool
 
+from .cron import CronSchedule
+
 NoArgsNoReturnFuncT = Callable[[], None]
 NoArgsNoReturnAsyncFuncT = Callable[[], Coroutine[Any, Any, None]]
 ExcArgNoReturnFuncT = Callable[[Exception], None]
@@ -17,6 +24,8 @@ NoArgsNoReturnAnyFuncT = Union[NoArgsNoReturnFuncT, NoArgsNoReturnAsyncFuncT]
 ExcArgNoReturnAnyFuncT = Union[ExcArgNoReturnFuncT, ExcArgNoReturnAsyncFuncT]
 NoArgsNoReturnDecorator = Callable[[NoArgsNoReturnAnyFuncT], NoArgsNoReturnAsyncFuncT]
 
+logger = logging.getLogger(__name__)
+
 
 async def _handle_func(func: NoArgsNoReturnAnyFuncT) -> None:
     if asyncio.iscoroutinefunction(func):
@@ -25,6 +34,97 @@ async def _handle_func(func: NoArgsNoReturnAnyFuncT) -> None:
         await run_in_threadpool(func)
 
 
+class RepeatedTaskStats:
+    """
+    Statistics about the calls made by a function decorated with `repeat_every`, updated as the task runs.
+
+    Each call is scheduled for a "tick": with a fixed rate, ticks are every `seconds` seconds (from the time of the
+    first call); otherwise, the next tick is `seconds` after the previous call finished. The lateness of a call is how
+    long after its tick it started, in seconds.
+
+    runs:
+        The number of calls started so far
+    missed_ticks:
+        The number of ticks that passed without a call of their own, because earlier calls ran too long (i.e., the
+        sum of `skipped_ticks` and `coalesced_ticks`)
+    skipped_ticks:
+        The number of ticks that were dropped
+    coalesced_ticks:
+        The number of ticks that were merged into a single catch-up call with later ticks
+    overlapped_ticks:
+        The number of calls started while earlier calls were still running (only possible with `max_concurrent > 1`)
+    standby_ticks:
+        The number of ticks without a call because the job's `JobLock` was held by another process
+    last_lateness, max_lateness, total_lateness:
+        The lateness of the most recent call, the largest lateness so far, and the sum over all calls
+    """
+
+    def __init__(self) -> None:
+        self.runs = 0
+        self.missed_ticks = 0
+        self.skipped_ticks = 0
+        self.coalesced_ticks = 0
+        self.overlapped_ticks = 0
+        self.standby_ticks = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+
+    def record_run(self, lateness: float) -> None:
+        self.runs += 1
+        self.last_lateness = lateness
+        self.total_lateness += lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+    def record_skipped(self, ticks: int = 1) -> None:
+        self.skipped_ticks += ticks
+        self.missed_ticks += ticks
+
+    def record_coalesced(self, ticks: int = 1) -> None:
+        self.coalesced_ticks += ticks
+        self.missed_ticks += ticks
+
+
+class JobLock:
+    """
+    Base class for locks that coordinate the processes running the same repeated job (e.g., the workers of a server,
+    possibly on several hosts), so that only one of them calls the job at each tick.
+
+    `acquire` is called (in a worker thread, as it may block) before each call of a job named `name`, and the call is
+    only made if it returns True. It should return True if the lock is free, or already held by this `JobLock`, and
+    then hold (or renew) it for the next `lease` seconds. Jobs pass a lease slightly shorter than their interval, so
+    that the lease taken at one tick has expired by the next one: at each tick, the first process to try acquires the
+    lock, and the others skip the tick. If a process stops, the others keep calling the job from the next tick on.
+
+    While a call runs, `acquire` is called again every half lease to renew it for a full lease, so that calls lasting
+    longer than the interval keep the lock until they finish. A renewed lease can't end at the next tick, as the call
+    may still be running then; so if a process stops during a long call, its last lease may last for almost one more
+    interval, and the other processes take over within two intervals (instead of from the next tick on).
+
+    If `acquire` raises an exception, it is logged, and the tick is skipped.
+
+    `release` is called when a job stops (after its final call, if it fails, or when its scheduler is stopped). Any
+    resources held for the lock can be freed, but the lock should not be acquired by another process until the lease
+    expires, so the tick isn't run twice.
+    """
+
+    def acquire(self, name: str, lease: float) -> bool:
+        raise NotImplementedError
+
+    def release(self, name: str) -> None:
+        pass
+
+
+MISSED_TICK_POLICIES = ("skip", "run_once", "run_all")
+# The fraction of its interval for which each call of a job holds its lock, leaving room for late ticks
+_LEASE_FRACTION = 0.9
+# The fraction of its lease after which the lock of a job is renewed while a call is running
+_LEASE_RENEWAL_FRACTION = 0.5
+# Beyond this many missed cron fire times (e.g., after the system was suspended), they are skipped without counting
+_MAX_COUNTED_MISSED_FIRES = 1000
+
+
 async def _handle_exc(exc: Exception, on_exception: ExcArgNoReturnAnyFuncT | None) -> None:
     if on_exception:
         if asyncio.iscoroutinefunction(on_exception):
@@ -33,6 +133,492 @@ async def _handle_exc(exc: Exception, on_exception: ExcArgNoReturnAnyFuncT | Non
             await run_in_threadpool(on_exception, exc)
 
 
+def _get_job_name(func: NoArgsNoReturnAnyFuncT) -> str:
+    qualname = getattr(func, "__qualname__", None)
+    if qualname is None:
+        return repr(func)
+    return f"{getattr(func, '__module__', None)}.{qualname}"
+
+
+class ScheduledJob:
+    """
+    The state of a function repeated by `repeat_every`: when it is next due, and how its calls have gone so far.
+
+    name:
+        The name of the job, unique within a `Scheduler`
+    state:
+        "pending" until the first call is scheduled; then "scheduled" while waiting for `next_run`, and "running"
+        while any call is running. Once the job stops it is "finished" (after `max_repetitions` calls), "failed" (if
+        an exception was raised out of the repeated execution), "cancelled" (if the scheduler was stopped) or
+        "removed" (by `Scheduler.remove_job`)
+    next_run:
+        The event loop time (see `asyncio.AbstractEventLoop.time`) at which the next call is scheduled
+    repetitions:
+        The number of calls completed so far (ticks skipped because another process held the `lock` don't count)
+    running:
+        The number of calls currently running
+    lock:
+        The `JobLock` acquired before each call, if any; a tick is skipped if another process holds it
+    stats:
+        The `RepeatedTaskStats` of the job
+
+    With a fixed rate, the job ticks every `seconds` seconds whether or not a call is running; each tick starts a call
+    (in its own task) if fewer than `max_concurrent` calls are running, and is otherwise handled according to
+    `missed_ticks`. Otherwise, each call is made (and awaited) by the caller of `run`, and `schedule_next` schedules
+    the next one `seconds` after it finishes; if `wait_after_last` is True, the job also waits for `seconds` after its
+    final call before completing (and calling `on_complete`), whether it is run by a `Scheduler` or its own task.
+    """
+
+    def __init__(
+        self,
+        func: NoArgsNoReturnAnyFuncT,
+        *,
+        name: str,
+        seconds: float,
+        logger: logging.Logger | None = None,
+        raise_exceptions: bool = False,
+        max_repetitions: int | None = None,
+        on_complete: NoArgsNoReturnAnyFuncT | None = None,
+        on_exception: ExcArgNoReturnAnyFuncT | None = None,
+        fixed_rate: bool = False,
+        missed_ticks: str = "skip",
+        max_concurrent: int = 1,
+        jitter: float = 0.0,
+        lock: JobLock | None = None,
+        stats: RepeatedTaskStats | None = None,
+        wait_after_last: bool = False,
+    ) -> None:
+        self.func = func
+        self.name = name
+        self.seconds = seconds
+        self.logger = logger
+        self.raise_exceptions = raise_exceptions
+        self.max_repetitions = max_repetitions
+        self.on_complete = on_complete
+        self.on_exception = on_exception
+        self.fixed_rate = fixed_rate
+        self.missed_ticks = missed_ticks
+        self.max_concurrent = max_concurrent
+        self.jitter = jitter
+        self.lock = lock
+        self.stats = stats if stats is not None else RepeatedTaskStats()
+        self.wait_after_last = wait_after_last
+
+        self.state = "pending"
+        self.next_run = 0.0
+        self.repetitions = 0
+        self.running = 0
+        self.calls: set[asyncio.Future[None]] = set()  # the tasks of calls started by `fire`
+        self._started = 0
+        self._tick = 0.0  # with a fixed rate, the time of the next tick (before any jitter)
+        self._pending: deque[float] = deque()  # the scheduled times of ticks waiting for a call to finish
+
+    @property
+    def finished(self) -> bool:
+        return self.max_repetitions is not None and self.repetitions >= self.max_repetitions
+
+    @property
+    def lease(self) -> float:
+        """
+        The number of seconds for which each call holds the job's `lock`: slightly less than one interval.
+        """
+        return self.seconds * _LEASE_FRACTION
+
+    def start(self, now: float, delay: float) -> float:
+        """
+        Schedules the first call `delay` seconds (plus any jitter) after `now`, and returns the time until then.
+        """
+        self._tick = now + delay
+        delay += self._get_jitter()
+        self.next_run = now + delay
+        self.state = "scheduled"
+        return delay
+
+    def _get_jitter(self) -> float:
+        return random.uniform(0, self.jitter) if self.jitter else 0.0
+
+    async def run(self, now: float) -> None:
+        """
+        Makes a single call of the function, which was due at `next_run`, handling any exception it raises.
+        """
+        self.state = "running"
+        try:
+            called = await self._call(max(now - self.next_run, 0.0))
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except BaseException:
+            self.state = "failed"
+            await self.release_lock()
+            raise
+        if called:
+            self.repetitions += 1
+
+    async def _call(self, lateness: float) -> bool:
+        """
+        Calls the function, unless another process holds the job's `lock`; returns whether the function was called.
+
+        If the lock can't be acquired because of an error (e.g., if its database is unavailable), the error is logged,
+        and the tick is skipped as a standby tick.
+        """
+        renewal: asyncio.Future[None] | None = None
+        if self.lock is not None:
+            lease = self.lease
+            try:
+                acquired = await run_in_threadpool(self.lock.acquire, self.name, lease)
+            except Exception:
+                logger.exception("Error acquiring the lock of job %r", self.name)
+                acquired = False
+            if not acquired:
+                self.stats.standby_ticks += 1
+                return False
+            renewal = asyncio.ensure_future(self._renew_lock(lease))
+        try:
+            self.stats.record_run(lateness)
+            await _handle_func(self.func)
+
+        except Exception as exc:
+            if self.logger is not None:
+                warnings.warn(
+                    "'logger' is to be deprecated in favor of 'on_exception' in the 1.0 release.",
+                    DeprecationWarning,
+                )
+                formatted_exception = "".join(format_exception(type(exc), exc, exc.__traceback__))
+                self.logger.error(formatted_exception)
+            if self.raise_exceptions:
+                warnings.warn(
+                    "'raise_exceptions' is to be deprecated in favor of 'on_exception' in the 1.0 release.",
+                    DeprecationWarning,
+                )
+                raise exc
+            await _handle_exc(exc, self.on_exception)
+        finally:
+            if renewal is not None:
+                renewal.cancel()
+        return True
+
+    async def _renew_lock(self, lease: float) -> None:
+        """
+        Renews the lease of the job's `lock` while a call is running, until it is cancelled once the call finishes.
+        """
+        assert self.lock is not None
+        if lease <= 0:
+            return
+        while True:
+            await asyncio.sleep(lease * _LEASE_RENEWAL_FRACTION)
+            try:
+                if not await run_in_threadpool(self.lock.acquire, self.name, lease):
+                    return  # another process took over the lock (e.g., if renewing it was delayed)
+            except Exception:
+                logger.exception("Error renewing the lock of job %r", self.name)
+                return
+
+    def schedule_next(self, now: float) -> float:
+        """
+        Sets `next_run` after a call that finished at `now`, and returns the number of seconds until then.
+        """
+        delay = self.seconds + self._get_jitter()
+        self.next_run = now + delay
+        return delay
+
+    def fire(self) -> bool:
+        """
+        Handles the fixed-rate tick due at `next_run`, and schedules the next one. Returns False if there are no more
+        ticks to schedule, because the job has stopped or all of its `max_repetitions` calls have been started.
+
+        With a `lock`, the job keeps ticking once all of its calls have been started, as some of them may turn out to
+        be standby ticks, which don't count as repetitions; a call is then started for each of these.
+        """
+        if self.state not in ("scheduled", "running"):
+            return False
+        if self._all_started:
+            pass
+        elif self.running < self.max_concurrent:
+            if self.running:
+                self.stats.overlapped_ticks += 1
+            self._start_call(self.next_run)
+        elif self.missed_ticks == "skip":
+            self.stats.record_skipped()
+        elif self.missed_ticks == "run_once" and self._pending:
+            self._pending[0] = self.next_run
+            self.stats.record_coalesced()
+        else:
+            self._pending.append(self.next_run)
+
+        self._tick += self.seconds
+        self.next_run = self._tick + self._get_jitter()
+        return self.lock is not None or not self._all_started
+
+    @property
+    def _all_started(self) -> bool:
+        return self.max_repetitions is not None and self._started + len(self._pending) >= self.max_repetitions
+
+    def _start_call(self, scheduled: float) -> None:
+        self.state = "running"
+        self.running += 1
+        self._started += 1
+        call = asyncio.ensure_future(self._run_call(scheduled))
+        self.calls.add(call)
+        call.add_done_callback(self.calls.discard)
+
+    async def _run_call(self, scheduled: float) -> None:
+        try:
+            called = await self._call(max(asyncio.get_event_loop().time() - scheduled, 0.0))
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except BaseException:
+            self.state = "failed"
+            await self.release_lock()
+            raise
+        finally:
+            self.running -= 1
+        if called:
+            self.repetitions += 1
+        else:
+            self._started -= 1
+
+        if self.state != "running":  # stopped during the call
+            return
+        if self._pending:
+            self._start_call(self._pending.popleft())
+        elif self.finished:
+            await self.complete()
+        elif not self.running:
+            self.state = "scheduled"
+
+    async def complete(self) -> None:
+        self.state = "finished"
+        await self.release_lock()
+        if self.on_complete:
+            await _handle_func(self.on_complete)
+
+    async def release_lock(self) -> None:
+        if self.lock is not None:
+            await run_in_threadpool(self.lock.release, self.name)
+
+
+class CronJob(ScheduledJob):
+    """
+    A `ScheduledJob` whose calls are scheduled by a `CronSchedule` (in the wall-clock time of `tz`, or local time if it
+    is None), rather than every `seconds` seconds.
+
+    next_fire:
+        The wall-clock time of the next scheduled call
+
+    If a call runs past one or more of the following fire times, those fire times are skipped (and counted in
+    `stats.skipped_ticks`), as cron would.
+    """
+
+    def __init__(
+        self, func: NoArgsNoReturnAnyFuncT, *, schedule: CronSchedule, tz: tzinfo | None = None, **kwargs: Any
+    ):
+        super().__init__(func, seconds=0.0, **kwargs)
+        self.schedule = schedule
+        self.tz = tz
+        self.next_fire: datetime | None = None
+
+    def advance(self) -> float:
+        """
+        Sets `next_fire` to the next fire time (skipping any that have already passed), and returns the time until then.
+        """
+        wall_now = datetime.now(self.tz)
+        if self.next_fire is None:
+            self.next_fire = self.schedule.next_after(wall_now)
+        else:
+            self.next_fire = self.schedule.next_after(self.next_fire)
+            missed_fires = 0
+            while self.next_fire <= wall_now:
+                missed_fires += 1
+                if missed_fires == _MAX_COUNTED_MISSED_FIRES:
+                    self.next_fire = self.schedule.next_after(wall_now)
+                    break
+                self.next_fire = self.schedule.next_after(self.next_fire)
+            if missed_fires:
+                self.stats.record_skipped(missed_fires)
+        # Timestamps account for any change of UTC offset (e.g., daylight saving time) before the next fire time
+        return self.next_fire.timestamp() - wall_now.timestamp()
+
+    @property
+    def lease(self) -> float:
+        if self.next_fire is None:
+            return 0.0
+        return (self.schedule.next_after(self.next_fire) - self.next_fire).total_seconds() * _LEASE_FRACTION
+
+    def schedule_next(self, now: float) -> float:
+        delay = self.advance() + self._get_jitter()
+        self.next_run = now + delay
+        return delay
+
+
+class Scheduler:
+    """
+    Runs the jobs of any number of `repeat_every`-decorated functions from a single timer task, instead of one
+    sleeping task per function.
+
+    Jobs are kept in a min-heap ordered by their next run time; the timer task sleeps (on a single event loop timer)
+    until the earliest one is due, then starts a task for each due call (or, for fixed-rate jobs, handles each due
+    tick with `ScheduledJob.fire`). Once a call finishes, its job is pushed back onto the heap with its next run
+    time, so idle jobs hold no task or timer of their own.
+
+    `jobs` maps the name of each job to its `ScheduledJob`, which can be used to inspect its state and next run time.
+    Call `stop` (e.g. in a shutdown event handler) to cancel the timer and any running calls.
+    """
+
+    def __init__(self) -> None:
+        self._jobs: dict[str, ScheduledJob] = {}
+        self._heap: list[tuple[float, int, ScheduledJob]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.Future[None] | None = None
+        self._timer: asyncio.Future[None] | None = None
+        self._running: set[asyncio.Future[None]] = set()
+
+    @property
+    def jobs(self) -> dict[str, ScheduledJob]:
+        return dict(self._jobs)
+
+    def add_job(self, job: ScheduledJob, delay: float = 0.0) -> None:
+        """
+        Schedules the first call of `job` in `delay` seconds; must be called from within the running event loop.
+        """
+        existing = self._jobs.get(job.name)
+        if existing is not None and existing.state in ("scheduled", "running"):
+            raise ValueError(f"A job named {job.name!r} is already scheduled")
+        job.start(asyncio.get_event_loop().time(), delay)
+        self._jobs[job.name] = job
+        self._push(job)
+
+    def remove_job(self, name: str) -> ScheduledJob:
+        """
+        Stops scheduling the job named `name` (a call that is already running is allowed to finish).
+        """
+        job = self._jobs.pop(name)
+        if job.state in ("pending", "scheduled", "running"):
+            job.state = "removed"
+            if job.lock is not None:
+                asyncio.ensure_future(job.release_lock())
+        return job
+
+    async def stop(self) -> None:
+        """
+        Cancels the timer task and any running calls; the remaining jobs are marked as "cancelled", and their locks are
+        released.
+        """
+        tasks = [task for task in (self._timer, *self._running) if task is not None]
+        for job in self._jobs.values():
+            tasks.extend(job.calls)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            if job.state == "scheduled":
+                job.state = "cancelled"
+        await asyncio.gather(*(job.release_lock() for job in self._jobs.values() if job.state == "cancelled"))
+        self._heap.clear()
+        self._timer = None
+
+    def _push(self, job: ScheduledJob) -> None:
+        heapq.heappush(self._heap, (job.next_run, next(self._sequence), job))
+        if self._timer is None:
+            self._timer = asyncio.ensure_future(self._run_timer())
+        elif self._heap[0][2] is job:
+            self._wake()
+
+    async def _run_timer(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                next_run, _, job = heapq.heappop(self._heap)
+                # Entries of removed jobs are left in the heap, and skipped once they are due
+                if job.next_run != next_run:
+                    continue
+                if job.fixed_rate:
+                    if job.fire():
+                        self._push(job)
+                elif job.state == "scheduled":
+                    job.state = "running"
+                    task = asyncio.ensure_future(self._run_job(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+
+            # Sleep until the earliest job is due, or a job is pushed to the front of the heap
+            self._wakeup = loop.create_future()
+            timer = loop.call_at(self._heap[0][0], self._wake) if self._heap else None
+            try:
+                await self._wakeup
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    def _wake(self) -> None:
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def _run_job(self, job: ScheduledJob) -> None:
+        loop = asyncio.get_event_loop()
+        if job.finished:  # the job's period after its final call has passed
+            await job.complete()
+            return
+        await job.run(loop.time())
+        if job.state != "running":  # removed during the call
+            return
+        if job.finished and not job.wait_after_last:
+            await job.complete()
+        else:
+            job.schedule_next(loop.time())
+            job.state = "scheduled"
+            self._push(job)
+
+
+async def _repeat(job: ScheduledJob, delay: float | None) -> None:
+    """
+    Calls `job` repeatedly from its own task (i.e., without a `Scheduler`), making the first call after `delay` seconds.
+    """
+    loop_time = asyncio.get_event_loop().time
+    first_delay = job.start(loop_time(), delay or 0.0)
+    if delay is not None or first_delay > 0:
+        await asyncio.sleep(first_delay)
+
+    if job.fixed_rate:
+        # Calls run in their own tasks (and complete the job), so this task only has to keep ticking
+        while job.fire():
+            await asyncio.sleep(max(job.next_run - loop_time(), 0.0))
+        return
+
+    while not job.finished:
+        await job.run(loop_time())
+        job.state = "scheduled"
+        if job.finished and not job.wait_after_last:
+            break
+        await asyncio.sleep(max(job.schedule_next(loop_time()), 0.0))
+
+    await job.complete()
+
+
+def _check_repeat_options(
+    seconds: float, fixed_rate: bool, missed_ticks: str, max_concurrent: int, coalesce: bool, jitter: float
+) -> str:
+    """
+    Validates the scheduling options of `repeat_every`, and returns the missed tick policy to use.
+    """
+    if missed_ticks not in MISSED_TICK_POLICIES:
+        raise ValueError(f"missed_ticks must be one of {MISSED_TICK_POLICIES}, not {missed_ticks!r}")
+    if coalesce:
+        if missed_ticks == "run_all":
+            raise ValueError("coalesce can't be combined with missed_ticks='run_all'")
+        missed_ticks = "run_once"
+    if fixed_rate and seconds <= 0:
+        raise ValueError("seconds must be positive when using a fixed rate")
+    if max_concurrent < 1:
+        raise ValueError("max_concurrent must be at least 1")
+    if max_concurrent > 1 and not fixed_rate:
+        raise ValueError("max_concurrent requires fixed_rate=True, as calls can only overlap with a fixed rate")
+    if jitter < 0:
+        raise ValueError("jitter must not be negative")
+    return missed_ticks
+
+
 def repeat_every(
     *,
     seconds: float,
@@ -42,6 +628,15 @@ def repeat_every(
     max_repetitions: int | None = None,
     on_complete: NoArgsNoReturnAnyFuncT | None = None,
     on_exception: ExcArgNoReturnAnyFuncT | None = None,
+    fixed_rate: bool = False,
+    missed_ticks: str = "skip",
+    max_concurrent: int = 1,
+    coalesce: bool = False,
+    jitter: float = 0.0,
+    lock: JobLock | None = None,
+    stats: RepeatedTaskStats | None = None,
+    scheduler: Scheduler | None = None,
+    name: str | None = None,
 ) -> NoArgsNoReturnDecorator:
     """
     This function returns a decorator that modifies a function so it is periodically re-executed after its first call.
@@ -68,10 +663,46 @@ def repeat_every(
     max_repetitions: Optional[int] (default None)
         The maximum number of times to call the repeated function. If `None`, the function is repeated forever.
     on_complete: Optional[Callable[[], None]] (default None)
-        A function to call after the final repetition of the decorated function.
+        A function to call after the final repetition of the decorated function: `seconds` after it finishes, or
+        with a fixed rate, as soon as it finishes (with or without a `scheduler`).
     on_exception: Optional[Callable[[Exception], None]] (default None)
         A function to call when an exception is raised by the decorated function.
+    fixed_rate: bool (default False)
+        If False, the function waits `seconds` after each call finishes before calling it again, so the period drifts
+        by the duration of each call. If True, calls are scheduled every `seconds` seconds (using the event loop's
+        monotonic clock) from the first call, regardless of how long each call takes.
+    missed_ticks: str (default "skip")
+        With a fixed rate, what to do when a call is due while `max_concurrent` calls are still running:
+        "skip" skips the missed calls, and waits for the next scheduled time; "run_once" makes a single call
+        as soon as a running call finishes, to catch up; "run_all" makes one call for each missed call, as soon as
+        running calls finish.
+    max_concurrent: int (default 1)
+        With a fixed rate, the maximum number of calls that may run at the same time; if greater than 1, each call
+        starts on schedule even if earlier calls are still running, as long as fewer than `max_concurrent` are.
+    coalesce: bool (default False)
+        If True, calls that are due while `max_concurrent` calls are running are coalesced into a single catch-up
+        call; this is the same as `missed_ticks="run_once"`.
+    jitter: float (default 0)
+        If positive, each call is delayed by a random duration of up to `jitter` seconds, so that the same task
+        started by several processes at once (e.g., after a deploy) doesn't make all of its calls at the same time.
+        With a fixed rate, the jitter doesn't accumulate: each call is delayed from its own scheduled time.
+    lock: Optional[JobLock] (default None)
+        If provided, it is acquired before each call (with a lease lasting until just before the next tick), and the
+        call is skipped if another process holds it; this way, when several worker processes run the same task, only
+        one of them calls it at each tick. Skipped calls don't count toward `max_repetitions`. The lease is renewed
+        while a call runs; if a process stops during a call, another one takes over within two intervals. See
+        `fastapi_utils.locks.FileJobLock` and `fastapi_utils.sql_locks.SqlJobLock`.
+    stats: Optional[RepeatedTaskStats] (default None)
+        If provided, it is updated with the number of calls, skipped, coalesced and overlapping calls, and how late
+        each call started.
+    scheduler: Optional[Scheduler] (default None)
+        If provided, calling the decorated function adds a job to the scheduler, which makes the repeated calls from its
+        timer task. Otherwise, calling the decorated function starts a task that sleeps between calls.
+    name: Optional[str] (default None)
+        The name of the job in the scheduler; defaults to the qualified name of the decorated function. Names must be
+        unique among the scheduled jobs of a scheduler.
     """
+    missed_ticks = _check_repeat_options(seconds, fixed_rate, missed_ticks, max_concurrent, coalesce, jitter)
 
     def decorator(func: NoArgsNoReturnAnyFuncT) -> NoArgsNoReturnAsyncFuncT:
         """
@@ -80,38 +711,107 @@ def repeat_every(
 
         @wraps(func)
         async def wrapped() -> None:
-            async def loop() -> None:
-                if wait_first is not None:
-                    await asyncio.sleep(wait_first)
-
-                repetitions = 0
-                while max_repetitions is None or repetitions < max_repetitions:
-                    try:
-                        await _handle_func(func)
-
-                    except Exception as exc:
-                        if logger is not None:
-                            warnings.warn(
-                                "'logger' is to be deprecated in favor of 'on_exception' in the 1.0 release.",
-                                DeprecationWarning,
-                            )
-                            formatted_exception = "".join(format_exception(type(exc), exc, exc.__traceback__))
-                            logger.error(formatted_exception)
-                        if raise_exceptions:
-                            warnings.warn(
-                                "'raise_exceptions' is to be deprecated in favor of 'on_exception' in the 1.0 release.",
-                                DeprecationWarning,
-                            )
-                            raise exc
-                        await _handle_exc(exc, on_exception)
-
-                    repetitions += 1
-                    await asyncio.sleep(seconds)
-
-                if on_complete:
-                    await _handle_func(on_complete)
-
-            asyncio.ensure_future(loop())
+            job = ScheduledJob(
+                func,
+                name=name if name is not None else _get_job_name(func),
+                seconds=seconds,
+                logger=logger,
+                raise_exceptions=raise_exceptions,
+                max_repetitions=max_repetitions,
+                on_complete=on_complete,
+                on_exception=on_exception,
+                fixed_rate=fixed_rate,
+                missed_ticks=missed_ticks,
+                max_concurrent=max_concurrent,
+                jitter=jitter,
+                lock=lock,
+                stats=stats,
+                wait_after_last=True,
+            )
+            if scheduler is not None:
+                scheduler.add_job(job, delay=wait_first or 0.0)
+                return
+
+            asyncio.ensure_future(_repeat(job, wait_first))
+
+        return wrapped
+
+    return decorator
+
+
+def repeat_cron(
+    expression: str,
+    *,
+    tz: tzinfo | None = None,
+    max_repetitions: int | None = None,
+    on_complete: NoArgsNoReturnAnyFuncT | None = None,
+    on_exception: ExcArgNoReturnAnyFuncT | None = None,
+    jitter: float = 0.0,
+    lock: JobLock | None = None,
+    stats: RepeatedTaskStats | None = None,
+    scheduler: Scheduler | None = None,
+    name: str | None = None,
+) -> NoArgsNoReturnDecorator:
+    """
+    This function returns a decorator that modifies a function so that, once called, it is re-executed on the
+    schedule described by a cron expression (see `CronSchedule`), e.g. "*/5 * * * *" or "30 2 * * *".
+
+    Unlike `repeat_every`, the first call is made at the first fire time after the decorated function is called, and
+    fire times are aligned to the clock, so every worker running the same schedule fires at the same times.
+
+    Parameters
+    ----------
+    expression: str
+        A five-field cron expression ("minute hour day-of-month month day-of-week"), or an alias such as "@daily"
+    tz: Optional[datetime.tzinfo] (default None)
+        The time zone in which the expression is evaluated; if None, the local time zone is used.
+    max_repetitions: Optional[int] (default None)
+        The maximum number of times to call the repeated function. If `None`, the function is repeated forever.
+    on_complete: Optional[Callable[[], None]] (default None)
+        A function to call after the final repetition of the decorated function.
+    on_exception: Optional[Callable[[Exception], None]] (default None)
+        A function to call when an exception is raised by the decorated function.
+    jitter: float (default 0)
+        If positive, each call is delayed by a random duration of up to `jitter` seconds after its fire time.
+    lock: Optional[JobLock] (default None)
+        If provided, it is acquired before each call (with a lease lasting until just before the following fire time),
+        and the call is skipped if another process holds it. Skipped calls don't count toward `max_repetitions`.
+    stats: Optional[RepeatedTaskStats] (default None)
+        If provided, it is updated with the number of calls, missed fire times, and how late each call started.
+    scheduler: Optional[Scheduler] (default None)
+        If provided, calling the decorated function adds a job to the scheduler, which makes the repeated calls from its
+        timer task. Otherwise, calling the decorated function starts a task that sleeps between calls.
+    name: Optional[str] (default None)
+        The name of the job in the scheduler; defaults to the qualified name of the decorated function.
+    """
+    schedule = CronSchedule(expression)
+    if jitter < 0:
+        raise ValueError("jitter must not be negative")
+
+    def decorator(func: NoArgsNoReturnAnyFuncT) -> NoArgsNoReturnAsyncFuncT:
+        """
+        Converts the decorated function into a version of itself that is called on the cron schedule.
+        """
+
+        @wraps(func)
+        async def wrapped() -> None:
+            job = CronJob(
+                func,
+                schedule=schedule,
+                tz=tz,
+                name=name if name is not None else _get_job_name(func),
+                max_repetitions=max_repetitions,
+                on_complete=on_complete,
+                on_exception=on_exception,
+                jitter=jitter,
+                lock=lock,
+                stats=stats,
+            )
+            delay = max(job.advance(), 0.0)
+            if scheduler is not None:
+                scheduler.add_job(job, delay=delay)
+                return
+            asyncio.ensure_future(_repeat(job, delay))
 
         return wrapped
 
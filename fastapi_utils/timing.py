@@ -10,24 +10,54 @@ consider using the coroutine-aware profiling library `yappi`.
 
 from __future__ import annotations
 
-import os
+import asyncio
+import fnmatch
+import heapq
+import inspect
+import logging
+import math
+import random
+import re
+import threading
 import time
-from collections.abc import Callable
-from typing import Any
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable, Iterable, Mapping, Sequence
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar, Token
+from functools import wraps
+from itertools import accumulate
+from operator import itemgetter
+from typing import Any, Generator, NamedTuple
 
-import psutil
-from fastapi import FastAPI
-from starlette.middleware.base import RequestResponseEndpoint
+import starlette._utils
+from fastapi import APIRouter, FastAPI
+from fastapi.dependencies.models import Dependant
+from fastapi.routing import APIRoute
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
 from starlette.requests import Request
-from starlette.responses import Response
-from starlette.routing import Match, Mount
-from starlette.types import Scope
+from starlette.routing import BaseRoute, Host, Match, Mount, Route, WebSocketRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 TIMER_ATTRIBUTE = "__fastapi_utils_timer__"
 
+logger = logging.getLogger(__name__)
+
 
 def add_timing_middleware(
-    app: FastAPI, record: Callable[[str], None] | None = None, prefix: str = "", exclude: str | None = None
+    app: FastAPI,
+    record: Callable[[str], None] | None = None,
+    prefix: str = "",
+    exclude: str | RouteFilter | None = None,
+    collectors: Sequence[TimingCollector] | None = None,
+    sampling: SamplingPolicy | None = None,
+    route_sampling: Mapping[str, SamplingPolicy | None] | None = None,
+    server_timing: bool = False,
+    include: RouteFilter | None = None,
+    queue_time_header: str | None = None,
 ) -> None:
     """
     Adds a middleware to the provided `app` that records timing metrics using the provided `record` callable.
@@ -40,17 +70,367 @@ def add_timing_middleware(
     as an exact substring of the generated metric name will not be logged.
     This provides an easy way to disable logging for routes
 
-    The `exclude` will probably be replaced by a regex match at some point in the future. (PR welcome!)
+    For more control, `exclude` can also be a `RouteFilter`, matching routes by regex or glob patterns for
+    the generated metric name, or by route tags. If `include` is provided, only the routes it matches are timed.
+    Filters are evaluated once per route, so the number of rules does not affect the cost of handling a request.
+
+    If `collectors` is provided, the timing data for each request is passed to each of the provided
+    `TimingCollector` instances (e.g., a `TimingAggregator`) instead of being formatted and passed to `record`.
+    Include a `RecordCollector` in `collectors` to keep recording a message for each request as well.
+
+    If `sampling` is provided, only the requests selected by the `SamplingPolicy` are timed and recorded.
+    Different policies can be used for specific routes by passing a mapping from generated metric names to policies
+    as `route_sampling` (a value of `None` disables sampling for that route).
+
+    If `server_timing` is True, a `Server-Timing` header is added to the response for each timed request, containing
+    the elapsed time when the response was started along with any spans finished by then (see `timing_span`).
+
+    If `queue_time_header` is provided (e.g., "X-Request-Start"), it is read from each request as the time at which
+    a proxy or load balancer received the request, and the time between then and the start of the request in the app
+    is recorded as the request's queue time. The header can be in seconds (with an optional fraction), milliseconds,
+    microseconds or nanoseconds since the epoch (the unit is inferred from its magnitude), optionally prefixed by "t=".
+
+    The added middleware is a `TimingMiddleware` instance; see its docstring for more details.
+    """
+    app.add_middleware(
+        TimingMiddleware,
+        record=record,
+        prefix=prefix,
+        exclude=exclude,
+        collectors=collectors,
+        sampling=sampling,
+        route_sampling=route_sampling,
+        server_timing=server_timing,
+        include=include,
+        queue_time_header=queue_time_header,
+    )
+
+
+class TimingMiddleware:
+    """
+    A pure-ASGI middleware that records timing metrics for each HTTP request handled by the wrapped app.
+
+    Unlike a middleware registered with `@app.middleware("http")`, this does not route the request through
+    starlette's `BaseHTTPMiddleware`, so no extra task is spawned and the response body is passed straight through
+    to the server (preserving backpressure for streaming responses). The recorded wall time therefore covers the
+    full request, including sending the response body.
+
+    Route names are generated by a `_MetricNamer` for the starlette app that the middleware was added to
+    (taken from `scope["app"]` on the first request); see `add_timing_middleware` for the meaning of the arguments.
+    Websocket scopes are passed through untouched; lifespan events are passed through after starting up
+    (or shutting down) the middleware's collectors.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        record: Callable[[str], None] | None = None,
+        prefix: str = "",
+        exclude: str | RouteFilter | None = None,
+        collectors: Sequence[TimingCollector] | None = None,
+        sampling: SamplingPolicy | None = None,
+        route_sampling: Mapping[str, SamplingPolicy | None] | None = None,
+        server_timing: bool = False,
+        include: RouteFilter | None = None,
+        queue_time_header: str | None = None,
+    ) -> None:
+        self.app = app
+        self.record = record
+        self.prefix = prefix
+        self.exclude = exclude
+        self.include = include
+        self.collectors: list[TimingCollector] = (
+            list(collectors) if collectors is not None else [RecordCollector(record=record)]
+        )
+        self.sampling = sampling
+        self.route_sampling = dict(route_sampling or {})
+        self.server_timing = server_timing
+        self.queue_time_header = queue_time_header
+        self._queue_time_header = queue_time_header.lower().encode("latin-1") if queue_time_header else None
+        for collector in self.collectors:
+            if isinstance(collector, TimingMonitor) and collector.record is None:
+                collector.record = record
+        self._request_trackers = [
+            collector
+            for collector in self.collectors
+            if type(collector).request_started is not TimingCollector.request_started
+            or type(collector).request_finished is not TimingCollector.request_finished
+        ]
+        self._metric_namer: _MetricNamer | None = None
+        # Shared by all unmatched paths, so that their sampling rate limit applies to all of them together
+        self._unmatched_sampler = _RouteSampler(sampling) if sampling is not None else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            if scope["type"] == "lifespan":
+                receive = self._wrap_lifespan_receive(receive)
+            await self.app(scope, receive, send)
+            return
+
+        metric_namer = self._metric_namer
+        if metric_namer is None:
+            metric_namer = self._metric_namer = _MetricNamer(prefix=self.prefix, app=scope.get("app"))
+        entry = metric_namer.resolve(scope)
+        plan = entry.plan or self._prepare_entry(entry)
+        sampler = plan.sampler
+        sampled = not plan.excluded and (sampler is None or sampler.sample())
+        slow_threshold_ns = sampler.slow_threshold_ns if sampler is not None and not plan.excluded else None
+        if not sampled and slow_threshold_ns is None:
+            # Nothing will be recorded, so skip taking any measurements
+            scope.setdefault("state", {})[TIMER_ATTRIBUTE] = plan.silent_timer
+            await self.app(scope, receive, send)
+            return
+
+        timer = _TimingStats(entry.name, record=self.record)
+        timer.silent = not sampled
+        timer.method = scope["method"]
+        # Equivalent to `setattr(request.state, TIMER_ATTRIBUTE, timer)` for any `Request` built from this scope
+        scope.setdefault("state", {})[TIMER_ATTRIBUTE] = timer
+        send = _wrap_send(send, timer, self.server_timing and sampled)
+        token = _current_timer.set(timer)
+        timer.start()
+        if self._queue_time_header is not None:
+            timer.queue_ns = _get_queue_ns(scope, self._queue_time_header)
+        request_trackers = self._request_trackers
+        for collector in request_trackers:
+            collector.request_started(timer)
+        try:
+            await _CPUAccountedAwaitable(self.app(scope, receive, send), timer)
+        finally:
+            _current_timer.reset(token)
+            timer.take_split()
+            for collector in request_trackers:
+                collector.request_finished(timer)
+            if sampled or (slow_threshold_ns is not None and timer.end_ns - timer.start_ns >= slow_threshold_ns):
+                for collector in self.collectors:
+                    collector.observe(timer)
+
+    def _prepare_entry(self, entry: _RouteEntry) -> _RoutePlan:
+        """
+        Called the first time a request is handled for each route (or unmatched path) to decide how requests for it
+        should be timed.
+
+        Unless the route is excluded, the sync endpoint of a FastAPI route is also wrapped (i.e., its
+        `route.dependant.call` is replaced with a `_ThreadCPUAccounted` wrapping the endpoint), so that the CPU time it
+        uses in the threadpool is accrued to the timer of the request it is handling.
+        """
+        route = entry.route
+        exclude = self.exclude
+        if isinstance(exclude, RouteFilter):
+            excluded = exclude.matches(entry.name, route)
+        else:
+            excluded = exclude is not None and exclude in entry.name
+        if self.include is not None and not self.include.matches(entry.name, route):
+            excluded = True
+
+        if not excluded and isinstance(route, APIRoute):
+            call = route.dependant.call
+            if call is not None and not asyncio.iscoroutinefunction(call) and not isinstance(call, _ThreadCPUAccounted):
+                route.dependant.call = _ThreadCPUAccounted(call)
+
+        if route is None:
+            sampler = self._unmatched_sampler
+        else:
+            policy = self.route_sampling.get(entry.name, self.sampling)
+            sampler = _RouteSampler(policy) if policy is not None else None
+        silent_timer = _TimingStats(entry.name, record=self.record)
+        silent_timer.silent = True
+        plan = entry.plan = _RoutePlan(excluded, sampler, silent_timer)
+        return plan
+
+    def _wrap_lifespan_receive(self, receive: Receive) -> Receive:
+        """
+        Returns a wrapped `receive` that starts up (or shuts down) the collectors before the app handles the
+        corresponding lifespan event.
+        """
+
+        async def wrapped_receive() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                for collector in self.collectors:
+                    await collector.startup()
+            elif message["type"] == "lifespan.shutdown":
+                for collector in self.collectors:
+                    await collector.shutdown()
+            return message
+
+        return wrapped_receive
+
+
+def _wrap_send(send: Send, timer: _TimingStats, server_timing: bool) -> Send:
+    """
+    Returns a wrapped `send` that measures the response in `timer` as it is sent, and (if `server_timing` is True)
+    adds a `Server-Timing` header with the data from `timer` to the response.
     """
-    metric_namer = _MetricNamer(prefix=prefix, app=app)
 
-    @app.middleware("http")
-    async def timing_middleware(request: Request, call_next: RequestResponseEndpoint) -> Response:
-        metric_name = metric_namer(request.scope)
-        with _TimingStats(metric_name, record=record, exclude=exclude) as timer:
-            setattr(request.state, TIMER_ATTRIBUTE, timer)
-            response = await call_next(request)
-        return response
+    async def wrapped_send(message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.body":
+            body_size = len(message.get("body", b""))
+            if body_size:
+                timer.bytes_sent += body_size
+                timer.chunks += 1
+        elif message_type == "http.response.start":
+            timer.response_start_ns = time.perf_counter_ns()
+            timer.status_code = message["status"]
+            if server_timing:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+        await send(message)
+
+    return wrapped_send
+
+
+def _get_queue_ns(scope: Scope, header: bytes) -> int | None:
+    """
+    Returns the nanoseconds elapsed since the request start time in the `header` header of the request (or None if the
+    header is missing or invalid). Negative values (due to clock skew) are clamped to zero.
+    """
+    for name, value in scope["headers"]:
+        if name == header:
+            request_start_ns = _parse_request_start(value)
+            if request_start_ns is None:
+                return None
+            return max(time.time_ns() - request_start_ns, 0)
+    return None
+
+
+def _parse_request_start(value: bytes) -> int | None:
+    """
+    Parses an `X-Request-Start`-style header value into nanoseconds since the epoch, inferring the unit of the value
+    from its magnitude (timestamps in seconds are less than 1e11 until the year 5138).
+    """
+    if value.startswith(b"t="):
+        value = value[2:]
+    try:
+        timestamp = float(value)
+    except ValueError:
+        return None
+    if not 0 < timestamp < math.inf:
+        return None
+    for limit, unit_ns in _REQUEST_START_UNITS:
+        if timestamp < limit:
+            return int(timestamp * unit_ns)
+    return int(timestamp)
+
+
+# The (exclusive) upper bound of header values in seconds, milliseconds and microseconds, and the size of each unit
+_REQUEST_START_UNITS = ((1e11, 1_000_000_000), (1e14, 1_000_000), (1e17, 1_000))
+
+
+class RouteFilter:
+    """
+    Selects routes for the `exclude` and `include` arguments of `add_timing_middleware`.
+
+    patterns:
+        Regular expressions (strings or compiled patterns), searched for anywhere in the generated metric name
+        (use `^` and `$` to match the whole name)
+    globs:
+        Shell-style wildcard patterns (as supported by `fnmatch`), matched against the whole generated metric name
+    tags:
+        FastAPI route tags; routes with any of these tags are matched
+
+    A route is matched if it is matched by any of the rules. The string patterns and globs are combined into a single
+    regular expression when the filter is created (compiled patterns are used as-is, to preserve their flags).
+    """
+
+    def __init__(
+        self,
+        patterns: Iterable[str | re.Pattern[str]] = (),
+        globs: Iterable[str] = (),
+        tags: Iterable[str] = (),
+    ) -> None:
+        patterns = list(patterns)
+        sources = [pattern for pattern in patterns if isinstance(pattern, str)]
+        sources += ["^" + fnmatch.translate(glob) for glob in globs]
+        self.regexes = [pattern for pattern in patterns if isinstance(pattern, re.Pattern)]
+        if sources:
+            self.regexes.insert(0, re.compile("|".join(f"(?:{source})" for source in sources)))
+        self.tags = frozenset(tags)
+
+    def matches(self, name: str, route: BaseRoute | None = None) -> bool:
+        """
+        Returns True if the route with the provided generated metric name is matched by any of the rules
+        """
+        if any(regex.search(name) for regex in self.regexes):
+            return True
+        route_tags = getattr(route, "tags", None)
+        return bool(self.tags and route_tags and not self.tags.isdisjoint(route_tags))
+
+
+class SamplingPolicy:
+    """
+    Determines which requests to a route are timed and recorded by a `TimingMiddleware`.
+
+    rate:
+        The probability that any given request is sampled
+    max_per_second:
+        If not None, at most this many requests per second (on average, allowing bursts of up to the same number
+        of requests, or of one request for rates below one per second) are sampled for each route, using a token bucket
+    slow_threshold:
+        If not None, requests that take at least this many seconds are always recorded, even if not sampled.
+        Note that this requires every request to be timed; only the recording is skipped for unsampled requests.
+
+    Requests that aren't sampled (or recorded as slow) skip all measurement and formatting of timing data.
+    """
+
+    def __init__(
+        self, rate: float = 1.0, max_per_second: float | None = None, slow_threshold: float | None = None
+    ) -> None:
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self.slow_threshold = slow_threshold
+
+
+class _RouteSampler:
+    """
+    The sampling state for a single route, following a `SamplingPolicy`.
+    """
+
+    __slots__ = ("rate", "max_per_second", "burst", "slow_threshold_ns", "tokens", "last_refill")
+
+    def __init__(self, policy: SamplingPolicy) -> None:
+        self.rate = policy.rate
+        self.max_per_second = policy.max_per_second
+        # The bucket holds at least one token, so that rates below one request per second can still be sampled
+        self.burst = max(policy.max_per_second, 1.0) if policy.max_per_second is not None else 0.0
+        self.slow_threshold_ns = int(policy.slow_threshold * 1e9) if policy.slow_threshold is not None else None
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+
+    def sample(self) -> bool:
+        """
+        Returns True if the current request should be recorded
+        """
+        if self.rate < 1.0 and random.random() >= self.rate:
+            return False
+        max_per_second = self.max_per_second
+        if max_per_second is None:
+            return True
+        now = time.monotonic()
+        tokens = min(self.burst, self.tokens + (now - self.last_refill) * max_per_second)
+        self.last_refill = now
+        if tokens < 1.0:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1.0
+        return True
+
+
+class _RoutePlan:
+    """
+    How `TimingMiddleware` handles the requests for a single route; decided the first time the route is requested.
+
+    `silent_timer` is attached to requests that are not being timed, so `record_timing` can still be called for them.
+    """
+
+    __slots__ = ("excluded", "sampler", "silent_timer")
+
+    def __init__(self, excluded: bool, sampler: _RouteSampler | None, silent_timer: _TimingStats) -> None:
+        self.excluded = excluded
+        self.sampler = sampler
+        self.silent_timer = silent_timer
 
 
 def record_timing(request: Request, note: str | None = None) -> None:
@@ -84,39 +464,131 @@ class _TimingStats:
         something like `logger.info` for a `logging.Logger` instance would be preferable.
     exclude:
         An optional string; if it is not None and occurs inside `name`, no stats will be emitted
+
+    Wall time is measured using `time.perf_counter_ns`. CPU time is measured using the CPU clock of the current
+    thread (`time.thread_time_ns`), rather than of the whole process, so concurrent work isn't included:
+
+    * When used as a context manager (or via `start` and `take_split`), the CPU time is that used by the current thread
+      since `start` was called.
+    * When used by `TimingMiddleware`, CPU time is instead only accrued while the request's own coroutine is running
+      on the event loop (see `_CPUAccountedAwaitable`), plus the CPU time used in the threadpool by sync endpoints.
+
+    Any spans recorded during the request using `timing_span` are collected in `spans`.
+
+    When used by `TimingMiddleware`, the response is also measured as it is sent (without buffering it):
+    `response_start_ns` is the `time.perf_counter_ns` value when the response was started (or 0 if it hasn't been),
+    `bytes_sent` is the number of bytes of body sent so far, and `chunks` the number of non-empty body messages.
+    The HTTP method of the request is stored in `method`, and the status code of the response in `status_code`
+    (0 if the response hasn't been started).
+
+    If a `monitors.GcMonitor` is running, `gc_ns` is the total duration of the garbage collection pauses that occurred
+    while the request was in flight (or None if garbage collections aren't being monitored).
+
+    If a `monitors.ThreadpoolMonitor` is running, `threadpool_wait_ns` is the total time the request's calls to the
+    threadpool spent waiting for a worker thread to become available.
+
+    If the middleware reads the request start time from a header (see `add_timing_middleware`), `queue_ns` is the
+    time between then and the start of the request in the app (or None if the header was missing or invalid).
     """
 
+    __slots__ = (
+        "name",
+        "record",
+        "silent",
+        "start_ns",
+        "end_ns",
+        "cpu_ns",
+        "end_cpu_ns",
+        "step_start_cpu_ns",
+        "spans",
+        "response_start_ns",
+        "bytes_sent",
+        "chunks",
+        "threadpool_wait_ns",
+        "queue_ns",
+        "method",
+        "status_code",
+        "gc_ns",
+    )
+
     def __init__(
         self, name: str | None = None, record: Callable[[str], None] | None = None, exclude: str | None = None
     ) -> None:
         self.name = name
         self.record = record or print
 
-        self.process: psutil.Process = psutil.Process(os.getpid())
-        self.start_time: float = 0
-        self.start_cpu_time: float = 0
-        self.end_cpu_time: float = 0
-        self.end_time: float = 0
-        self.silent: bool = False
-
-        if self.name is not None and exclude is not None and (exclude in self.name):
-            self.silent = True
+        self.start_ns = 0
+        self.end_ns = 0
+        # CPU time accrued so far, not including the current step (if any)
+        self.cpu_ns = 0
+        self.end_cpu_ns = 0
+        # The thread CPU time at the start of the currently-running step, or 0 if no step is running
+        self.step_start_cpu_ns = 0
+        self.spans: list[_TimingSpan] | None = None
+        self.response_start_ns = 0
+        self.bytes_sent = 0
+        self.chunks = 0
+        self.threadpool_wait_ns = 0
+        self.queue_ns: int | None = None
+        self.method: str | None = None
+        self.status_code = 0
+        self.gc_ns: int | None = None
+        self.silent = bool(self.name is not None and exclude is not None and (exclude in self.name))
 
     def start(self) -> None:
-        self.start_time = time.time()
-        self.start_cpu_time = self._get_cpu_time()
+        self.start_ns = time.perf_counter_ns()
+        self.cpu_ns = 0
+        self.step_start_cpu_ns = time.thread_time_ns()
 
     def take_split(self) -> None:
-        self.end_time = time.time()
-        self.end_cpu_time = self._get_cpu_time()
+        self.end_ns = time.perf_counter_ns()
+        cpu_ns = self.cpu_ns
+        step_start_cpu_ns = self.step_start_cpu_ns
+        if step_start_cpu_ns:
+            cpu_ns += time.thread_time_ns() - step_start_cpu_ns
+        self.end_cpu_ns = cpu_ns
 
     @property
     def time(self) -> float:
-        return self.end_time - self.start_time
+        return (self.end_ns - self.start_ns) / 1e9
 
     @property
     def cpu_time(self) -> float:
-        return self.end_cpu_time - self.start_cpu_time
+        return self.end_cpu_ns / 1e9
+
+    @property
+    def queue_time(self) -> float | None:
+        """
+        The seconds the request spent queued before reaching the app, or None if unknown
+        """
+        return self.queue_ns / 1e9 if self.queue_ns is not None else None
+
+    @property
+    def gc_time(self) -> float | None:
+        """
+        The seconds the request was paused by garbage collections, or None if they aren't being monitored
+        """
+        return self.gc_ns / 1e9 if self.gc_ns is not None else None
+
+    @property
+    def ttfb(self) -> float | None:
+        """
+        The time to first byte: the seconds taken before the response was started, or None if it hasn't been
+        """
+        if not self.response_start_ns:
+            return None
+        return (self.response_start_ns - self.start_ns) / 1e9
+
+    @property
+    def send_time(self) -> float | None:
+        """
+        The seconds taken to send the response after it was started (as of the last split), or None if it hasn't been
+
+        For large or streaming responses, this is mostly determined by how fast the client reads the response body.
+        """
+        if not self.response_start_ns:
+            return None
+        return max(self.end_ns - self.response_start_ns, 0) / 1e9
 
     def __enter__(self) -> _TimingStats:
         self.start()
@@ -131,20 +603,803 @@ class _TimingStats:
         """
         if not self.silent:
             self.take_split()
-            cpu_ms = 1000 * self.cpu_time
-            wall_ms = 1000 * self.time
-            message = f"TIMING: Wall: {wall_ms:6.1f}ms | CPU: {cpu_ms:6.1f}ms | {self.name}"
-            if note is not None:
-                message += f" ({note})"
-            self.record(message)
+            self.record(self.message(note))
+
+    def message(self, note: str | None = None) -> str:
+        """
+        Formats the timing information as of the last split, optionally including a specified note
+        """
+        cpu_ms = 1000 * self.cpu_time
+        wall_ms = 1000 * self.time
+        message = f"TIMING: Wall: {wall_ms:6.1f}ms | CPU: {cpu_ms:6.1f}ms"
+        if self.queue_ns is not None:
+            message += f" | Queue: {self.queue_ns / 1e6:6.1f}ms"
+        if self.gc_ns:
+            message += f" | GC: {self.gc_ns / 1e6:6.1f}ms"
+        message += f" | {self.name}"
+        if note is not None:
+            message += f" ({note})"
+        if self.spans:
+            message += " | Spans: " + ", ".join(
+                f"{path}={1000 * duration:.1f}ms" for path, duration in self.span_times()
+            )
+        return message
+
+    def span_times(self) -> list[tuple[str, float]]:
+        """
+        Returns the (dotted path, duration in seconds) of each finished span, in depth-first order.
+
+        The path of a span includes the names of the spans it is nested in, e.g. "db.query".
+        """
+        results: list[tuple[str, float]] = []
+        pending = [("", span) for span in reversed(self.spans or [])]
+        while pending:
+            parent_path, span = pending.pop()
+            if not span.end_ns:
+                continue
+            path = f"{parent_path}.{span.name}" if parent_path else span.name
+            results.append((path, (span.end_ns - span.start_ns) / 1e9))
+            pending.extend((path, child) for child in reversed(span.children))
+        return results
+
+    def server_timing(self) -> str:
+        """
+        Returns a `Server-Timing` header value with the elapsed time so far (as "total") and the finished spans.
+        """
+        metrics = [f"total;dur={(time.perf_counter_ns() - self.start_ns) / 1e6:.1f}"]
+        for path, duration in self.span_times():
+            metrics.append(f"{_INVALID_SERVER_TIMING_CHARACTERS.sub('_', path)};dur={1000 * duration:.1f}")
+        return ", ".join(metrics)
+
+
+_current_timer: ContextVar[_TimingStats | None] = ContextVar("_current_timer", default=None)
+
+
+class _CPUAccountedAwaitable(Generator[Any, Any, Any]):
+    """
+    Wraps a coroutine so that the CPU time used by each step of its execution is accrued to `stats`.
+
+    The wrapper sits between the task running the coroutine and the coroutine itself, so `send` and `throw` are
+    called each time the task resumes the coroutine, and return each time it suspends; the thread CPU time
+    used in between is charged to `stats`. Time spent running other tasks while the coroutine is suspended
+    is not included.
+    """
+
+    __slots__ = ("coroutine", "iterator", "stats")
+
+    def __init__(self, coroutine: Awaitable[Any], stats: _TimingStats) -> None:
+        self.coroutine = coroutine
+        self.iterator = coroutine.__await__()
+        self.stats = stats
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        return self
+
+    def send(self, value: Any) -> Any:
+        stats = self.stats
+        if not stats.step_start_cpu_ns:
+            stats.step_start_cpu_ns = time.thread_time_ns()
+        try:
+            return self.iterator.send(value)
+        finally:
+            stats.cpu_ns += time.thread_time_ns() - stats.step_start_cpu_ns
+            stats.step_start_cpu_ns = 0
+
+    def throw(self, *args: Any) -> Any:
+        stats = self.stats
+        if not stats.step_start_cpu_ns:
+            stats.step_start_cpu_ns = time.thread_time_ns()
+        try:
+            return self.iterator.throw(*args)
+        finally:
+            stats.cpu_ns += time.thread_time_ns() - stats.step_start_cpu_ns
+            stats.step_start_cpu_ns = 0
+
+    def close(self) -> None:
+        self.iterator.close()
+
+
+# The code objects of the methods of `_CPUAccountedAwaitable` that step the coroutine of a request
+_STEP_CODES = (_CPUAccountedAwaitable.send.__code__, _CPUAccountedAwaitable.throw.__code__)
+
+
+class _ThreadCPUAccounted:
+    """
+    Wraps a sync callable (e.g., an endpoint run in the threadpool) so that the CPU time used by the thread calling it
+    is accrued to the timer of the request being handled (if any).
+    """
+
+    __slots__ = ("func", "__wrapped__")
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        self.func = func
+        self.__wrapped__ = func
+
+    def __call__(*args: Any, **kwargs: Any) -> Any:
+        # `self` is taken from `args`, since endpoints (e.g., of class-based views) may have a `self` keyword argument
+        self, args = args[0], args[1:]
+        timer = _current_timer.get()
+        if timer is None:
+            return self.func(*args, **kwargs)
+        start_cpu_ns = time.thread_time_ns()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            timer.cpu_ns += time.thread_time_ns() - start_cpu_ns
+
+
+def timing_span(name: str) -> _SpanContext:
+    """
+    Returns a context manager (which can also be used as a decorator) that records the time taken by the enclosed code
+    as a span named `name` in the timing data of the current request.
+
+    Spans can be nested, and are tracked using context variables, so they work across `await`s and inside sync code run
+    in the threadpool (e.g. `def` endpoints and dependencies, or `run_in_threadpool` calls). The resulting spans are
+    included in the `_TimingStats` passed to collectors (and in the messages recorded by `RecordCollector`),
+    and can be sent to the client in a `Server-Timing` header (see the `server_timing` argument to
+    `add_timing_middleware`).
+
+    Usage looks like:
+
+        with timing_span("db"):
+            ...
+
+        @timing_span("render")
+        async def render(...):
+            ...
+
+    If there is no request being timed, this does nothing.
+    """
+    return _SpanContext(name)
+
+
+class _TimingSpan:
+    """
+    A named span of time within a request, along with the spans nested inside of it.
+    """
+
+    __slots__ = ("name", "timer", "start_ns", "end_ns", "children")
+
+    def __init__(self, name: str, timer: _TimingStats) -> None:
+        self.name = name
+        self.timer = timer
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = 0
+        self.children: list[_TimingSpan] = []
+
+
+_current_span: ContextVar[_TimingSpan | None] = ContextVar("_current_span", default=None)
+_INVALID_SERVER_TIMING_CHARACTERS = re.compile(r"[^!#$%&'*+\-.^_`|~0-9A-Za-z]")
+
+
+class _SpanContext:
+    """
+    The context manager/decorator returned by `timing_span`.
+    """
+
+    __slots__ = ("name", "span", "token")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.span: _TimingSpan | None = None
+        self.token: Token[_TimingSpan | None] | None = None
+
+    def __enter__(self) -> None:
+        timer = _current_timer.get()
+        if timer is None or not timer.start_ns:
+            return
+        span = self.span = _TimingSpan(self.name, timer)
+        parent = _current_span.get()
+        if parent is not None and parent.timer is timer:
+            parent.children.append(span)
+        else:
+            if timer.spans is None:
+                timer.spans = []
+            timer.spans.append(span)
+        self.token = _current_span.set(span)
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        span = self.span
+        if span is not None:
+            span.end_ns = time.perf_counter_ns()
+            _current_span.reset(self.token)  # type: ignore[arg-type]
+            self.span = self.token = None
+
+    def __call__(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        name = self.name
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with _SpanContext(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with _SpanContext(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def time_dependency(call: Callable[..., Any], name: str | None = None) -> Callable[..., Any]:
+    """
+    Returns a wrapper of the dependency `call` (a function, generator, class or callable instance, sync or async) that
+    records the time taken to resolve it as a span named "depends:<name>" in the timing data of the current request.
 
-    def _get_cpu_time(self) -> float:
+    `name` defaults to the name of `call` (or of its type). For generator dependencies, only the code up to the `yield`
+    is timed. The time taken by any sub-dependencies is not included, since they are resolved before `call` is called;
+    they get their own spans if they are wrapped as well.
+
+    The wrapper compares (and hashes) equal to `call`, so `app.dependency_overrides` entries for `call` still apply,
+    though overridden dependencies are not timed.
+    """
+    if isinstance(call, _TimedDependency):
+        return call
+    span_name = f"depends:{name or getattr(call, '__name__', None) or type(call).__name__}"
+    if _is_async_gen_callable(call):
+        return _AsyncGeneratorTimedDependency(call, span_name)
+    if _is_gen_callable(call):
+        return _GeneratorTimedDependency(call, span_name)
+    if _is_coroutine_callable(call):
+        return _AsyncTimedDependency(call, span_name)
+    return _TimedDependency(call, span_name)
+
+
+def add_dependency_timing(app: FastAPI | APIRouter) -> None:
+    """
+    Wraps the dependencies (including sub-dependencies) of each route of `app` using `time_dependency`, so the time
+    spent resolving each dependency is recorded as a span of the request.
+
+    The dependencies of each route are resolved when the route is added, so this should be called once all routes
+    have been added (and any routers included). Nothing is wrapped unless this is called, so there is no overhead
+    when dependency timing isn't used.
+    """
+    for route in app.routes:
+        dependant: Dependant | None = getattr(route, "dependant", None)
+        if dependant is not None:
+            _time_sub_dependencies(dependant)
+
+
+def _time_sub_dependencies(dependant: Dependant) -> None:
+    for sub_dependant in dependant.dependencies:
+        if sub_dependant.call is not None:
+            sub_dependant.call = time_dependency(sub_dependant.call)
+        _time_sub_dependencies(sub_dependant)
+
+
+def _is_coroutine_callable(call: Callable[..., Any]) -> bool:
+    if inspect.isroutine(call):
+        return inspect.iscoroutinefunction(call)
+    if inspect.isclass(call):
+        return False
+    return inspect.iscoroutinefunction(getattr(call, "__call__", None))
+
+
+def _is_gen_callable(call: Callable[..., Any]) -> bool:
+    return inspect.isgeneratorfunction(call) or inspect.isgeneratorfunction(getattr(call, "__call__", None))
+
+
+def _is_async_gen_callable(call: Callable[..., Any]) -> bool:
+    return inspect.isasyncgenfunction(call) or inspect.isasyncgenfunction(getattr(call, "__call__", None))
+
+
+class _TimedDependency:
+    """
+    The wrapper returned by `time_dependency` for sync dependencies.
+
+    FastAPI decides how to call a dependency based on the type of its `__call__` method, so there is a subclass for
+    each kind of dependency.
+    """
+
+    __slots__ = ("call", "span_name", "__wrapped__")
+
+    def __init__(self, call: Callable[..., Any], span_name: str) -> None:
+        self.call = call
+        self.span_name = span_name
+        self.__wrapped__ = call
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        with _SpanContext(self.span_name):
+            return self.call(*args, **kwargs)
+
+    @property
+    def __globals__(self) -> dict[str, Any]:
+        # Used by FastAPI to resolve string annotations in the signature of the wrapped callable
+        return getattr(self.call, "__globals__", {})
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _TimedDependency):
+            return bool(self.call == other.call)
+        return bool(self.call == other)
+
+    def __hash__(self) -> int:
+        return hash(self.call)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.call!r})"
+
+
+class _AsyncTimedDependency(_TimedDependency):
+    __slots__ = ()
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        with _SpanContext(self.span_name):
+            return await self.call(*args, **kwargs)
+
+
+class _GeneratorTimedDependency(_TimedDependency):
+    __slots__ = ()
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        with ExitStack() as stack:
+            with _SpanContext(self.span_name):
+                value = stack.enter_context(contextmanager(self.call)(*args, **kwargs))
+            yield value
+
+
+class _AsyncGeneratorTimedDependency(_TimedDependency):
+    __slots__ = ()
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        async with AsyncExitStack() as stack:
+            with _SpanContext(self.span_name):
+                value = await stack.enter_async_context(asynccontextmanager(self.call)(*args, **kwargs))
+            yield value
+
+
+class TimingCollector:
+    """
+    Base class for objects that receive the timing data recorded by a `TimingMiddleware`.
+
+    `observe` is called with the `_TimingStats` of each (non-excluded) request once it has been handled.
+    It is called in the request path, so it should be fast and must not block. By default, it does nothing.
+
+    `observe_batch` is called instead of `observe` with lists of `_TimingStats` by a `BatchedEmitter`;
+    by default, it just calls `observe` for each item.
+
+    `request_started` and `request_finished` are called (in the task handling the request) when each timed request
+    starts and finishes, whether or not it is sampled. They are only called for collectors that override them, and
+    only if the collector is passed directly to the middleware (not wrapped in a `BatchedEmitter`).
+
+    `startup` and `shutdown` are awaited when the app receives the corresponding lifespan events, and can be
+    overridden to manage any background tasks the collector needs.
+    """
+
+    def observe(self, stats: _TimingStats) -> None:
+        pass
+
+    def request_started(self, stats: _TimingStats) -> None:
+        pass
+
+    def request_finished(self, stats: _TimingStats) -> None:
+        pass
+
+    def observe_batch(self, batch: list[_TimingStats]) -> None:
+        for stats in batch:
+            self.observe(stats)
+
+    async def startup(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class RecordCollector(TimingCollector):
+    """
+    Calls `record` with a formatted timing message for each request.
+
+    This is the behavior of `TimingMiddleware` when no collectors are specified.
+    """
+
+    def __init__(self, record: Callable[[str], None] | None = None) -> None:
+        self.record = record or print
+
+    def observe(self, stats: _TimingStats) -> None:
+        self.record(stats.message())
+
+
+class TimingMonitor(TimingCollector):
+    """
+    Base class for collectors that monitor the whole process (e.g., the event loop or the threadpool) while the app is
+    running, rather than the timing data of each request; see `fastapi_utils.monitors`.
+
+    Monitors are started and stopped by a `TimingMiddleware` at app startup and shutdown; pass them as `collectors`,
+    along with the collectors of the timing data (e.g., a `RecordCollector`). Monitors report problems by passing a
+    message to `record`; if it is None, the `record` callable of the middleware is used (or `print`, if that is None).
+    """
+
+    def __init__(self, record: Callable[[str], None] | None = None) -> None:
+        self.record = record
+
+    def _report(self, message: str) -> None:
+        (self.record or print)(message)
+
+
+class BatchedEmitter(TimingCollector):
+    """
+    Passes timing data to the provided `collectors` from a background thread, rather than in the request path.
+
+    This is useful for collectors that may block, such as a `RecordCollector` whose `record` callable writes to a file
+    or sends logs over the network: `observe` just appends the timing data to an in-memory ring buffer holding up to
+    `capacity` items, and a background thread passes it to the collectors' `observe_batch` method in batches of up to
+    `batch_size` items every `interval` seconds.
+
+    If the buffer is full when a new item is observed, either the oldest item in the buffer is dropped
+    (if `overflow == "drop_oldest"`, the default) or the new item is (if `overflow == "drop_newest"`).
+    The number of items dropped so far is available as `dropped`, and the number emitted as `emitted`.
+
+    The thread is started with the first observed item (or at app startup), and stopped (after emitting any items left
+    in the buffer) at app shutdown. The startup and shutdown of the wrapped collectors are also handled by the emitter.
+    """
+
+    def __init__(
+        self,
+        collectors: Sequence[TimingCollector],
+        capacity: int = 10_000,
+        batch_size: int = 1_000,
+        interval: float = 0.1,
+        overflow: str = "drop_oldest",
+    ) -> None:
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Invalid overflow policy: {overflow!r}")
+        self.collectors = list(collectors)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.interval = interval
+        self.overflow = overflow
+        self.dropped = 0
+        self.emitted = 0
+
+        self._buffer: deque[_TimingStats] = deque(maxlen=capacity)
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def observe(self, stats: _TimingStats) -> None:
+        if self._thread is None:
+            self._start_thread()
+        buffer = self._buffer
+        if len(buffer) >= self.capacity:
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return
+        buffer.append(stats)
+
+    def emit_pending(self) -> None:
         """
-        Generates the cpu time to report. Adds the user and system time, following the implementation from timing-asgi
+        Passes all of the items currently in the buffer to the collectors, in batches.
+
+        This is called periodically by the background thread, but can also be called directly.
         """
-        resources = self.process.cpu_times()
-        # add up user time and system time
-        return resources[0] + resources[1]
+        buffer = self._buffer
+        while buffer:
+            batch: list[_TimingStats] = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(buffer.popleft())
+            except IndexError:
+                pass
+            for collector in self.collectors:
+                try:
+                    collector.observe_batch(batch)
+                except Exception:
+                    logger.exception("Error emitting timing data to %r", collector)
+            self.emitted += len(batch)
+
+    async def startup(self) -> None:
+        for collector in self.collectors:
+            await collector.startup()
+        if self._thread is None:
+            self._start_thread()
+
+    async def shutdown(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            await run_in_threadpool(thread.join)
+            self._thread = None
+            self._stopping.clear()
+        self.emit_pending()
+        for collector in self.collectors:
+            await collector.shutdown()
+
+    def _start_thread(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="fastapi-utils-timing-emitter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.emit_pending()
+
+
+class TimingSummary(NamedTuple):
+    """
+    Summary statistics for the requests to a single route over one `TimingAggregator` flush interval.
+
+    All durations are in milliseconds. `bytes_sent` and `chunks` are the totals for the response bodies sent.
+    The queue time percentiles are for the `queued` requests whose queue time was known (see `add_timing_middleware`).
+    If a `monitors.GcMonitor` is running, `gc_time` is the total time the requests were paused by garbage collections,
+    `gc_paused` the number of requests that were paused, and the `wall_excluding_gc` percentiles are of the wall times
+    of the requests minus their pauses.
+    """
+
+    name: str
+    requests: int
+    wall_p50: float
+    wall_p90: float
+    wall_p99: float
+    wall_max: float
+    cpu_p50: float
+    cpu_p90: float
+    cpu_p99: float
+    cpu_max: float
+    ttfb_p50: float = 0.0
+    ttfb_p99: float = 0.0
+    bytes_sent: int = 0
+    chunks: int = 0
+    queued: int = 0
+    queue_p50: float = 0.0
+    queue_p99: float = 0.0
+    gc_paused: int = 0
+    gc_time: float = 0.0
+    wall_excluding_gc_p50: float = 0.0
+    wall_excluding_gc_p99: float = 0.0
+
+    def message(self) -> str:
+        message = (
+            f"TIMING: {self.requests} requests"
+            f" | Wall p50: {self.wall_p50:6.1f}ms p90: {self.wall_p90:6.1f}ms"
+            f" p99: {self.wall_p99:6.1f}ms max: {self.wall_max:6.1f}ms"
+            f" | CPU p50: {self.cpu_p50:6.1f}ms p90: {self.cpu_p90:6.1f}ms"
+            f" p99: {self.cpu_p99:6.1f}ms max: {self.cpu_max:6.1f}ms"
+        )
+        if self.queued:
+            message += f" | Queue p50: {self.queue_p50:6.1f}ms p99: {self.queue_p99:6.1f}ms"
+        if self.gc_paused:
+            message += (
+                f" | Excluding GC p50: {self.wall_excluding_gc_p50:6.1f}ms p99: {self.wall_excluding_gc_p99:6.1f}ms"
+                f" | GC: {self.gc_time:.1f}ms in {self.gc_paused} requests"
+            )
+        return (
+            message + f" | TTFB p50: {self.ttfb_p50:6.1f}ms p99: {self.ttfb_p99:6.1f}ms"
+            f" | Sent: {self.bytes_sent} bytes in {self.chunks} chunks"
+            f" | {self.name}"
+        )
+
+
+class TimingAggregator(TimingCollector):
+    """
+    Aggregates the timing data for each route into in-memory histograms, rather than recording every request.
+
+    Every `flush_interval` seconds (while the app is running), a `TimingSummary` is generated for each route that
+    received requests during the interval, and the histograms are reset. If `on_flush` is provided, it is called
+    with the list of summaries; otherwise, a message for each summary is passed to `record` (which defaults to `print`).
+
+    Durations are recorded in log-bucketed (HDR-style) histograms with a fixed number of buckets, so the memory used
+    per route is constant, and reported percentiles are accurate to within about 3%.
+
+    Flushing is driven by the app's lifespan events; `flush` can also be called directly at any time. The histograms
+    are guarded by a lock, so the aggregator can be wrapped in a `BatchedEmitter` (which observes requests on its
+    own thread) and flushed from the event loop.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 60.0,
+        on_flush: Callable[[list[TimingSummary]], None] | None = None,
+        record: Callable[[str], None] | None = None,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.record = record or print
+        self.routes: dict[str | None, _RouteAggregate] = {}
+        self._flush_task: asyncio.Future[None] | None = None
+        self._lock = threading.Lock()
+
+    def observe(self, stats: _TimingStats) -> None:
+        with self._lock:
+            self._observe(stats)
+
+    def observe_batch(self, batch: list[_TimingStats]) -> None:
+        with self._lock:
+            for stats in batch:
+                self._observe(stats)
+
+    def _observe(self, stats: _TimingStats) -> None:
+        route = self.routes.get(stats.name)
+        if route is None:
+            route = self.routes[stats.name] = _RouteAggregate()
+        route.wall.record(stats.time)
+        route.cpu.record(stats.cpu_time)
+        if stats.response_start_ns:
+            route.ttfb.record((stats.response_start_ns - stats.start_ns) / 1e9)
+        if stats.queue_ns is not None:
+            route.queue.record(stats.queue_ns / 1e9)
+        gc_ns = stats.gc_ns
+        if gc_ns is not None:
+            route.wall_excluding_gc.record((stats.end_ns - stats.start_ns - gc_ns) / 1e9)
+            if gc_ns:
+                route.gc_paused += 1
+                route.gc_ns += gc_ns
+        route.bytes_sent += stats.bytes_sent
+        route.chunks += stats.chunks
+
+    def flush(self) -> list[TimingSummary]:
+        """
+        Generates summaries of the timing data recorded since the last flush, and resets the histograms.
+
+        The summaries are passed to `on_flush` (or recorded) before being returned.
+        """
+        with self._lock:
+            summaries = self._summarize()
+        if summaries:
+            if self.on_flush is not None:
+                self.on_flush(summaries)
+            else:
+                for summary in summaries:
+                    self.record(summary.message())
+        return summaries
+
+    def _summarize(self) -> list[TimingSummary]:
+        """
+        Generates the summaries of the routes that received requests since the last flush, and resets the histograms.
+        """
+        summaries = []
+        for name, route in self.routes.items():
+            wall_histogram, cpu_histogram = route.wall, route.cpu
+            if wall_histogram.count == 0:
+                continue
+            wall_p50, wall_p90, wall_p99 = wall_histogram.quantiles(0.5, 0.9, 0.99)
+            cpu_p50, cpu_p90, cpu_p99 = cpu_histogram.quantiles(0.5, 0.9, 0.99)
+            ttfb_p50, ttfb_p99 = route.ttfb.quantiles(0.5, 0.99) if route.ttfb.count else (0.0, 0.0)
+            queue_p50, queue_p99 = route.queue.quantiles(0.5, 0.99) if route.queue.count else (0.0, 0.0)
+            wall_excluding_gc_p50, wall_excluding_gc_p99 = route.wall_excluding_gc.quantiles(0.5, 0.99)
+            summaries.append(
+                TimingSummary(
+                    name=str(name),
+                    requests=wall_histogram.count,
+                    wall_p50=1000 * wall_p50,
+                    wall_p90=1000 * wall_p90,
+                    wall_p99=1000 * wall_p99,
+                    wall_max=1000 * wall_histogram.max,
+                    cpu_p50=1000 * cpu_p50,
+                    cpu_p90=1000 * cpu_p90,
+                    cpu_p99=1000 * cpu_p99,
+                    cpu_max=1000 * cpu_histogram.max,
+                    ttfb_p50=1000 * ttfb_p50,
+                    ttfb_p99=1000 * ttfb_p99,
+                    bytes_sent=route.bytes_sent,
+                    chunks=route.chunks,
+                    queued=route.queue.count,
+                    queue_p50=1000 * queue_p50,
+                    queue_p99=1000 * queue_p99,
+                    gc_paused=route.gc_paused,
+                    gc_time=route.gc_ns / 1e6,
+                    wall_excluding_gc_p50=1000 * wall_excluding_gc_p50,
+                    wall_excluding_gc_p99=1000 * wall_excluding_gc_p99,
+                )
+            )
+            route.reset()
+        return summaries
+
+    async def startup(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    async def shutdown(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+
+class _RouteAggregate:
+    """
+    The histograms and totals collected for a single route by a `TimingAggregator` during the current interval.
+    """
+
+    __slots__ = ("wall", "cpu", "ttfb", "queue", "wall_excluding_gc", "bytes_sent", "chunks", "gc_paused", "gc_ns")
+
+    def __init__(self) -> None:
+        self.wall = _LatencyHistogram()
+        self.cpu = _LatencyHistogram()
+        self.ttfb = _LatencyHistogram()
+        self.queue = _LatencyHistogram()
+        self.wall_excluding_gc = _LatencyHistogram()
+        self.bytes_sent = 0
+        self.chunks = 0
+        self.gc_paused = 0
+        self.gc_ns = 0
+
+    def reset(self) -> None:
+        self.wall.reset()
+        self.cpu.reset()
+        self.ttfb.reset()
+        self.queue.reset()
+        self.wall_excluding_gc.reset()
+        self.bytes_sent = 0
+        self.chunks = 0
+        self.gc_paused = 0
+        self.gc_ns = 0
+
+
+class _LatencyHistogram:
+    """
+    A log-bucketed histogram of durations, in the style of an HDR histogram.
+
+    Durations are recorded with microsecond resolution. Values below `2 * SUB_BUCKETS` microseconds each get their own
+    bucket; above that, each power-of-two range is split into `SUB_BUCKETS` equal-width buckets, bounding the relative
+    error of reported values by `1 / SUB_BUCKETS`. Values above `MAX_VALUE` microseconds (about 38 hours) are clamped.
+    """
+
+    SUB_BUCKET_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    MAX_VALUE = (1 << 37) - 1
+    N_BUCKETS = (MAX_VALUE.bit_length() - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+    __slots__ = ("counts", "count", "max_value")
+
+    def __init__(self) -> None:
+        self.counts = array("I", bytes(4 * self.N_BUCKETS))
+        self.count = 0
+        self.max_value = 0
+
+    def record(self, seconds: float) -> None:
+        value = min(max(int(seconds * 1_000_000), 0), self.MAX_VALUE)
+        self.counts[self._bucket_index(value)] += 1
+        self.count += 1
+        if value > self.max_value:
+            self.max_value = value
+
+    def reset(self) -> None:
+        self.counts[:] = array("I", bytes(4 * self.N_BUCKETS))
+        self.count = 0
+        self.max_value = 0
+
+    @property
+    def max(self) -> float:
+        """
+        The largest recorded duration, in seconds
+        """
+        return self.max_value / 1_000_000
+
+    def quantiles(self, *qs: float) -> list[float]:
+        """
+        Returns the durations (in seconds) below which the fractions `qs` of the recorded durations fall.
+
+        The upper bound of the bucket containing each quantile is reported, capped at the largest recorded duration.
+        """
+        if self.count == 0:
+            return [0.0 for _ in qs]
+        cumulative_counts = list(accumulate(self.counts))
+        results = []
+        for q in qs:
+            index = bisect_left(cumulative_counts, max(math.ceil(q * self.count), 1))
+            results.append(min(self._bucket_upper_bound(index), self.max_value) / 1_000_000)
+        return results
+
+    @classmethod
+    def _bucket_index(cls, value: int) -> int:
+        if value < 2 * cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return (shift + 1) * cls.SUB_BUCKETS + (value >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _bucket_upper_bound(cls, index: int) -> int:
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        sub_bucket = index - shift * cls.SUB_BUCKETS
+        return ((sub_bucket + 1) << shift) - 1
 
 
 class _MetricNamer:
@@ -161,30 +1416,176 @@ class _MetricNamer:
     would get name `custom.app.crud.read_item`. If the empty string were used as the prefix, the result would be
     just "app.crud.read_item".
 
-    For starlette.routing.Mount instances, the name of the type of `route.app` is used in a slightly different format.
+    For starlette.routing.Mount instances, the routes of the mounted app (if it has any) are searched for a match
+    in the same way; if none is found, the name of the type of `route.app` is used in a slightly different format.
 
     For other routes missing either an endpoint or name, the raw route path is included in the generated name.
+
+    Rather than trying every route in order for each request, the routes are indexed the first time a name is
+    generated: routes with a static path are looked up by path, and only routes with path parameters (and mounts)
+    need to be matched individually. Generated names are also cached per (method, path) in an LRU cache holding up to
+    `cache_size` entries. The index is rebuilt (and the cache cleared) if routes are added to or removed from the app
+    (or any of its mounted apps) afterward.
     """
 
-    def __init__(self, prefix: str, app: FastAPI):
+    def __init__(self, prefix: str, app: Starlette | None, cache_size: int = 1024):
         if prefix:
             prefix += "."
         self.prefix = prefix
         self.app = app
+        self.cache_size = cache_size
+
+        self._index: _RouteIndex | None = None
+        self._cache: OrderedDict[tuple[Any, ...], _RouteEntry] = OrderedDict()
+        self._entries: dict[int, _RouteEntry] = {}
 
     def __call__(self, scope: Scope) -> str:
         """
         Generates the actual name to use when logging timing metrics for a specified ASGI Scope
         """
-        route = None
-        for r in self.app.router.routes:
-            if r.matches(scope)[0] == Match.FULL:
-                route = r
-                break
+        return self.resolve(scope).name
+
+    def resolve(self, scope: Scope) -> _RouteEntry:
+        """
+        Returns the `_RouteEntry` (holding the generated name) for the route matching the specified ASGI Scope.
+
+        The same entry is returned for every request matching a given route, so it can be used to store
+        per-route state.
+        """
+        index = self._index
+        if index is None or index.is_stale(self._get_routes()):
+            index = self._index = _RouteIndex(self._get_routes())
+            self._cache.clear()
+            self._entries.clear()
+
+        key: tuple[Any, ...] = (scope["type"], scope.get("method"), scope["path"], scope.get("root_path", ""))
+        if index.has_hosts:
+            key += (Headers(scope=scope).get("host"),)
+        cache = self._cache
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+            return entry
+
+        entry = self._get_entry(index, scope)
+        cache[key] = entry
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return entry
+
+    def _get_routes(self) -> list[BaseRoute]:
+        return self.app.router.routes if self.app is not None else []
+
+    def _get_entry(self, index: _RouteIndex, scope: Scope) -> _RouteEntry:
+        route, child_route = index.find(scope)
+        if child_route is not None:
+            route = child_route
         if hasattr(route, "endpoint") and hasattr(route, "name"):
             name = f"{self.prefix}{route.endpoint.__module__}.{route.name}"  # type: ignore
         elif isinstance(route, Mount):
             name = f"{type(route.app).__name__}<{route.name!r}>"
         else:
-            name = str(f"<Path: {scope['path']}>")
-        return name
+            return _RouteEntry(str(f"<Path: {scope['path']}>"), None)
+
+        entry = self._entries.get(id(route))
+        if entry is None:
+            entry = self._entries[id(route)] = _RouteEntry(name, route)
+        return entry
+
+
+class _RouteEntry:
+    """
+    The metric name generated by a `_MetricNamer` for a route (or for an unmatched path, in which case `route` is None).
+
+    `plan` is set by `TimingMiddleware` the first time the route is requested.
+    """
+
+    __slots__ = ("name", "route", "plan")
+
+    def __init__(self, name: str, route: BaseRoute | None) -> None:
+        self.name = name
+        self.route = route
+        self.plan: _RoutePlan | None = None
+
+
+class _RouteIndex:
+    """
+    An index over a list of starlette routes, used by `_MetricNamer` to find the route matching a scope.
+
+    Routes with a static path (no path parameters) are grouped by path, and other routes (with path parameters, and
+    mounts) whose path starts with a static segment are grouped by that segment, so only those that can match the
+    requested path need to be checked, along with the routes that can't be indexed this way (routes with a path
+    parameter in their first segment, hosts, etc.). Candidates are always checked in their original order, so the
+    result is the same as trying each route in turn.
+
+    Mounted apps (and hosts) with routes of their own get a nested index, which is searched when they match.
+    """
+
+    def __init__(self, routes: list[BaseRoute]):
+        self.routes = routes
+        self.n_routes = len(routes)
+        self.static: dict[str, list[tuple[int, BaseRoute]]] = {}
+        self.by_segment: dict[str, list[tuple[int, BaseRoute]]] = {}
+        self.dynamic: list[tuple[int, BaseRoute]] = []
+        self.children: dict[int, _RouteIndex] = {}
+        self.has_hosts = False
+
+        for position, route in enumerate(routes):
+            if isinstance(route, (Route, WebSocketRoute)) and not route.param_convertors:
+                self.static.setdefault(route.path, []).append((position, route))
+                continue
+            segment = _get_first_segment(route.path) if isinstance(route, (Route, WebSocketRoute, Mount)) else ""
+            if segment and "{" not in segment:
+                self.by_segment.setdefault(segment, []).append((position, route))
+            else:
+                self.dynamic.append((position, route))
+            if isinstance(route, (Mount, Host)):
+                self.has_hosts = self.has_hosts or isinstance(route, Host)
+                child_routes = route.routes
+                if child_routes:
+                    child = _RouteIndex(child_routes)
+                    self.children[position] = child
+                    self.has_hosts = self.has_hosts or child.has_hosts
+
+    def is_stale(self, routes: list[BaseRoute]) -> bool:
+        """
+        Returns True if routes have been added to or removed from the indexed routes (including in mounted apps).
+        """
+        if routes is not self.routes or len(routes) != self.n_routes:
+            return True
+        return any(child.is_stale(child.routes) for child in self.children.values())
+
+    def find(self, scope: Scope) -> tuple[BaseRoute | None, BaseRoute | None]:
+        """
+        Returns the first route that fully matches `scope`, along with the matching route of its mounted app, if any.
+        """
+        path = _get_route_path(scope)
+        groups = [
+            group
+            for group in (self.static.get(path), self.by_segment.get(_get_first_segment(path)), self.dynamic)
+            if group
+        ]
+        candidates: Iterable[tuple[int, BaseRoute]] = (
+            groups[0] if len(groups) == 1 else heapq.merge(*groups, key=itemgetter(0))
+        )
+        for position, route in candidates:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                child = self.children.get(position)
+                if child is None:
+                    return route, None
+                child_route, grandchild_route = child.find({**scope, **child_scope})
+                return route, grandchild_route or child_route
+        return None, None
+
+
+def _get_first_segment(path: str) -> str:
+    return path[1:].partition("/")[0]
+
+
+def _get_scope_path(scope: Scope) -> str:
+    return scope["path"]
+
+
+# Newer versions of starlette strip the root_path from the scope's path when matching routes
+_get_route_path: Callable[[Scope], str] = getattr(starlette._utils, "get_route_path", _get_scope_path)
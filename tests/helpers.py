@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from fastapi_utils.timing import TimingCollector, _TimingStats
+
+
+class StoringCollector(TimingCollector):
+    """
+    Stores the timing data of each request observed, for tests to make assertions on.
+    """
+
+    def __init__(self) -> None:
+        self.stats: list[_TimingStats] = []
+
+    def observe(self, stats: _TimingStats) -> None:
+        self.stats.append(stats)
@@ -21,3 +21,11 @@ def test_enable_docs(monkeypatch: MonkeyPatch, disable_docs: str, status_code: i
     app = get_app()
     response = TestClient(app).get("/docs")
     assert response.status_code == status_code
+
+
+def test_threadpool_tokens(monkeypatch: MonkeyPatch) -> None:
+    get_api_settings.cache_clear()
+    assert get_api_settings().threadpool_tokens is None
+    monkeypatch.setenv("API_THREADPOOL_TOKENS", "5")
+    get_api_settings.cache_clear()
+    assert get_api_settings().threadpool_tokens == 5
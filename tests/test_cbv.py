@@ -3,10 +3,12 @@ from __future__ import annotations
 from typing import Any, ClassVar, Optional
 
 import pytest
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, FastAPI, Request, params
 from starlette.testclient import TestClient
 
-from fastapi_utils.cbv import cbv
+from fastapi_utils.cbv import _get_timed_default, cbv
+from fastapi_utils.timing import add_timing_middleware
+from tests.helpers import StoringCollector
 
 
 class TestCBV:
@@ -63,6 +65,56 @@ class TestCBV:
         assert response.status_code == 200
         assert response.content == b"3"
 
+    def test_time_dependencies(self, router: APIRouter) -> None:
+        def dependency_one() -> int:
+            return 1
+
+        async def dependency_two() -> int:
+            return 2
+
+        @cbv(router, time_dependencies=True)
+        class CBV:
+            one: int = Depends(dependency_one)
+
+            def __init__(self, two: int = Depends(dependency_two)):
+                self.two = two
+
+            @router.get("/", response_model=int)
+            def int_dependencies(self) -> int:
+                return self.one + self.two
+
+        app = FastAPI()
+        collector = StoringCollector()
+        add_timing_middleware(app, collectors=[collector])
+        app.include_router(router)
+        client = TestClient(app)
+        response = client.get("/")
+        assert response.content == b"3"
+        (stats,) = collector.stats
+        assert [path for path, _ in stats.span_times()] == [
+            "depends:dependency_two",
+            "depends:dependency_one",
+            "depends:CBV",
+        ]
+
+        app.dependency_overrides[dependency_one] = lambda: 10
+        assert client.get("/").content == b"12"
+
+    def test_timed_default_keeps_marker_parameters(self) -> None:
+        class ScopedDepends(params.Depends):
+            def __init__(self, dependency: Any, *, use_cache: bool = True, scope: str | None = None) -> None:
+                super().__init__(dependency, use_cache=use_cache)
+                self.scope = scope
+
+        def dependency() -> int:
+            return 1
+
+        timed = _get_timed_default(ScopedDepends(dependency, use_cache=False, scope="function"))
+        assert isinstance(timed, ScopedDepends)
+        assert timed.dependency is not dependency
+        assert timed.use_cache is False
+        assert timed.scope == "function"
+
     def test_class_var(self, router: APIRouter) -> None:
         @cbv(router)
         class CBV:
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fastapi_utils.cron import CronSchedule
+
+
+@pytest.mark.parametrize(
+    "expression,moment,result",
+    [
+        ("*/5 * * * *", datetime(2024, 1, 1, 12, 3, 59), datetime(2024, 1, 1, 12, 5)),
+        ("*/5 * * * *", datetime(2024, 1, 1, 12, 5), datetime(2024, 1, 1, 12, 10)),
+        ("30 2 * * *", datetime(2024, 1, 1, 2, 30), datetime(2024, 1, 2, 2, 30)),
+        ("30 2 * * *", datetime(2024, 12, 31, 23, 59), datetime(2025, 1, 1, 2, 30)),
+        ("0 9 * * mon-fri", datetime(2024, 6, 7, 10, 0), datetime(2024, 6, 10, 9, 0)),
+        ("0 0 29 2 *", datetime(2024, 3, 1), datetime(2028, 2, 29)),
+        ("0 0 31 * *", datetime(2024, 4, 1), datetime(2024, 5, 31)),
+        # Restricting both days of the month and of the week matches either
+        ("0 0 13 * fri", datetime(2024, 9, 1), datetime(2024, 9, 6)),
+        ("0 0 13 * fri", datetime(2024, 9, 10), datetime(2024, 9, 13)),
+        # ...unless one of them starts with "*", in which case days must match both
+        ("0 0 */10 * sun", datetime(2024, 9, 2), datetime(2024, 12, 1)),
+        ("5/20 3-5 * jan,jul *", datetime(2024, 2, 1), datetime(2024, 7, 1, 3, 5)),
+        ("0 0 * * 7", datetime(2024, 9, 3), datetime(2024, 9, 8)),
+        ("@hourly", datetime(2024, 1, 1, 23, 0), datetime(2024, 1, 2, 0, 0)),
+        ("@weekly", datetime(2024, 9, 3), datetime(2024, 9, 8)),
+        ("@yearly", datetime(2024, 1, 1), datetime(2025, 1, 1)),
+    ],
+)
+def test_next_after(expression: str, moment: datetime, result: datetime) -> None:
+    schedule = CronSchedule(expression)
+    assert schedule.next_after(moment) == result
+    assert schedule.matches(result)
+    assert not schedule.matches(result - timedelta(minutes=1)) or expression.startswith("*")
+
+
+@pytest.mark.parametrize("expression", ["*/7 */5 */3 * *", "0 0 1,15 * wed", "0 12 */2 * mon"])
+def test_next_after_matches_brute_force(expression: str) -> None:
+    schedule = CronSchedule(expression)
+    moment = datetime(2023, 1, 1)
+    for _ in range(20):
+        expected = moment.replace(second=0) + timedelta(minutes=1)
+        while not schedule.matches(expected):
+            expected += timedelta(minutes=1)
+        assert schedule.next_after(moment) == expected
+        moment = expected + timedelta(hours=7, minutes=13, seconds=5)
+
+
+def test_next_after_keeps_tzinfo() -> None:
+    tz = timezone(timedelta(hours=2))
+    assert CronSchedule("0 0 * * *").next_after(datetime(2024, 1, 1, 12, tzinfo=tz)) == datetime(2024, 1, 2, tzinfo=tz)
+
+
+@pytest.mark.parametrize(
+    "expression", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "*/0 * * * *", "5-1 * * * *", "* * * foo *"]
+)
+def test_invalid_expression(expression: str) -> None:
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_expression_never_matches() -> None:
+    with pytest.raises(ValueError, match="never matches"):
+        CronSchedule("0 0 30 2 *")
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from fastapi_utils.locks import FileJobLock
+from fastapi_utils.session import FastAPISessionMaker
+from fastapi_utils.sql_locks import SqlJobLock
+from fastapi_utils.tasks import JobLock, RepeatedTaskStats, repeat_every
+
+
+def test_file_job_lock(tmp_path: Path) -> None:
+    lock, other_lock = FileJobLock(tmp_path), FileJobLock(tmp_path)
+    assert lock.acquire("job", 0.2)
+    assert lock.acquire("job", 0.2)
+    assert not other_lock.acquire("job", 0.2)
+    assert other_lock.acquire("other job", 0.2)
+
+    # Once the lease expires without being renewed, another process takes over
+    time.sleep(0.25)
+    assert other_lock.acquire("job", 10)
+    assert not lock.acquire("job", 10)
+
+    # Releasing the lock keeps the lease until it expires
+    other_lock.release("job")
+    assert not lock.acquire("job", 10)
+
+
+def test_file_job_lock_invalid_expiry(tmp_path: Path) -> None:
+    lock = FileJobLock(tmp_path)
+    lock.get_path("job").write_bytes(b"not a time\xff")
+    # An expiry time that can't be parsed counts as an expired lease
+    assert lock.acquire("job", 10)
+    assert not FileJobLock(tmp_path).acquire("job", 10)
+
+
+def test_file_job_lock_across_processes(tmp_path: Path) -> None:
+    code = f"""
+import sys
+from fastapi_utils.locks import FileJobLock
+assert FileJobLock({str(tmp_path)!r}).acquire("job", 0.2)
+print("acquired", flush=True)
+sys.stdin.read()
+"""
+    root = Path(__file__).parent.parent
+    process = subprocess.Popen(
+        [sys.executable, "-c", code],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=root,
+        env={**os.environ, "PYTHONPATH": str(root)},
+    )
+    try:
+        assert process.stdout is not None
+        assert process.stdout.readline() == "acquired\n"
+        lock = FileJobLock(tmp_path)
+        assert not lock.acquire("job", 1)
+        process.kill()
+        process.wait()
+        time.sleep(0.25)
+        assert lock.acquire("job", 1)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_sql_job_lock(tmp_path: Path) -> None:
+    session_maker = FastAPISessionMaker(f"sqlite:///{tmp_path / 'locks.db'}?check_same_thread=False")
+    lock, other_lock = SqlJobLock(session_maker, owner="a"), SqlJobLock(session_maker, owner="b")
+    assert lock.acquire("job", 0.2)
+    assert lock.acquire("job", 0.2)
+    assert not other_lock.acquire("job", 0.2)
+    assert other_lock.acquire("other job", 0.2)
+
+    # Once the lease expires without being renewed, another process takes over
+    time.sleep(0.25)
+    assert other_lock.acquire("job", 10)
+    assert not lock.acquire("job", 10)
+
+
+@pytest.fixture(params=["file", "sql"])
+def get_lock(request: pytest.FixtureRequest, tmp_path: Path) -> Callable[[], JobLock]:
+    session_maker = FastAPISessionMaker(f"sqlite:///{tmp_path / 'locks.db'}?check_same_thread=False")
+
+    def get_lock() -> JobLock:
+        return FileJobLock(tmp_path) if request.param == "file" else SqlJobLock(session_maker)
+
+    return get_lock
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_repeat_every_with_lock(get_lock: Callable[[], JobLock]) -> None:
+    calls: list[str] = []
+    completed = [asyncio.Event(), asyncio.Event()]
+    stats = [RepeatedTaskStats(), RepeatedTaskStats()]
+
+    # Two "workers" run the same job; each one stops after 3 calls
+    for worker in range(2):
+
+        @repeat_every(
+            seconds=0.1,
+            fixed_rate=True,
+            max_repetitions=3,
+            lock=get_lock(),
+            stats=stats[worker],
+            on_complete=completed[worker].set,
+            name="refresh",
+        )
+        def refresh(worker: int = worker) -> None:
+            calls.append(f"worker {worker}")
+
+        await refresh()
+
+    await completed[0].wait()
+    await completed[1].wait()
+    await asyncio.sleep(0.1)  # the jobs keep ticking until their ticks after the final calls
+
+    # Each tick is handled by exactly one of the workers (the other one is on standby while both are running), and
+    # standby ticks don't count as repetitions
+    assert len(calls) == 6
+    assert calls.count("worker 0") == calls.count("worker 1") == 3
+    assert stats[0].runs == stats[1].runs == 3
+    assert stats[0].standby_ticks + stats[1].standby_ticks >= 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_repeat_every_with_lock_long_calls(get_lock: Callable[[], JobLock]) -> None:
+    calls: list[tuple[int, float, float]] = []
+    completed = [asyncio.Event(), asyncio.Event()]
+    stats = [RepeatedTaskStats(), RepeatedTaskStats()]
+    loop = asyncio.get_event_loop()
+
+    # Each call lasts longer than the interval of the job (and its lease), so the lease is renewed while it runs
+    for worker in range(2):
+
+        @repeat_every(
+            seconds=0.1,
+            max_repetitions=2,
+            lock=get_lock(),
+            stats=stats[worker],
+            on_complete=completed[worker].set,
+            name="refresh",
+        )
+        async def refresh(worker: int = worker) -> None:
+            start = loop.time()
+            await asyncio.sleep(0.25)
+            calls.append((worker, start, loop.time()))
+
+        await refresh()
+
+    await completed[0].wait()
+    await completed[1].wait()
+
+    # The calls never overlap, and only the calls made count as repetitions
+    assert len(calls) == 4
+    calls.sort(key=lambda call: call[1])
+    for (_, _, end), (_, next_start, _) in zip(calls, calls[1:]):
+        assert next_start >= end
+    assert stats[0].runs == stats[1].runs == 2
+    assert stats[0].standby_ticks + stats[1].standby_ticks >= 2
+
+
+class FailingLock(JobLock):
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+
+    def acquire(self, name: str, lease: float) -> bool:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        return True
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_repeat_every_lock_errors(caplog: pytest.LogCaptureFixture) -> None:
+    calls: list[int] = []
+    exceptions: list[Exception] = []
+    completed = asyncio.Event()
+    stats = RepeatedTaskStats()
+
+    @repeat_every(
+        seconds=0.01,
+        max_repetitions=2,
+        lock=FailingLock(failures=3),
+        stats=stats,
+        on_complete=completed.set,
+        on_exception=exceptions.append,
+    )
+    def refresh() -> None:
+        calls.append(1)
+
+    with caplog.at_level(logging.ERROR, logger="fastapi_utils.tasks"):
+        await refresh()
+        await completed.wait()
+
+    # Ticks on which the lock couldn't be acquired are standby ticks, and don't count as repetitions
+    assert len(calls) == stats.runs == 2
+    assert stats.standby_ticks == 3
+    assert exceptions == []
+    assert caplog.text.count("Error acquiring the lock of job") == 3
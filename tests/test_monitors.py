@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import gc
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from fastapi_utils.monitors import EventLoopMonitor, GcMonitor, ThreadpoolMonitor
+from fastapi_utils.prometheus import PrometheusCollector
+from fastapi_utils.timing import RecordCollector, TimingAggregator, TimingSummary, _TimingStats, add_timing_middleware
+from tests.helpers import StoringCollector
+
+if TYPE_CHECKING:
+    from pytest.capture import CaptureFixture
+else:
+    CaptureFixture = Any
+
+
+def test_event_loop_monitor() -> None:
+    records: list[str] = []
+    monitor = EventLoopMonitor(threshold=0.1, interval=0.01)
+    monitor_app = FastAPI()
+    # Monitors without a `record` callable report through the middleware's
+    add_timing_middleware(monitor_app, record=records.append, collectors=[monitor])
+
+    @monitor_app.get("/blocking")
+    async def get_blocking() -> None:
+        time.sleep(0.3)
+
+    with TestClient(monitor_app) as monitor_client:
+        monitor_client.get("/blocking")
+        for _ in range(100):
+            if records:
+                break
+            time.sleep(0.01)
+    assert monitor._heartbeat_task is None and monitor._thread is None
+
+    assert monitor.blocks == 1
+    assert 0.2 <= monitor.max_lag < 1
+    message_lines = records[0].splitlines()
+    assert message_lines[0].startswith("LOOP BLOCKED: ")
+    assert message_lines[0].endswith("ms | tests.test_monitors.get_blocking")
+    assert message_lines[-1].strip() == "time.sleep(0.3)"
+
+
+def test_threadpool_monitor() -> None:
+    collector = StoringCollector()
+    records: list[str] = []
+    monitor = ThreadpoolMonitor(total_tokens=2, record=records.append, threshold=0.05, namespace="test")
+    threadpool_app = FastAPI()
+    add_timing_middleware(threadpool_app, collectors=[collector, monitor])
+
+    @threadpool_app.get("/sleep")
+    def get_sleep() -> None:
+        time.sleep(0.1)
+
+    with TestClient(threadpool_app) as client:
+        limiter = monitor._limiter
+        assert limiter is not None
+        assert monitor.total_tokens == 2
+        with ThreadPoolExecutor(4) as executor:
+            responses = list(executor.map(client.get, ["/sleep"] * 4))
+        assert all(response.status_code == 200 for response in responses)
+        assert monitor.borrowed_tokens == 0
+        assert monitor.waiting == 0
+        metrics = monitor.render().splitlines()
+    assert "acquire" not in vars(limiter)
+
+    assert monitor.calls >= 4
+    assert monitor.max_borrowed_tokens >= 2
+    assert monitor.max_wait >= 0.05
+    waits = [stats.threadpool_wait_ns / 1e9 for stats in collector.stats]
+    assert max(waits) >= 0.05
+    assert len(records) >= 2
+    assert all(record.startswith("THREADPOOL WAIT: ") for record in records)
+    assert all(record.endswith(" | tests.test_monitors.get_sleep") for record in records)
+
+    assert "test_threadpool_tokens_total 2" in metrics
+    assert "test_threadpool_tokens_borrowed 0" in metrics
+    assert f'test_threadpool_wait_seconds_bucket{{le="+Inf"}} {monitor.calls}' in metrics
+    assert f"test_threadpool_wait_seconds_count {monitor.calls}" in metrics
+
+
+def test_gc_monitor(capsys: CaptureFixture[str]) -> None:
+    collector = StoringCollector()
+    records: list[str] = []
+    monitor = GcMonitor(record=records.append, threshold=0)
+    flushed: list[TimingSummary] = []
+    aggregator = TimingAggregator(on_flush=flushed.extend)
+    prometheus_collector = PrometheusCollector(namespace="test")
+    gc_app = FastAPI()
+    add_timing_middleware(gc_app, collectors=[collector, monitor, aggregator, prometheus_collector, RecordCollector()])
+
+    @gc_app.get("/collect")
+    async def get_collect() -> None:
+        garbage: list[Any] = []
+        for _ in range(10_000):
+            cycle: list[Any] = []
+            cycle.append(cycle)
+            garbage.append(cycle)
+        del garbage
+        gc.collect()
+
+    @gc_app.get("/fast")
+    async def get_fast() -> None:
+        pass
+
+    with TestClient(gc_app) as client:
+        assert monitor._on_collection in gc.callbacks
+        client.get("/collect")
+        gc.disable()
+        try:
+            client.get("/fast")
+        finally:
+            gc.enable()
+    assert monitor._on_collection not in gc.callbacks
+
+    assert monitor.collections[2] >= 1
+    assert monitor.pause_time[2] >= monitor.max_pause[2] > 0
+    collect_stats, fast_stats = collector.stats
+    assert collect_stats.gc_time is not None and collect_stats.gc_time >= monitor.max_pause[2]
+    assert fast_stats.gc_ns == 0
+    assert any(
+        record.startswith("GC PAUSE: ") and "| Generation: 2 |" in record and record.endswith("get_collect")
+        for record in records
+    )
+    lines = capsys.readouterr().out.splitlines()
+    assert "| GC: " in lines[0]
+    assert "| GC: " not in lines[1]
+
+    summaries = {summary.name: summary for summary in flushed}  # flushed at shutdown
+    collect_summary = summaries["tests.test_monitors.get_collect"]
+    assert collect_summary.gc_paused == 1
+    assert collect_summary.wall_excluding_gc_p99 < collect_summary.wall_max
+    assert summaries["tests.test_monitors.get_fast"].gc_paused == 0
+
+    metrics = prometheus_collector.render().splitlines()
+    assert 'test_request_gc_seconds_count{route="tests.test_monitors.get_fast"} 1' in metrics
+    assert _TimingStats("untracked").gc_time is None
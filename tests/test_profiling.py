@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+from fastapi import Depends, FastAPI, HTTPException
+from starlette.testclient import TestClient
+
+from fastapi_utils.profiling import SlowRequestProfiler, add_profile_route, format_collapsed_stacks
+from fastapi_utils.timing import add_timing_middleware
+
+
+def wait_for_io() -> None:
+    time.sleep(0.3)
+
+
+def spin() -> None:
+    start = time.perf_counter()
+    while time.perf_counter() - start < 0.3:
+        pass
+
+
+def spin_briefly() -> None:
+    start = time.perf_counter()
+    while time.perf_counter() - start < 0.001:
+        pass
+
+
+async def slow_io() -> None:
+    await asyncio.sleep(0.3)
+
+
+def get_profiler_app(profiler: SlowRequestProfiler) -> FastAPI:
+    app = FastAPI()
+    add_timing_middleware(app, record=lambda message: None, collectors=[profiler])
+
+    @app.get("/awaiting")
+    async def get_awaiting() -> None:
+        await slow_io()
+
+    @app.get("/spinning")
+    async def get_spinning() -> None:
+        spin()
+
+    @app.get("/threadpool")
+    def get_threadpool() -> None:
+        wait_for_io()
+
+    @app.get("/fast")
+    async def get_fast() -> None:
+        pass
+
+    return app
+
+
+def read_profile(directory: Path, route_name: str) -> dict[str, int]:
+    (path,) = directory.glob(f"tests.test_profiling.{route_name}-*.collapsed")
+    samples = {}
+    for line in path.read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        samples[stack] = int(count)
+    return samples
+
+
+def test_slow_request_profiler(tmp_path: Path) -> None:
+    records: list[str] = []
+    profiler = SlowRequestProfiler(tmp_path, threshold=0.2, soft_threshold=0.05, interval=0.01, record=records.append)
+    with TestClient(get_profiler_app(profiler)) as client:
+        for path in ("/awaiting", "/spinning", "/threadpool", "/fast"):
+            client.get(path)
+    assert profiler.saved == 3
+    assert len(records) == 3
+    assert all(record.startswith("PROFILE: Wall: ") for record in records)
+
+    for route_name, function_name, innermost_function_name in [
+        ("get_awaiting", "slow_io", "sleep"),
+        ("get_spinning", "spin", "spin"),
+        ("get_threadpool", "wait_for_io", "wait_for_io"),
+    ]:
+        samples = read_profile(tmp_path, route_name)
+        assert sum(samples.values()) >= 5
+        # Other stacks (e.g., serializing the response) may also have been sampled, but most samples are of the endpoint
+        frames = max(samples, key=samples.__getitem__).split(";")
+        assert any(frame.startswith(f"{route_name} (") for frame in frames)
+        assert any(frame.startswith(f"{function_name} (") for frame in frames)
+        assert frames[-1].startswith(f"{innermost_function_name} (")
+    assert not list(tmp_path.glob("*get_fast*"))
+
+
+def test_slow_request_profiler_limits(tmp_path: Path) -> None:
+    profiler = SlowRequestProfiler(
+        tmp_path,
+        threshold=0.2,
+        soft_threshold=0.05,
+        route_thresholds={"tests.test_profiling.get_spinning": None},
+        interval=0.01,
+        max_per_hour=1,
+    )
+    with TestClient(get_profiler_app(profiler)) as client:
+        for path in ("/awaiting", "/awaiting", "/spinning"):
+            client.get(path)
+    assert profiler.saved == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_format_collapsed_stacks() -> None:
+    assert format_collapsed_stacks({"b;c": 1, "a;b": 2}) == "a;b 2\nb;c 1\n"
+
+
+def test_profile_route() -> None:
+    app = FastAPI()
+    add_profile_route(app, max_seconds=1, interval=0.005)
+    stop = threading.Event()
+
+    def spin_until_stopped() -> None:
+        while not stop.is_set():
+            spin_briefly()
+
+    thread = threading.Thread(target=spin_until_stopped, name="spinner")
+    thread.start()
+    try:
+        client = TestClient(app)
+        response = client.get("/debug/profile", params={"seconds": 0.2})
+    finally:
+        stop.set()
+        thread.join()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    spinner_samples = [int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith("spinner;")]
+    assert sum(spinner_samples) >= 10
+    assert any(";spin_briefly (" in line for line in lines)
+
+    assert client.get("/debug/profile", params={"seconds": 2}).status_code == 422
+    assert "/debug/profile" not in client.get("/openapi.json").text
+
+
+def test_profile_route_default_seconds() -> None:
+    app = FastAPI()
+    add_profile_route(app, max_seconds=0.2, interval=0.005)
+    # The default duration is capped by max_seconds
+    start = time.monotonic()
+    assert TestClient(app).get("/debug/profile").status_code == 200
+    assert time.monotonic() - start < 2
+
+
+def test_profile_route_dependencies() -> None:
+    def forbid() -> None:
+        raise HTTPException(status_code=403)
+
+    app = FastAPI()
+    add_profile_route(app, dependencies=[Depends(forbid)])
+    assert TestClient(app).get("/debug/profile", params={"seconds": 0.01}).status_code == 403
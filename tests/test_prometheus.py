@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from fastapi_utils.prometheus import PrometheusCollector, add_metrics_route
+from fastapi_utils.timing import _TimingStats, add_timing_middleware
+
+
+def test_prometheus_collector() -> None:
+    collector = PrometheusCollector(namespace="test", buckets=[0.1, 10.0], cpu_buckets=[10.0])
+    prometheus_app = FastAPI()
+    add_timing_middleware(prometheus_app, collectors=[collector])
+    add_metrics_route(prometheus_app, collector)
+
+    @prometheus_app.get("/")
+    def get_counted() -> None:
+        pass
+
+    prometheus_client = TestClient(prometheus_app)
+    for _ in range(3):
+        prometheus_client.get("/")
+    response = prometheus_client.get("/metrics")
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+
+    lines = response.text.splitlines()
+    label = 'route="tests.test_prometheus.get_counted"'
+    assert f"test_requests_total{{{label}}} 3" in lines
+    assert "# TYPE test_request_duration_seconds histogram" in lines
+    assert f'test_request_duration_seconds_bucket{{{label},le="0.1"}} 3' in lines
+    assert f'test_request_duration_seconds_bucket{{{label},le="10.0"}} 3' in lines
+    assert f'test_request_duration_seconds_bucket{{{label},le="+Inf"}} 3' in lines
+    assert f"test_request_duration_seconds_count{{{label}}} 3" in lines
+    assert f'test_request_cpu_seconds_bucket{{{label},le="10.0"}} 3' in lines
+    assert f'test_request_cpu_seconds_bucket{{{label},le="+Inf"}} 3' in lines
+    assert f"test_request_cpu_seconds_count{{{label}}} 3" in lines
+    assert not any(line.startswith("test_request_cpu_seconds_bucket") and 'le="0.1"' in line for line in lines)
+
+
+def test_prometheus_label_escaping() -> None:
+    collector = PrometheusCollector()
+    stats = _TimingStats('<Path: /a"b\\c>')
+    stats.start()
+    stats.take_split()
+    collector.observe(stats)
+    assert 'fastapi_requests_total{route="<Path: /a\\"b\\\\c>"} 1' in collector.render().splitlines()
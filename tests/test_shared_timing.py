@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import multiprocessing
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from fastapi_utils.prometheus import add_metrics_route
+from fastapi_utils.shared_timing import SharedTimingCollector
+from fastapi_utils.timing import _TimingStats, add_timing_middleware
+
+
+def make_stats(name: str, wall_ms: int, cpu_ms: int = 1) -> _TimingStats:
+    stats = _TimingStats(name)
+    stats.start_ns = 1_000_000_000
+    stats.end_ns = stats.start_ns + wall_ms * 1_000_000
+    stats.end_cpu_ns = cpu_ms * 1_000_000
+    return stats
+
+
+def record_in_worker(path: Path, wall_ms: int, n_requests: int) -> None:
+    collector = SharedTimingCollector(path, max_workers=2)
+    for _ in range(n_requests):
+        collector.observe(make_stats("route.a", wall_ms))
+    collector.observe(make_stats(f"route.{wall_ms}", wall_ms))
+
+
+def run_worker(path: Path, wall_ms: int, n_requests: int) -> None:
+    process = multiprocessing.get_context("spawn").Process(target=record_in_worker, args=(path, wall_ms, n_requests))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+def test_shared_timing_collector_merges_workers(tmp_path: Path) -> None:
+    path = tmp_path / "timing.shm"
+    run_worker(path, wall_ms=10, n_requests=90)
+    run_worker(path, wall_ms=100, n_requests=10)
+    # The slots of exited workers are reused (keeping their data), so more workers than slots can be run in turn
+    run_worker(path, wall_ms=1000, n_requests=1)
+
+    collector = SharedTimingCollector(path, max_workers=2)
+    collector.observe(make_stats("route.a", 10))
+    summaries = {summary.name: summary for summary in collector.summaries()}
+    assert sorted(summaries) == ["route.10", "route.100", "route.1000", "route.a"]
+    summary = summaries["route.a"]
+    assert summary.requests == 102
+    assert summary.wall_p50 == pytest.approx(10, rel=0.05)
+    assert summary.wall_p99 == pytest.approx(100, rel=0.05)
+    assert summary.wall_max == 1000
+    assert summary.cpu_max == 1
+    assert summaries["route.1000"].requests == 1
+
+
+def test_shared_timing_collector_metrics(tmp_path: Path) -> None:
+    collector = SharedTimingCollector(tmp_path / "timing.shm", namespace="test", max_routes=1)
+    app = FastAPI()
+    add_timing_middleware(app, collectors=[collector])
+    add_metrics_route(app, collector)
+
+    @app.get("/")
+    def get_shared() -> None:
+        pass
+
+    client = TestClient(app)
+    for _ in range(3):
+        client.get("/")
+    lines = client.get("/metrics").text.splitlines()
+    label = 'route="tests.test_shared_timing.get_shared"'
+    assert f"test_requests_total{{{label}}} 3" in lines
+    assert "# TYPE test_request_duration_seconds summary" in lines
+    assert any(line.startswith(f'test_request_duration_seconds{{{label},quantile="0.99"}} ') for line in lines)
+    assert f"test_request_cpu_seconds_count{{{label}}} 3" in lines
+    # The metrics route itself doesn't fit in the single route slot
+    assert collector.dropped == 1
+
+
+def test_shared_timing_collector_layout_mismatch(tmp_path: Path) -> None:
+    path = tmp_path / "timing.shm"
+    SharedTimingCollector(path, max_routes=1).observe(make_stats("route.a", 10))
+    with pytest.raises(ValueError):
+        SharedTimingCollector(path, max_routes=2).observe(make_stats("route.a", 10))
+
+
+def test_shared_timing_collector_counts_are_64_bit(tmp_path: Path) -> None:
+    collector = SharedTimingCollector(tmp_path / "timing.shm")
+    collector.observe(make_stats("route.a", 10))
+    _, counts = collector._routes["route.a"]
+    bucket = next(index for index, count in enumerate(counts) if count)
+    counts[bucket] = 2**32 - 1
+    collector.observe(make_stats("route.a", 10))
+    assert counts[bucket] == 2**32
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import re
+import socket
+import time
+from collections.abc import Iterator
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from fastapi_utils.statsd import StatsdCollector
+from fastapi_utils.timing import _TimingStats, add_timing_middleware
+
+
+@pytest.fixture
+def udp_server() -> Iterator[socket.socket]:
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(1)
+    yield server
+    server.close()
+
+
+def receive_datagrams(server: socket.socket) -> list[bytes]:
+    datagrams = [server.recv(65536)]
+    server.settimeout(0.1)
+    try:
+        while True:
+            datagrams.append(server.recv(65536))
+    except socket.timeout:
+        return datagrams
+
+
+def get_statsd_app(collector: StatsdCollector) -> FastAPI:
+    statsd_app = FastAPI()
+    add_timing_middleware(statsd_app, collectors=[collector], queue_time_header="X-Request-Start")
+
+    @statsd_app.get("/items/{item_id}")
+    def get_item(item_id: int) -> int:
+        return item_id
+
+    return statsd_app
+
+
+def test_statsd_collector(udp_server: socket.socket) -> None:
+    collector = StatsdCollector(
+        port=udp_server.getsockname()[1], prefix="test", tags={"env": "ci"}, flush_interval=60, max_packet_size=512
+    )
+    with TestClient(get_statsd_app(collector)) as client:
+        for item_id in range(20):
+            client.get(f"/items/{item_id}", headers={"X-Request-Start": str(time.time())})
+        client.get("/items/invalid")
+    datagrams = receive_datagrams(udp_server)
+    assert len(datagrams) > 1
+    assert all(len(datagram) <= 512 for datagram in datagrams)
+
+    lines = b"\n".join(datagrams).decode().splitlines()
+    assert len(lines) == 21 * 3 + 20
+    tags = "route:tests.test_statsd.get_item,method:GET,status:200,env:ci"
+    assert sum(line.startswith("test.request.duration:") and line.endswith(f"|ms|#{tags}") for line in lines) == 20
+    assert sum(line.startswith("test.request.queue:") for line in lines) == 20
+    assert sum(line.endswith("status:422,env:ci") for line in lines) == 3
+    assert re.fullmatch(r"test\.request\.cpu:\d+\.\d{3}\|ms\|#.*", lines[1])
+
+
+def test_statsd_collector_aggregate(udp_server: socket.socket) -> None:
+    collector = StatsdCollector(port=udp_server.getsockname()[1], prefix="", tag_format="influxdb", aggregate=True)
+    with TestClient(get_statsd_app(collector)) as client:
+        for item_id in range(50):
+            client.get(f"/items/{item_id}")
+        assert collector.flush() >= 1
+        lines = b"\n".join(receive_datagrams(udp_server)).decode().splitlines()
+        assert collector.flush() == 0  # the histograms are reset after each flush
+
+    duration_counts = []
+    for line in lines:
+        assert re.fullmatch(
+            r"request\.(duration|cpu|ttfb),route=tests\.test_statsd\.get_item,method=GET,status=200:[\d.]+\|ms(\|@[\d.e-]+)?",
+            line,
+        )
+        if line.startswith("request.duration"):
+            sample_rate = re.search(r"\|@([\d.e-]+)$", line)
+            duration_counts.append(round(1 / float(sample_rate.group(1))) if sample_rate else 1)
+    assert sum(duration_counts) == 50
+    assert not any(line.startswith("request.queue") for line in lines)
+
+
+def test_statsd_collector_limits() -> None:
+    with pytest.raises(ValueError):
+        StatsdCollector(tag_format="graphite")
+
+    collector = StatsdCollector(max_buffer_size=1)
+    for _ in range(3):
+        collector.observe(_TimingStats("name"))
+    assert collector.dropped == 2
+    assert collector.flush() == 0  # not started
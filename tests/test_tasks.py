@@ -1,6 +1,8 @@
 import asyncio
 import sys
-from typing import TYPE_CHECKING, NoReturn
+from datetime import datetime, tzinfo
+from functools import partial
+from typing import TYPE_CHECKING, Any, List, NoReturn, Optional
 
 if TYPE_CHECKING:
     if sys.version_info >= (3, 8):
@@ -15,7 +17,15 @@ else:
 
 import pytest
 
-from fastapi_utils.tasks import NoArgsNoReturnAsyncFuncT, repeat_every
+from fastapi_utils.tasks import (
+    CronJob,
+    CronSchedule,
+    NoArgsNoReturnAsyncFuncT,
+    RepeatedTaskStats,
+    Scheduler,
+    repeat_cron,
+    repeat_every,
+)
 
 
 # Fixtures:
@@ -261,3 +271,298 @@ class TestRepeatEveryWithAsynchronousFunction(TestRepeatEveryBase):
 
         assert self.counter == max_repetitions
         asyncio_sleep_mock.assert_has_calls(max_repetitions * [call(seconds)], any_order=True)
+
+
+class TestRepeatEveryFixedRate:
+    def setup_method(self) -> None:
+        self.start_times: List[float] = []
+        self.completed = asyncio.Event()
+
+    def loop_completed(self) -> None:
+        self.completed.set()
+
+    def get_task(self, durations: List[float], **kwargs: Any) -> NoArgsNoReturnAsyncFuncT:
+        async def record_start() -> None:
+            self.start_times.append(asyncio.get_event_loop().time())
+            await asyncio.sleep(durations[len(self.start_times) - 1])
+
+        decorator = repeat_every(
+            seconds=0.1, max_repetitions=len(durations), fixed_rate=True, on_complete=self.loop_completed, **kwargs
+        )
+        return decorator(record_start)
+
+    def get_offsets(self) -> List[float]:
+        return [start_time - self.start_times[0] for start_time in self.start_times]
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    async def test_fixed_rate(self) -> None:
+        stats = RepeatedTaskStats()
+        await self.get_task([0.06, 0.06, 0.06, 0], stats=stats)()
+        await self.completed.wait()
+
+        assert self.get_offsets() == pytest.approx([0.0, 0.1, 0.2, 0.3], abs=0.02)
+        assert stats.runs == 4
+        assert stats.missed_ticks == 0
+        assert 0 <= stats.max_lateness < 0.02
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    @pytest.mark.parametrize(
+        "missed_ticks,expected_offsets,expected_missed_ticks,expected_max_lateness",
+        [
+            ("skip", [0.0, 0.3, 0.4], 2, 0.0),
+            ("run_once", [0.0, 0.25, 0.3], 1, 0.05),
+            ("run_all", [0.0, 0.25, 0.25], 0, 0.15),
+        ],
+    )
+    async def test_missed_ticks(
+        self,
+        missed_ticks: str,
+        expected_offsets: List[float],
+        expected_missed_ticks: int,
+        expected_max_lateness: float,
+    ) -> None:
+        stats = RepeatedTaskStats()
+        await self.get_task([0.25, 0, 0], missed_ticks=missed_ticks, stats=stats)()
+        await self.completed.wait()
+
+        assert self.get_offsets() == pytest.approx(expected_offsets, abs=0.02)
+        assert stats.missed_ticks == expected_missed_ticks
+        assert stats.max_lateness == pytest.approx(expected_max_lateness, abs=0.02)
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    @pytest.mark.parametrize("use_scheduler", [False, True])
+    async def test_max_concurrent(self, use_scheduler: bool) -> None:
+        scheduler = Scheduler() if use_scheduler else None
+        stats = RepeatedTaskStats()
+        await self.get_task([0.25, 0.25, 0, 0], max_concurrent=2, stats=stats, scheduler=scheduler)()
+        await self.completed.wait()
+
+        # The tick at 0.2 is skipped, as the calls started at 0 and 0.1 are both still running
+        assert self.get_offsets() == pytest.approx([0.0, 0.1, 0.3, 0.4], abs=0.02)
+        assert stats.overlapped_ticks == 2
+        assert stats.skipped_ticks == stats.missed_ticks == 1
+        if scheduler is not None:
+            assert next(iter(scheduler.jobs.values())).state == "finished"
+            await scheduler.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    async def test_coalesce(self) -> None:
+        stats = RepeatedTaskStats()
+        await self.get_task([0.35, 0, 0], coalesce=True, stats=stats)()
+        await self.completed.wait()
+
+        # The ticks at 0.1, 0.2 and 0.3 are coalesced into a single call once the first call finishes
+        assert self.get_offsets() == pytest.approx([0.0, 0.35, 0.4], abs=0.02)
+        assert stats.coalesced_ticks == stats.missed_ticks == 2
+        assert stats.skipped_ticks == stats.overlapped_ticks == 0
+        assert stats.max_lateness == pytest.approx(0.05, abs=0.02)
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    @patch("fastapi_utils.tasks.random.uniform", lambda low, high: high)
+    async def test_jitter(self) -> None:
+        start = asyncio.get_event_loop().time()
+        await self.get_task([0, 0, 0], jitter=0.05)()
+        await self.completed.wait()
+
+        # Each call is delayed from its own tick, so the jitter doesn't accumulate
+        offsets = [start_time - start for start_time in self.start_times]
+        assert offsets == pytest.approx([0.05, 0.15, 0.25], abs=0.02)
+
+    def test_invalid_arguments(self) -> None:
+        with pytest.raises(ValueError):
+            repeat_every(seconds=1, fixed_rate=True, missed_ticks="catch_up")
+        with pytest.raises(ValueError):
+            repeat_every(seconds=0, fixed_rate=True)
+        with pytest.raises(ValueError):
+            repeat_every(seconds=1, max_concurrent=2)
+        with pytest.raises(ValueError):
+            repeat_every(seconds=1, fixed_rate=True, max_concurrent=0)
+        with pytest.raises(ValueError):
+            repeat_every(seconds=1, fixed_rate=True, coalesce=True, missed_ticks="run_all")
+        with pytest.raises(ValueError):
+            repeat_every(seconds=1, jitter=-1)
+
+
+class TestScheduler:
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    async def test_many_jobs_share_one_timer(self) -> None:
+        scheduler = Scheduler()
+        completed: List[int] = []
+        tasks_before = len(asyncio.all_tasks())
+
+        for tenant in range(100):
+
+            async def refresh() -> None:
+                pass
+
+            decorator = repeat_every(
+                seconds=0.05,
+                max_repetitions=3,
+                scheduler=scheduler,
+                name=f"refresh-{tenant}",
+                on_complete=partial(completed.append, tenant),
+            )
+            await decorator(refresh)()
+
+        assert len(scheduler.jobs) == 100
+        await asyncio.sleep(0.01)
+        # Between calls, the only task is the scheduler's timer
+        assert len(asyncio.all_tasks()) == tasks_before + 1
+        assert {job.state for job in scheduler.jobs.values()} == {"scheduled"}
+
+        while len(completed) < 100:
+            await asyncio.sleep(0.01)
+        assert sorted(completed) == list(range(100))
+        assert all(job.state == "finished" and job.stats.runs == 3 for job in scheduler.jobs.values())
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    async def test_registry(self) -> None:
+        scheduler = Scheduler()
+        calls: List[str] = []
+
+        @repeat_every(seconds=0.2, scheduler=scheduler)
+        async def slow() -> None:
+            calls.append("slow")
+
+        @repeat_every(seconds=0.05, wait_first=0.1, fixed_rate=True, scheduler=scheduler, name="fast")
+        def fast() -> None:
+            calls.append("fast")
+
+        await slow()
+        await fast()
+        with pytest.raises(ValueError):
+            await fast()
+
+        jobs = scheduler.jobs
+        assert set(jobs) == {"tests.test_tasks.TestScheduler.test_registry.<locals>.slow", "fast"}
+        slow_job = jobs["tests.test_tasks.TestScheduler.test_registry.<locals>.slow"]
+        assert jobs["fast"].next_run - slow_job.next_run == pytest.approx(0.1, abs=0.01)
+
+        await asyncio.sleep(0.17)
+        assert calls.count("slow") == 1
+        assert calls.count("fast") == 2
+        assert slow_job.state == "scheduled"
+        assert slow_job.next_run > asyncio.get_event_loop().time()
+
+        assert scheduler.remove_job("fast").state == "removed"
+        await asyncio.sleep(0.1)
+        assert calls.count("fast") == 2
+        assert calls.count("slow") == 2
+
+        await scheduler.stop()
+        assert slow_job.state == "cancelled"
+        await asyncio.sleep(0.2)
+        assert calls.count("slow") == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(1)
+    async def test_exceptions(self) -> None:
+        scheduler = Scheduler()
+        exceptions: List[Exception] = []
+
+        @repeat_every(seconds=0.01, max_repetitions=3, scheduler=scheduler, on_exception=exceptions.append)
+        def suppressed() -> NoReturn:
+            raise ValueError("error")
+
+        def stop(exc: Exception) -> None:
+            raise exc
+
+        @repeat_every(seconds=0.01, max_repetitions=3, scheduler=scheduler, on_exception=stop)
+        def failing() -> NoReturn:
+            raise ValueError("error")
+
+        await suppressed()
+        await failing()
+        await asyncio.sleep(0.1)
+
+        jobs = scheduler.jobs
+        assert len(exceptions) == 3
+        assert [job.state for job in jobs.values()] == ["finished", "failed"]
+        assert [job.stats.runs for job in jobs.values()] == [3, 1]
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(2)
+    @pytest.mark.parametrize("use_scheduler", [False, True])
+    async def test_on_complete_after_final_period(self, use_scheduler: bool) -> None:
+        scheduler = Scheduler() if use_scheduler else None
+        loop = asyncio.get_event_loop()
+        calls: List[float] = []
+        completed = asyncio.Event()
+
+        @repeat_every(seconds=0.1, max_repetitions=2, scheduler=scheduler, on_complete=completed.set)
+        def refresh() -> None:
+            calls.append(loop.time())
+
+        await refresh()
+        await completed.wait()
+        # With or without a scheduler, the job's period is waited after the final call before completing
+        assert len(calls) == 2
+        assert loop.time() - calls[-1] == pytest.approx(0.1, abs=0.03)
+        if scheduler is not None:
+            await scheduler.stop()
+
+
+class FrozenDatetime(datetime):
+    frozen_now = datetime(2024, 1, 1, 2, 29, 59, 900000)
+
+    @classmethod
+    def now(cls, tz: Optional[tzinfo] = None) -> "FrozenDatetime":
+        return cls.frozen_now  # type: ignore[return-value]
+
+
+class TestRepeatCron:
+    @pytest.mark.asyncio
+    @pytest.mark.timeout(1)
+    @pytest.mark.parametrize("use_scheduler", [False, True])
+    @patch("fastapi_utils.tasks.datetime", FrozenDatetime)
+    async def test_first_call_at_next_fire_time(self, use_scheduler: bool) -> None:
+        scheduler = Scheduler() if use_scheduler else None
+        stats = RepeatedTaskStats()
+        completed = asyncio.Event()
+        calls: List[float] = []
+
+        @repeat_cron("30 2 * * *", max_repetitions=1, stats=stats, scheduler=scheduler, on_complete=completed.set)
+        async def call() -> None:
+            calls.append(asyncio.get_event_loop().time())
+
+        start = asyncio.get_event_loop().time()
+        await call()
+        await completed.wait()
+
+        assert calls[0] - start == pytest.approx(0.1, abs=0.02)
+        assert stats.runs == 1
+        if scheduler is not None:
+            (job,) = scheduler.jobs.values()
+            assert isinstance(job, CronJob)
+            assert job.next_fire == datetime(2024, 1, 1, 2, 30)
+            assert job.state == "finished"
+            await scheduler.stop()
+
+    @patch("fastapi_utils.tasks.datetime", FrozenDatetime)
+    def test_missed_fires_are_skipped(self) -> None:
+        job = CronJob(lambda: None, schedule=CronSchedule("*/5 * * * *"), name="job")
+        assert job.schedule_next(100.0) == pytest.approx(0.1)
+        assert job.next_fire == datetime(2024, 1, 1, 2, 30)
+
+        # The call took 12 minutes, running past the fire times at 2:35 and 2:40
+        FrozenDatetime.frozen_now = datetime(2024, 1, 1, 2, 42)
+        try:
+            assert job.schedule_next(820.0) == 180
+        finally:
+            FrozenDatetime.frozen_now = datetime(2024, 1, 1, 2, 29, 59, 900000)
+        assert job.next_fire == datetime(2024, 1, 1, 2, 45)
+        assert job.next_run == 1000.0
+        assert job.stats.missed_ticks == 2
+
+    def test_invalid_expression(self) -> None:
+        with pytest.raises(ValueError):
+            repeat_cron("* * *")
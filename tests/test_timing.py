@@ -1,15 +1,47 @@
 from __future__ import annotations
 
+import asyncio
+import re
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
+import httpx
 import pytest
-from fastapi import FastAPI
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.routing import APIRoute
 from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Match, Route
 from starlette.staticfiles import StaticFiles
 from starlette.testclient import TestClient
-
-from fastapi_utils.timing import add_timing_middleware, record_timing
+from starlette.types import Scope
+from starlette.websockets import WebSocket
+
+from fastapi_utils.cbv import cbv
+from fastapi_utils.prometheus import PrometheusCollector
+from fastapi_utils.timing import (
+    BatchedEmitter,
+    RecordCollector,
+    RouteFilter,
+    SamplingPolicy,
+    TimingAggregator,
+    TimingMiddleware,
+    TimingSummary,
+    _LatencyHistogram,
+    _MetricNamer,
+    _parse_request_start,
+    _RouteSampler,
+    _TimingStats,
+    add_dependency_timing,
+    add_timing_middleware,
+    record_timing,
+    time_dependency,
+    timing_span,
+)
+from tests.helpers import StoringCollector
 
 if TYPE_CHECKING:
     from pytest.capture import CaptureFixture
@@ -107,3 +139,658 @@ def test_recording_fails_without_middleware() -> None:
     with pytest.raises(ValueError) as exc_info:
         client3.get("/")
     assert str(exc_info.value) == "No timer present on request"
+
+
+app4 = FastAPI()
+app4.add_middleware(TimingMiddleware, prefix="app4")
+
+
+@app4.get("/stream")
+def get_stream() -> StreamingResponse:
+    return StreamingResponse(iter([b"a", b"b", b"c"]))
+
+
+@app4.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket) -> None:
+    await websocket.accept()
+    await websocket.send_text("hello")
+    await websocket.close()
+
+
+client4 = TestClient(app4)
+
+
+def test_streaming_response(capsys: CaptureFixture[str]) -> None:
+    response = client4.get("/stream")
+    assert response.content == b"abc"
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert out.startswith("TIMING:")
+    assert out.endswith("app4.tests.test_timing.get_stream\n")
+
+
+def test_websocket_passthrough(capsys: CaptureFixture[str]) -> None:
+    with client4.websocket_connect("/ws") as websocket:
+        assert websocket.receive_text() == "hello"
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert out == ""
+
+
+def get_scope(path: str, method: str = "GET") -> dict[str, Any]:
+    return {"type": "http", "method": method, "path": path, "root_path": "", "headers": []}
+
+
+def test_metric_namer_preserves_route_order() -> None:
+    namer_app = FastAPI()
+
+    @namer_app.get("/items/{item_id}")
+    def read_item(item_id: str) -> None:
+        pass
+
+    @namer_app.get("/items/me")
+    def read_own_item() -> None:
+        pass
+
+    @namer_app.post("/items/me")
+    def update_own_item() -> None:
+        pass
+
+    namer = _MetricNamer(prefix="", app=namer_app)
+    assert namer(get_scope("/items/me")) == "tests.test_timing.read_item"
+    assert namer(get_scope("/items/me", method="POST")) == "tests.test_timing.update_own_item"
+    assert namer(get_scope("/items/1", method="POST")) == "<Path: /items/1>"
+
+
+def test_metric_namer_mounted_app() -> None:
+    sub_app = FastAPI()
+
+    @sub_app.get("/users/{user_id}")
+    def read_user(user_id: str) -> None:
+        pass
+
+    namer_app = FastAPI()
+    namer_app.mount("/sub", sub_app, name="sub")
+
+    namer = _MetricNamer(prefix="prefix", app=namer_app)
+    assert namer(get_scope("/sub/users/1")) == "prefix.tests.test_timing.read_user"
+    assert namer(get_scope("/sub/groups/1")) == "FastAPI<'sub'>"
+
+
+def test_metric_namer_rebuilds_index() -> None:
+    namer_app = FastAPI()
+    namer = _MetricNamer(prefix="", app=namer_app)
+    assert namer(get_scope("/added")) == "<Path: /added>"
+
+    @namer_app.get("/added")
+    def added() -> None:
+        pass
+
+    assert namer(get_scope("/added")) == "tests.test_timing.added"
+
+
+def test_metric_namer_checks_few_routes(monkeypatch: pytest.MonkeyPatch) -> None:
+    namer_app = FastAPI()
+    for i in range(1000):
+        namer_app.add_api_route(f"/items{i}/{{item_id}}", lambda item_id: None, name=f"items{i}")
+    namer_app.add_api_route("/{page}", lambda page: None, name="page")
+    namer = _MetricNamer(prefix="", app=namer_app)
+
+    checked: list[str] = []
+    matches = Route.matches
+
+    def count_matches(route: Route, scope: Scope) -> tuple[Match, Scope]:
+        checked.append(route.path)
+        return matches(route, scope)
+
+    monkeypatch.setattr(Route, "matches", count_matches)
+    # Dynamic routes are grouped by their first segment, so the cost of a lookup doesn't grow with the number of routes
+    assert namer(get_scope("/items999/1")) == "tests.test_timing.items999"
+    assert checked == ["/items999/{item_id}"]
+    assert namer(get_scope("/about")) == "tests.test_timing.page"
+    assert checked[1:] == ["/{page}"]
+
+
+def test_metric_namer_cache_size() -> None:
+    namer = _MetricNamer(prefix="", app=FastAPI(), cache_size=2)
+    for i in range(5):
+        assert namer(get_scope(f"/missing/{i}")) == f"<Path: /missing/{i}>"
+    assert len(namer._cache) == 2
+
+
+def test_aggregator(capsys: CaptureFixture[str]) -> None:
+    flushed: list[list[TimingSummary]] = []
+    aggregator = TimingAggregator(on_flush=flushed.append)
+    aggregator_app = FastAPI()
+    add_timing_middleware(aggregator_app, collectors=[aggregator])
+
+    @aggregator_app.get("/")
+    def get_aggregated() -> None:
+        pass
+
+    aggregator_client = TestClient(aggregator_app)
+    for _ in range(10):
+        aggregator_client.get("/")
+    out, err = capsys.readouterr()
+    assert out == ""
+
+    summaries = aggregator.flush()
+    assert flushed == [summaries]
+    assert len(summaries) == 1
+    summary = summaries[0]
+    assert summary.name == "tests.test_timing.get_aggregated"
+    assert summary.requests == 10
+    assert 0 <= summary.wall_p50 <= summary.wall_p90 <= summary.wall_p99 <= summary.wall_max
+    assert 0 <= summary.cpu_p50 <= summary.cpu_p90 <= summary.cpu_p99 <= summary.cpu_max
+
+    assert aggregator.flush() == []
+    assert len(flushed) == 1
+
+
+def test_aggregator_flushes_on_shutdown(capsys: CaptureFixture[str]) -> None:
+    aggregator_app = FastAPI()
+    add_timing_middleware(aggregator_app, collectors=[TimingAggregator(), RecordCollector()])
+
+    @aggregator_app.get("/")
+    def get_aggregated() -> None:
+        pass
+
+    with TestClient(aggregator_app) as aggregator_client:
+        aggregator_client.get("/")
+        out, err = capsys.readouterr()
+        assert out.startswith("TIMING: Wall:")
+
+    out, err = capsys.readouterr()
+    assert out.startswith("TIMING: 1 requests | Wall p50:")
+    assert out.endswith("| tests.test_timing.get_aggregated\n")
+
+
+def test_aggregator_flush_blocks_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    aggregator = TimingAggregator(on_flush=lambda summaries: None)
+    stats = _TimingStats("name")
+    stats.start()
+    stats.take_split()
+    aggregator.observe(stats)
+    observer = threading.Thread(target=aggregator.observe_batch, args=([stats] * 2,))
+    summarize = aggregator._summarize
+
+    def summarize_during_batch() -> list[TimingSummary]:
+        observer.start()
+        observer.join(0.05)
+        assert observer.is_alive()  # waiting for the flush to finish
+        return summarize()
+
+    monkeypatch.setattr(aggregator, "_summarize", summarize_during_batch)
+    assert [summary.requests for summary in aggregator.flush()] == [1]
+    observer.join()
+    monkeypatch.undo()
+    assert [summary.requests for summary in aggregator.flush()] == [2]
+
+
+def test_latency_histogram() -> None:
+    histogram = _LatencyHistogram()
+    assert histogram.quantiles(0.5) == [0.0]
+    for microseconds in range(1, 10001):
+        histogram.record(microseconds / 1_000_000)
+    p50, p99 = histogram.quantiles(0.5, 0.99)
+    assert p50 == pytest.approx(0.005, rel=1 / _LatencyHistogram.SUB_BUCKETS)
+    assert p99 == pytest.approx(0.0099, rel=1 / _LatencyHistogram.SUB_BUCKETS)
+    assert histogram.max == 0.01
+
+    histogram.reset()
+    assert histogram.count == 0
+    assert not any(histogram.counts)
+
+
+def burn_cpu(seconds: float) -> None:
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+cpu_collector = StoringCollector()
+cpu_app = FastAPI()
+add_timing_middleware(cpu_app, collectors=[cpu_collector])
+
+
+@cpu_app.get("/sleep")
+async def get_sleep() -> None:
+    await asyncio.sleep(0.1)
+
+
+@cpu_app.get("/burn")
+async def get_burn() -> None:
+    await asyncio.sleep(0.01)
+    burn_cpu(0.05)
+
+
+@cpu_app.get("/burn-sync")
+def get_burn_sync() -> None:
+    burn_cpu(0.05)
+
+
+@pytest.mark.asyncio
+async def test_cpu_time_excludes_concurrent_requests() -> None:
+    cpu_collector.stats.clear()
+    async with httpx.AsyncClient(app=cpu_app, base_url="http://testserver") as async_client:
+        await asyncio.gather(async_client.get("/sleep"), async_client.get("/burn"))
+
+    stats = {stats.name: stats for stats in cpu_collector.stats}
+    sleep_stats = stats["tests.test_timing.get_sleep"]
+    burn_stats = stats["tests.test_timing.get_burn"]
+    assert sleep_stats.time >= 0.1
+    assert burn_stats.cpu_time >= 0.05
+    assert sleep_stats.cpu_time < 0.025
+
+
+def test_cpu_time_includes_threadpool() -> None:
+    cpu_collector.stats.clear()
+    TestClient(cpu_app).get("/burn-sync")
+    (stats,) = cpu_collector.stats
+    assert stats.name == "tests.test_timing.get_burn_sync"
+    assert stats.cpu_time >= 0.05
+
+
+def test_cpu_time_includes_threadpool_cbv() -> None:
+    router = APIRouter()
+
+    @cbv(router)
+    class CBV:
+        @router.get("/burn-sync-cbv")
+        def get_burn_sync_cbv(self) -> int:
+            burn_cpu(0.05)
+            return 1
+
+    cbv_app = FastAPI()
+    collector = StoringCollector()
+    add_timing_middleware(cbv_app, collectors=[collector])
+    cbv_app.include_router(router)
+    response = TestClient(cbv_app).get("/burn-sync-cbv")
+    assert response.json() == 1
+    (stats,) = collector.stats
+    assert stats.cpu_time >= 0.05
+
+
+def test_excluded_endpoints_not_wrapped() -> None:
+    route = next(route for route in app.routes if isinstance(route, APIRoute) and route.path == "/untimed")
+    client.get("/untimed")
+    assert route.dependant.call is get_untimed
+
+
+def test_timing_stats_context_manager() -> None:
+    messages: list[str] = []
+    with _TimingStats("name", record=messages.append) as timer:
+        burn_cpu(0.01)
+    assert timer.cpu_time >= 0.01
+    assert timer.time >= timer.cpu_time
+    assert len(messages) == 1
+    assert messages[0].endswith("| name")
+
+
+def test_sampling() -> None:
+    collector = StoringCollector()
+    sampling_app = FastAPI()
+    add_timing_middleware(
+        sampling_app,
+        collectors=[collector],
+        sampling=SamplingPolicy(rate=0.0, slow_threshold=0.05),
+        route_sampling={
+            "tests.test_timing.get_limited": SamplingPolicy(max_per_second=2),
+            "tests.test_timing.get_unsampled": None,
+        },
+    )
+
+    @sampling_app.get("/fast")
+    def get_fast(request: Request) -> None:
+        record_timing(request, note="ignored")
+
+    @sampling_app.get("/slow")
+    async def get_slow() -> None:
+        await asyncio.sleep(0.05)
+
+    @sampling_app.get("/limited")
+    def get_limited() -> None:
+        pass
+
+    @sampling_app.get("/unsampled")
+    def get_unsampled() -> None:
+        pass
+
+    sampling_client = TestClient(sampling_app)
+    for path in ("/fast", "/slow", "/limited", "/unsampled"):
+        for _ in range(5):
+            sampling_client.get(path)
+
+    names = [stats.name for stats in collector.stats]
+    assert names.count("tests.test_timing.get_fast") == 0
+    assert names.count("tests.test_timing.get_slow") == 5
+    assert names.count("tests.test_timing.get_limited") == 2
+    assert names.count("tests.test_timing.get_unsampled") == 5
+
+
+def test_route_sampler_token_bucket() -> None:
+    sampler = _RouteSampler(SamplingPolicy(max_per_second=10))
+    assert sum(sampler.sample() for _ in range(20)) == 10
+    sampler.last_refill -= 0.5
+    assert sum(sampler.sample() for _ in range(20)) == 5
+
+    # Rates below one request per second still sample one request once a full token has accumulated
+    sampler = _RouteSampler(SamplingPolicy(max_per_second=0.5))
+    assert sum(sampler.sample() for _ in range(20)) == 1
+    sampler.last_refill -= 1.0
+    assert sum(sampler.sample() for _ in range(20)) == 0
+    sampler.last_refill -= 1.0
+    assert sum(sampler.sample() for _ in range(20)) == 1
+
+
+def test_batched_emitter(capsys: CaptureFixture[str]) -> None:
+    collector = StoringCollector()
+    emitter = BatchedEmitter([collector, RecordCollector()], interval=0.01)
+    emitter_app = FastAPI()
+    add_timing_middleware(emitter_app, collectors=[emitter])
+
+    @emitter_app.get("/")
+    def get_emitted() -> None:
+        pass
+
+    with TestClient(emitter_app) as emitter_client:
+        for _ in range(3):
+            emitter_client.get("/")
+    assert emitter._thread is None
+    assert emitter.emitted == 3
+    assert emitter.dropped == 0
+    assert [stats.name for stats in collector.stats] == 3 * ["tests.test_timing.get_emitted"]
+    out, err = capsys.readouterr()
+    assert out.count("TIMING: Wall:") == 3
+
+
+@pytest.mark.parametrize("overflow,expected", [("drop_oldest", ["2", "3"]), ("drop_newest", ["0", "1"])])
+def test_batched_emitter_overflow(overflow: str, expected: list[str]) -> None:
+    collector = StoringCollector()
+    emitter = BatchedEmitter([collector], capacity=2, batch_size=1, overflow=overflow)
+    emitter._thread = threading.Thread()  # prevent the background thread from being started
+    for i in range(4):
+        emitter.observe(_TimingStats(str(i)))
+    assert emitter.dropped == 2
+
+    emitter.emit_pending()
+    assert [stats.name for stats in collector.stats] == expected
+    assert emitter.emitted == 2
+
+
+def test_batched_emitter_invalid_overflow() -> None:
+    with pytest.raises(ValueError):
+        BatchedEmitter([], overflow="block")
+
+
+span_collector = StoringCollector()
+span_app = FastAPI()
+add_timing_middleware(span_app, collectors=[span_collector, RecordCollector()], server_timing=True)
+
+
+@timing_span("decorated")
+async def decorated_coroutine() -> None:
+    await asyncio.sleep(0.001)
+
+
+@timing_span("query")
+def decorated_function() -> None:
+    pass
+
+
+@span_app.get("/async")
+async def get_async_spans() -> None:
+    with timing_span("outer"):
+        await asyncio.sleep(0.001)
+        with timing_span("inner name"):
+            await asyncio.sleep(0.001)
+        await decorated_coroutine()
+
+
+@span_app.get("/sync")
+def get_sync_spans() -> None:
+    with timing_span("db"):
+        decorated_function()
+
+
+def test_timing_spans(capsys: CaptureFixture[str]) -> None:
+    span_collector.stats.clear()
+    span_client = TestClient(span_app)
+    response = span_client.get("/async")
+    server_timing = response.headers["server-timing"].split(", ")
+    assert server_timing[0].startswith("total;dur=")
+    assert [metric.split(";")[0] for metric in server_timing[1:]] == ["outer", "outer.inner_name", "outer.decorated"]
+
+    response = span_client.get("/sync")
+    assert [metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")] == [
+        "total",
+        "db",
+        "db.query",
+    ]
+
+    async_stats, sync_stats = span_collector.stats
+    assert [path for path, _ in async_stats.span_times()] == ["outer", "outer.inner name", "outer.decorated"]
+    outer_time = async_stats.span_times()[0][1]
+    assert 0.002 <= outer_time <= async_stats.time
+    assert [path for path, _ in sync_stats.span_times()] == ["db", "db.query"]
+
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert "| tests.test_timing.get_async_spans | Spans: outer=" in lines[0]
+    assert "| Spans: db=" in lines[1]
+
+
+def test_timing_span_without_request() -> None:
+    with timing_span("ignored"):
+        decorated_function()
+
+
+def test_route_filter() -> None:
+    route_filter = RouteFilter(patterns=[r"_health$", re.compile("ADMIN", re.IGNORECASE)], globs=["*.internal_*"])
+    assert route_filter.matches("app.get_health")
+    assert route_filter.matches("app.admin.get_users")
+    assert route_filter.matches("app.internal_stats")
+    assert not route_filter.matches("app.get_health_check")
+    assert not route_filter.matches("internal_stats")
+    assert not RouteFilter().matches("app.get_health")
+
+
+def test_route_filter_middleware(capsys: CaptureFixture[str]) -> None:
+    filter_app = FastAPI()
+    add_timing_middleware(
+        filter_app,
+        record=print,
+        exclude=RouteFilter(tags=["internal"], globs=["*.get_untimed"]),
+        include=RouteFilter(patterns=["^tests\\.test_timing\\."]),
+    )
+
+    @filter_app.get("/timed")
+    def get_timed() -> None:
+        pass
+
+    @filter_app.get("/untimed")
+    def get_untimed() -> None:
+        pass
+
+    @filter_app.get("/internal", tags=["internal"])
+    def get_internal() -> None:
+        pass
+
+    filter_client = TestClient(filter_app)
+    for path in ("/timed", "/untimed", "/internal", "/missing", "/timed"):
+        filter_client.get(path)
+    out, _ = capsys.readouterr()
+    lines = out.splitlines()
+    assert len(lines) == 2
+    assert all(line.endswith("| tests.test_timing.get_timed") for line in lines)
+
+
+def test_response_metrics(capsys: CaptureFixture[str]) -> None:
+    storing_collector = StoringCollector()
+    aggregator = TimingAggregator()
+    prometheus_collector = PrometheusCollector(namespace="test", size_buckets=[10, 1000])
+    response_app = FastAPI()
+    add_timing_middleware(response_app, collectors=[storing_collector, aggregator, prometheus_collector])
+
+    async def generate_chunks() -> AsyncIterator[bytes]:
+        for chunk in (b"a" * 100, b"", b"b" * 200, b"c" * 300):
+            await asyncio.sleep(0.02)
+            yield chunk
+
+    @response_app.get("/stream")
+    async def get_response_stream() -> StreamingResponse:
+        await asyncio.sleep(0.05)
+        return StreamingResponse(generate_chunks())
+
+    response = TestClient(response_app).get("/stream")
+    assert len(response.content) == 600
+
+    (stats,) = storing_collector.stats
+    assert stats.bytes_sent == 600
+    assert stats.chunks == 3
+    assert stats.ttfb is not None and stats.send_time is not None
+    assert 0.05 <= stats.ttfb < stats.time
+    assert 0.08 <= stats.send_time
+    assert stats.ttfb + stats.send_time == pytest.approx(stats.time)
+    assert _TimingStats("unstarted").ttfb is None
+
+    (summary,) = aggregator.flush()
+    assert summary.bytes_sent == 600
+    assert summary.chunks == 3
+    assert 50 <= summary.ttfb_p50 <= summary.ttfb_p99 <= summary.wall_max
+    out, _ = capsys.readouterr()
+    assert "| Sent: 600 bytes in 3 chunks | tests.test_timing.get_response_stream" in out
+
+    lines = prometheus_collector.render().splitlines()
+    label = 'route="tests.test_timing.get_response_stream"'
+    assert f"test_response_chunks_total{{{label}}} 3" in lines
+    assert f'test_response_size_bytes_bucket{{{label},le="10.0"}} 0' in lines
+    assert f'test_response_size_bytes_bucket{{{label},le="1000.0"}} 1' in lines
+    assert f"test_response_size_bytes_sum{{{label}}} 600" in lines
+    assert f"test_time_to_first_byte_seconds_count{{{label}}} 1" in lines
+
+
+def test_dependency_timing() -> None:
+    collector = StoringCollector()
+    dependency_app = FastAPI()
+    add_timing_middleware(dependency_app, collectors=[collector])
+    closed: list[str] = []
+
+    def get_settings() -> dict[str, str]:
+        time.sleep(0.01)
+        return {"name": "test"}
+
+    def get_db(settings: dict[str, str] = Depends(get_settings)) -> Iterator[str]:
+        yield settings["name"]
+        closed.append("db")
+
+    async def get_user(db: str = Depends(get_db)) -> str:
+        with timing_span("lookup"):
+            await asyncio.sleep(0.01)
+        return f"user from {db}"
+
+    async def get_client() -> AsyncIterator[str]:
+        yield "client"
+        closed.append("client")
+
+    @dependency_app.get("/")
+    async def get_index(user: str = Depends(get_user), client: str = Depends(get_client)) -> str:
+        return f"{user} and {client}"
+
+    add_dependency_timing(dependency_app)
+    add_dependency_timing(dependency_app)  # wrapping is idempotent
+    client = TestClient(dependency_app)
+    assert client.get("/").json() == "user from test and client"
+    assert sorted(closed) == ["client", "db"]
+
+    (stats,) = collector.stats
+    span_times = dict(stats.span_times())
+    assert list(span_times) == [
+        "depends:get_settings",
+        "depends:get_db",
+        "depends:get_user",
+        "depends:get_user.lookup",
+        "depends:get_client",
+    ]
+    assert span_times["depends:get_settings"] >= 0.01
+    assert span_times["depends:get_user"] >= span_times["depends:get_user.lookup"] >= 0.01
+
+    # Overrides of the original dependencies still apply
+    dependency_app.dependency_overrides[get_db] = lambda: "override"
+    assert client.get("/").json() == "user from override and client"
+
+
+def test_time_dependency() -> None:
+    def get_value() -> int:
+        return 1
+
+    timed = time_dependency(get_value, name="value")
+    assert timed() == 1
+    assert timed == get_value
+    assert hash(timed) == hash(get_value)
+    assert time_dependency(timed) is timed
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        (b"1700000000", 1_700_000_000_000_000_000),
+        (b"1700000000.25", 1_700_000_000_250_000_000),
+        (b"t=1700000000.25", 1_700_000_000_250_000_000),
+        (b"1700000000250", 1_700_000_000_250_000_000),
+        (b"t=1700000000250000", 1_700_000_000_250_000_000),
+        (b"1700000000250000000", 1_700_000_000_250_000_000),
+        (b"t=", None),
+        (b"soon", None),
+        (b"-1", None),
+        (b"inf", None),
+    ],
+)
+def test_parse_request_start(value: bytes, expected: int | None) -> None:
+    parsed = _parse_request_start(value)
+    if expected is None:
+        assert parsed is None
+    else:
+        assert parsed == pytest.approx(expected, abs=1000)
+
+
+def test_queue_time(capsys: CaptureFixture[str]) -> None:
+    collector = StoringCollector()
+    aggregator = TimingAggregator()
+    prometheus_collector = PrometheusCollector(namespace="test")
+    queue_app = FastAPI()
+    add_timing_middleware(
+        queue_app,
+        collectors=[collector, RecordCollector(), aggregator, prometheus_collector],
+        queue_time_header="X-Request-Start",
+    )
+
+    @queue_app.get("/")
+    def get_queued() -> None:
+        pass
+
+    client = TestClient(queue_app)
+    client.get("/", headers={"X-Request-Start": f"t={int(1000 * time.time()) - 250}"})
+    client.get("/", headers={"X-Request-Start": f"{time.time() + 60}"})  # clock skew
+    client.get("/", headers={"X-Request-Start": "invalid"})
+    client.get("/")
+
+    queue_times = [stats.queue_time for stats in collector.stats]
+    assert queue_times[0] is not None and 0.25 <= queue_times[0] < 1
+    assert queue_times[1:] == [0.0, None, None]
+    lines = capsys.readouterr().out.splitlines()
+    assert re.match(
+        r"TIMING: Wall: +[\d.]+ms \| CPU: +[\d.]+ms \| Queue: +[\d.]+ms \| tests.test_timing.get_queued$", lines[0]
+    )
+    assert lines[3].endswith("ms | tests.test_timing.get_queued")
+
+    (summary,) = aggregator.flush()
+    assert summary.queued == 2
+    assert 0 <= summary.queue_p50 <= summary.queue_p99
+    assert 250 <= summary.queue_p99 < 1000
+    assert "| Queue p50: " in capsys.readouterr().out
+
+    metrics = prometheus_collector.render().splitlines()
+    label = 'route="tests.test_timing.get_queued"'
+    assert f"test_request_queue_seconds_count{{{label}}} 2" in metrics
+    assert f'test_request_queue_seconds_bucket{{{label},le="0.1"}} 1' in metrics